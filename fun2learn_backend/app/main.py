@@ -4,7 +4,10 @@ from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 from app.utils.logging_utils import setup_logging
 import logging
+import os
 from app.utils.db_utils import ensure_create_all
+from app.utils.statement_counter_utils import install_statement_counter, track_statements, STATEMENT_COUNT_HEADER
+from app.connection.postgres_connection import engine
 from contextlib import asynccontextmanager
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
@@ -32,19 +35,68 @@ NON_GATED_ROUTES = [
 def run_leaderboard_reset():
     """Scheduled job: process weekly leaderboard promotions/demotions."""
     from app.connection.postgres_connection import SessionLocal
-    from app.utils.leaderboard_utils import process_leaderboard_resets
+    from app.utils.leaderboard_utils import reset_leaderboards_if_due
     logger = logging.getLogger(__name__)
     db = SessionLocal()
     try:
-        process_leaderboard_resets(db)
-        logger.info("Weekly leaderboard reset completed")
+        # Every worker process fires this job; only one of them performs the reset
+        if reset_leaderboards_if_due(db):
+            logger.info("Weekly leaderboard reset completed")
     except Exception as e:
         logger.error(f"Error during leaderboard reset: {e}")
     finally:
         db.close()
 
+def run_outbox_drain():
+    """Scheduled job: apply pending gamification side effects when no separate outbox worker runs."""
+    from app.connection.postgres_connection import SessionLocal
+    from app.utils.outbox_utils import drain_outbox
+    logger = logging.getLogger(__name__)
+    db = SessionLocal()
+    try:
+        # Keep going while there is a backlog, the job itself runs every second
+        while drain_outbox(db):
+            pass
+    except Exception as e:
+        logger.error(f"Error draining outbox: {e}")
+    finally:
+        db.close()
+
+def run_outbox_purge():
+    """Scheduled job: delete processed outbox events past their retention period."""
+    from app.connection.postgres_connection import SessionLocal
+    from app.utils.outbox_utils import purge_outbox_events
+    logger = logging.getLogger(__name__)
+    db = SessionLocal()
+    try:
+        deleted = purge_outbox_events(db)
+        logger.info(f"Purged {deleted} processed outbox events")
+    except Exception as e:
+        logger.error(f"Error purging outbox: {e}")
+    finally:
+        db.close()
+
+def run_idempotency_purge():
+    """Scheduled job: delete stored idempotent responses past the idempotency window."""
+    from app.connection.postgres_connection import SessionLocal
+    from app.utils.idempotency_utils import purge_idempotency_records
+    logger = logging.getLogger(__name__)
+    db = SessionLocal()
+    try:
+        deleted = purge_idempotency_records(db)
+        logger.info(f"Purged {deleted} expired idempotency keys")
+    except Exception as e:
+        logger.error(f"Error purging idempotency keys: {e}")
+    finally:
+        db.close()
+
 scheduler = BackgroundScheduler()
 scheduler.add_job(run_leaderboard_reset, CronTrigger(day_of_week="sun", hour=0, minute=0))
+scheduler.add_job(run_outbox_purge, CronTrigger(hour=3, minute=0))
+scheduler.add_job(run_idempotency_purge, "interval", hours=1)
+# Set OUTBOX_IN_PROCESS=false when running app.scripts.outbox_worker separately
+if os.getenv("OUTBOX_IN_PROCESS", "true").lower() == "true":
+    scheduler.add_job(run_outbox_drain, "interval", seconds=1, max_instances=1, coalesce=True)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -91,6 +143,19 @@ def get_application():
     # logger.info("Ensuring all the tables are created")
     # ensure_create_all()
 
+    install_statement_counter(engine)
+
+    @_app.middleware('http')
+    async def statement_count_middleware(request: Request, call_next):
+        """
+        Expose the number of SQL statements each request executed in a response header,
+        so regressions on hot paths show up in tests and in the browser's network tab.
+        """
+        with track_statements() as counter:
+            response = await call_next(request)
+        response.headers[STATEMENT_COUNT_HEADER] = str(counter.count)
+        return response
+
     @_app.middleware('http')
     async def auth_middleware(request: Request, call_next):
         """
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, String, Date, TIMESTAMP, Text, Integer, Boolean, ForeignKey, text, UniqueConstraint
+from sqlalchemy import Column, String, Date, TIMESTAMP, Text, Integer, Float, Boolean, LargeBinary, ForeignKey, text, UniqueConstraint, Index
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from app.connection.postgres_connection import Base
 
@@ -46,11 +47,53 @@ class Course(Base):
     status = Column(String(20), nullable=False)
     price_gems = Column(Integer, nullable=True)
     discount_percent = Column(Integer, nullable=True)
+    # Version of the live CourseSnapshot, NULL until the course is published
+    snapshot_version = Column(Integer, nullable=True)
+    # Bumped on every change to the course or its content, used for ETags
+    content_version = Column(Integer, nullable=False, server_default="0")
+    # Bumped when existing lessons change position, invalidating completed-lesson bitmaps
+    sequence_version = Column(Integer, nullable=False, server_default="0")
     user = relationship("User", back_populates="courses")
     units = relationship("Unit", back_populates="course", cascade="all, delete-orphan")
     course_tags = relationship("CourseTag", back_populates="course", cascade="all, delete-orphan")
     badge = relationship("Badge", back_populates="course", uselist=False, cascade="all, delete-orphan")
     enrollments = relationship("Enrollment", back_populates="course", cascade="all, delete-orphan")
+    # Catalog (browse) keyset pagination and filters
+    __table_args__ = (
+        Index("ix_courses_status_created_at", "status", "created_at", "id"),
+        Index("ix_courses_status_price", "status", "price_gems"),
+        Index("ix_courses_created_by_status", "created_by", "status", "created_at"),
+    )
+
+# Denormalized per-course counters. Content counts are refreshed by the course structure
+# endpoints, enrollment_count is incremented atomically on enroll, rating columns by feedback.
+class CourseStats(Base):
+    __tablename__ = "course_stats"
+
+    course_id = Column(String(40), ForeignKey("courses.id", ondelete="CASCADE"), primary_key=True)
+    unit_count = Column(Integer, nullable=False, server_default="0")
+    chapter_count = Column(Integer, nullable=False, server_default="0")
+    lesson_count = Column(Integer, nullable=False, server_default="0")
+    question_count = Column(Integer, nullable=False, server_default="0")
+    enrollment_count = Column(Integer, nullable=False, server_default="0")
+    rating_sum = Column(Integer, nullable=False, server_default="0")
+    review_count = Column(Integer, nullable=False, server_default="0")
+    # rating_sum / review_count, 0 while there are no reviews; stored so the catalog can sort on it
+    avg_rating = Column(Float, nullable=False, server_default="0")
+    __table_args__ = (
+        Index("ix_course_stats_popularity", "enrollment_count", "course_id"),
+        Index("ix_course_stats_rating", "avg_rating", "course_id"),
+    )
+
+# Immutable JSON rendering of a published course (ordered structure, question counts, badge,
+# tags). A new version is written whenever the published content changes.
+class CourseSnapshot(Base):
+    __tablename__ = "course_snapshots"
+
+    course_id = Column(String(40), ForeignKey("courses.id", ondelete="CASCADE"), primary_key=True)
+    version = Column(Integer, primary_key=True)
+    payload = Column(JSONB, nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text("CURRENT_TIMESTAMP"))
 
 class Unit(Base):
     __tablename__ = "units"
@@ -87,6 +130,22 @@ class Lesson(Base):
     questions = relationship("Question", back_populates="lesson", cascade="all, delete-orphan")
     lesson_attachments = relationship("LessonAttachment", back_populates="lesson", cascade="all, delete-orphan")
 
+# Flattened, course-ordered list of lessons. Maintained by the course structure endpoints
+# so "first lesson" / "next lesson" resolve with one indexed lookup.
+class CourseLessonSequence(Base):
+    __tablename__ = "course_lesson_sequence"
+
+    lesson_id = Column(String(40), ForeignKey("lessons.id", ondelete="CASCADE"), primary_key=True)
+    course_id = Column(String(40), ForeignKey("courses.id", ondelete="CASCADE"), nullable=False)
+    unit_id = Column(String(40), ForeignKey("units.id", ondelete="CASCADE"), nullable=False)
+    chapter_id = Column(String(40), ForeignKey("chapters.id", ondelete="CASCADE"), nullable=False)
+    # position: 0-based index of the lesson within the whole course
+    position = Column(Integer, nullable=False)
+    next_lesson_id = Column(String(40), ForeignKey("lessons.id", ondelete="SET NULL"), nullable=True)
+    __table_args__ = (
+        Index("ix_course_lesson_sequence_course_position", "course_id", "position"),
+    )
+
 class LessonAttachment(Base):
     __tablename__ = "lesson_attachments"
     id = Column(String(40), primary_key=True)
@@ -102,6 +161,9 @@ class Question(Base):
     id = Column(String(40), primary_key=True)
     question_text = Column(Text, nullable=False)
     question_type = Column(String(100), nullable=False)
+    # Position within the lesson, set by course import (whose rows share created_at); NULL for
+    # questions added one at a time, which are ordered by created_at after the imported ones
+    question_index = Column(Integer, nullable=True)
     created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text("CURRENT_TIMESTAMP"))
     lesson_id = Column(String(40), ForeignKey("lessons.id"), nullable=False)
     lesson = relationship("Lesson", back_populates="questions")
@@ -114,6 +176,8 @@ class MCQOption(Base):
     id = Column(String(40), primary_key=True)
     option_text = Column(Text)
     is_correct = Column(Boolean, server_default="false")
+    # Position within the question; NULL for options stored before it was recorded
+    option_index = Column(Integer, nullable=True)
     question_id = Column(String(40), ForeignKey("lesson_questions.id"))
     question = relationship("Question", back_populates="mcq_options")
 
@@ -153,6 +217,9 @@ class CourseTag(Base):
     tag_id = Column(String(40), ForeignKey("tags.id", ondelete="CASCADE"), nullable=False)
     course = relationship("Course", back_populates="course_tags")
     tag = relationship("Tag", back_populates="course_tags")
+    __table_args__ = (
+        Index("ix_course_tags_tag_course", "tag_id", "course_id"),
+    )
 
 class Enrollment(Base):
     __tablename__ = "enrollment"
@@ -175,6 +242,12 @@ class CourseProgress(Base):
     current_chapter_id = Column(String(40), ForeignKey("chapters.id", ondelete="SET NULL"), nullable=True)
     current_lesson_id = Column(String(40), ForeignKey("lessons.id", ondelete="SET NULL"), nullable=True)
     updated_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text("CURRENT_TIMESTAMP"))
+    # Bumped whenever completions or the current lesson change, used for ETags
+    progress_version = Column(Integer, nullable=False, server_default="0")
+    # Bitset of completed lesson positions (see progress_bitmap_utils), valid while
+    # bitmap_version equals the course's sequence_version
+    completed_bitmap = Column(LargeBinary, nullable=True)
+    bitmap_version = Column(Integer, nullable=True)
     user = relationship("User")
     course = relationship("Course")
     current_unit = relationship("Unit")
@@ -188,6 +261,44 @@ class LessonCompletion(Base):
     lesson_id = Column(String(40), ForeignKey("lessons.id", ondelete="CASCADE"), nullable=False)
     course_id = Column(String(40), ForeignKey("courses.id", ondelete="CASCADE"), nullable=False)
     completed_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text("CURRENT_TIMESTAMP"))
+    __table_args__ = (
+        Index("ix_lesson_completions_user_completed_at", "user_id", "completed_at"),
+    )
+
+# Denormalized per-user activity counters, kept up to date by the write paths that change them
+# (enroll, complete-lesson, achievement unlocks). refresh_user_stats recomputes them from the tables.
+class UserStats(Base):
+    __tablename__ = "user_stats"
+
+    user_id = Column(String(40), ForeignKey("users.user_id", ondelete="CASCADE"), primary_key=True)
+    lessons_completed = Column(Integer, nullable=False, server_default="0")
+    courses_completed = Column(Integer, nullable=False, server_default="0")
+    courses_enrolled = Column(Integer, nullable=False, server_default="0")
+    achievements_unlocked = Column(Integer, nullable=False, server_default="0")
+
+# Per-user, per-day activity rollup: lessons completed and XP/gems earned that day.
+# lessons is counted by complete-lesson, xp and gems by the reward handlers. Feeds the daily
+# quests, the activity heatmap and the XP history; a year of it is one primary key range scan.
+class UserDailyActivity(Base):
+    __tablename__ = "user_daily_activity"
+
+    user_id = Column(String(40), ForeignKey("users.user_id", ondelete="CASCADE"), primary_key=True)
+    date = Column(Date, primary_key=True)
+    lessons = Column(Integer, nullable=False, server_default="0")
+    xp = Column(Integer, nullable=False, server_default="0")
+    gems = Column(Integer, nullable=False, server_default="0")
+
+class UserWeeklyXp(Base):
+    # XP earned per user per leaderboard week (starting Sunday), for the friends leaderboard
+    __tablename__ = "user_weekly_xp"
+
+    user_id = Column(String(40), ForeignKey("users.user_id", ondelete="CASCADE"), primary_key=True)
+    week_start = Column(Date, primary_key=True)
+    xp = Column(Integer, nullable=False, server_default="0")
+    __table_args__ = (
+        # Covers the friends leaderboard lookup, so it never reads the table itself
+        Index("ix_user_weekly_xp_user_week_covering", "user_id", "week_start", postgresql_include=["xp"]),
+    )
 
 class UserInventory(Base):
     __tablename__ = "user_inventory"
@@ -245,6 +356,7 @@ class UserDailyQuestProgress(Base):
     id = Column(String(40), primary_key=True)
     user_id = Column(String(40), ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)
     quest_key = Column(String(50), nullable=False)
+    # The day for daily quests, the first day of the week/month for weekly and monthly ones
     date = Column(Date, nullable=False)
     progress = Column(Integer, nullable=False, server_default="0")
     completed = Column(Boolean, nullable=False, server_default="false")
@@ -263,7 +375,15 @@ class Leaderboard(Base):
     status = Column(String(20), nullable=False, server_default="open")  # "open" | "closed"
     week_start = Column(TIMESTAMP(timezone=True), nullable=False)
     week_end = Column(TIMESTAMP(timezone=True), nullable=False)
+    # Seats taken, claimed atomically by claim_leaderboard_seat (see leaderboard_utils)
+    member_count = Column(Integer, nullable=False, server_default="0")
+    # Bumped by every change to the ranking (XP, seats, names), so a ranking cached by one
+    # process can be checked against the database (see leaderboard_ranking_utils)
+    ranking_version = Column(Integer, nullable=False, server_default="0")
     entries = relationship("LeaderboardEntry", back_populates="leaderboard", cascade="all, delete-orphan")
+    __table_args__ = (
+        Index("ix_leaderboards_rank_status_week_start", "rank", "status", "week_start"),
+    )
 
 
 class LeaderboardEntry(Base):
@@ -277,6 +397,8 @@ class LeaderboardEntry(Base):
     user = relationship("User", back_populates="leaderboard_entries")
     __table_args__ = (
         UniqueConstraint("leaderboard_id", "user_id", name="uq_leaderboard_entry_user"),
+        # A learner's entries; also keeps the ON DELETE CASCADE from users from scanning the table
+        Index("ix_leaderboard_entries_user_id", "user_id"),
     )
 
 
@@ -338,3 +460,63 @@ class Feedback(Base):
     __table_args__ = (
         UniqueConstraint("user_id", "course_id", name="uq_feedback_user_course"),
     )
+
+
+class OutboxEvent(Base):
+    # Side effects of learner activity, written in the same transaction as the activity and
+    # applied by the outbox worker (see outbox_utils)
+    __tablename__ = "outbox_events"
+
+    id = Column(String(40), primary_key=True)
+    # event_type: 'lesson_completed' | 'lessons_synced' | 'course_enrolled'
+    event_type = Column(String(50), nullable=False)
+    user_id = Column(String(40), ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)
+    payload = Column(JSONB, nullable=False)
+    # "pending" | "processing" | "processed" | "failed"
+    status = Column(String(20), nullable=False, server_default="pending")
+    attempts = Column(Integer, nullable=False, server_default="0")
+    last_error = Column(Text, nullable=True)
+    # Rewards produced by the event, returned to the learner by GET /student/rewards/{id}
+    result = Column(JSONB, nullable=True)
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text("CURRENT_TIMESTAMP"))
+    claimed_at = Column(TIMESTAMP(timezone=True), nullable=True)
+    processed_at = Column(TIMESTAMP(timezone=True), nullable=True)
+    __table_args__ = (
+        Index("ix_outbox_events_status_created_at", "status", "created_at"),
+    )
+
+
+class IdempotencyRecord(Base):
+    # Responses of mutating learner requests sent with an Idempotency-Key header, replayed to
+    # retries of the same request within the idempotency window (see idempotency_utils)
+    __tablename__ = "idempotency_keys"
+
+    user_id = Column(String(40), ForeignKey("users.user_id", ondelete="CASCADE"), primary_key=True)
+    # Route the key was used on, e.g. 'student.complete_lesson'
+    endpoint = Column(String(100), primary_key=True)
+    idempotency_key = Column(String(255), primary_key=True)
+    # SHA-256 of the request body, so a key reused for a different request is rejected
+    request_hash = Column(String(64), nullable=False)
+    response_body = Column(JSONB, nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text("CURRENT_TIMESTAMP"))
+    __table_args__ = (
+        Index("ix_idempotency_keys_created_at", "created_at"),
+    )
+
+
+class LeaderboardResetState(Base):
+    # Single row (id 1): how far the weekly leaderboard reset has got (see leaderboard_utils)
+    __tablename__ = "leaderboard_reset_state"
+
+    id = Column(Integer, primary_key=True)
+    # Start of the week the last completed reset ran in; leaderboards ending by then are all closed
+    last_reset_week_start = Column(TIMESTAMP(timezone=True), nullable=False)
+    updated_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text("CURRENT_TIMESTAMP"))
+
+
+class CacheVersion(Base):
+    # One row per data set cached in every process, bumped when the data changes (see cache_utils)
+    __tablename__ = "cache_versions"
+
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, server_default="0")
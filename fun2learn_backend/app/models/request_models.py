@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from datetime import date
+from datetime import date, datetime
 from typing import Literal, List, Optional
 
 class SignUpRequest(BaseModel):
@@ -52,6 +52,35 @@ class AddTextQuestionRequest(BaseModel):
     correct_answer: str
     casing_matters: bool = False
 
+class CourseDocumentQuestion(BaseModel):
+    question_text: str
+    question_type: Literal['mcq', 'text']
+    # mcq questions only
+    options: List[MCQOptionRequest] = []
+    # text questions only
+    correct_answer: Optional[str] = None
+    casing_matters: bool = False
+
+class CourseDocumentLesson(BaseModel):
+    name: str
+    questions: List[CourseDocumentQuestion] = []
+
+class CourseDocumentChapter(BaseModel):
+    name: str
+    lessons: List[CourseDocumentLesson] = []
+
+class CourseDocumentUnit(BaseModel):
+    name: str
+    description: str
+    chapters: List[CourseDocumentChapter] = []
+
+# Same document format as the course export
+class ImportCourseRequest(BaseModel):
+    name: str
+    description: str
+    tag_ids: List[str] = []
+    units: List[CourseDocumentUnit] = []
+
 class EditCourseRequest(BaseModel):
     course_id: str
     name: str
@@ -127,6 +156,20 @@ class CompleteLessonRequest(BaseModel):
     lesson_id: str
     course_id: str
 
+class SyncAction(BaseModel):
+    # "answer" uses question_id and answer, "complete_lesson" uses lesson_id and course_id
+    type: Literal['answer', 'complete_lesson']
+    # When the learner did it on the device
+    client_timestamp: datetime
+    question_id: Optional[str] = None
+    answer: Optional[str] = None
+    lesson_id: Optional[str] = None
+    course_id: Optional[str] = None
+
+class SyncRequest(BaseModel):
+    # In the order the learner did them
+    actions: List[SyncAction]
+
 class InitiatePaymentRequest(BaseModel):
     package_id: str
 
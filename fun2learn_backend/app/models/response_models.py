@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from typing import Optional, List
-from datetime import datetime
+from datetime import datetime, date
 
 class SignUpResponse(BaseModel):
     status: str
@@ -47,6 +47,15 @@ class AddTextQuestionResponse(BaseModel):
     message: str
     question_id: str
 
+class ImportCourseResponse(BaseModel):
+    status: str
+    message: str
+    course_id: str
+    unit_count: int
+    chapter_count: int
+    lesson_count: int
+    question_count: int
+
 class EditCourseResponse(BaseModel):
     status: str
     message: str
@@ -368,6 +377,7 @@ class GetBrowseCoursesResponse(BaseModel):
     status: str
     message: str
     courses: List[BrowseCourseSummary]
+    next_cursor: Optional[str] = None
 
 class GetCoursePublicDetailResponse(BaseModel):
     status: str
@@ -503,6 +513,7 @@ class DailyQuestDetail(BaseModel):
     description: str
     icon: str
     quest_type: str
+    period: str = "daily"  # "daily" | "weekly" | "monthly"
     goal: int
     gems: int
     xp: int = 0
@@ -517,11 +528,71 @@ class GetDailyQuestsResponse(BaseModel):
     total_gems: int
 
 
+class ActivityDayDetail(BaseModel):
+    date: date
+    lessons: int
+    xp: int
+    gems: int
+
+
+class GetActivityHeatmapResponse(BaseModel):
+    status: str
+    message: str
+    start_date: date
+    end_date: date
+    days: List[ActivityDayDetail]  # active days only, oldest first
+    active_days: int
+    total_lessons: int
+    total_xp: int
+
+
+class XpHistoryPoint(BaseModel):
+    period: str  # first day of the period, "2026-01-05"
+    xp: int
+    cumulative_xp: int  # XP earned from start_date to the end of this period
+
+
+class GetXpHistoryResponse(BaseModel):
+    status: str
+    message: str
+    granularity: str
+    start_date: date
+    end_date: date
+    points: List[XpHistoryPoint]
+
+
 class CompleteLessonResponse(BaseModel):
     status: str
     message: str
     next_lesson_id: Optional[str] = None
     course_completed: bool = False
+    # Rewards are applied in the background, poll GET /student/rewards/{reward_event_id}
+    reward_event_id: Optional[str] = None
+
+class SyncActionResult(BaseModel):
+    # Position of the action in the request
+    index: int
+    type: str
+    # "ok" | "error"
+    result: str
+    message: str
+    is_correct: Optional[bool] = None
+    correct_answer: Optional[str] = None
+    next_lesson_id: Optional[str] = None
+    course_completed: bool = False
+
+class SyncResponse(BaseModel):
+    status: str
+    message: str
+    results: List[SyncActionResult] = []
+    # Rewards of all completions in the batch, poll GET /student/rewards/{reward_event_id}
+    reward_event_id: Optional[str] = None
+
+class GetRewardsResponse(BaseModel):
+    status: str
+    message: str
+    # "pending" | "processed" | "failed"
+    event_status: str
     streak_updated: bool = False
     daily_streak: int = 0
     newly_unlocked_achievements: List[NewlyUnlockedAchievement] = []
@@ -582,6 +653,18 @@ class GetLeaderboardResponse(BaseModel):
     total_members: int
 
 
+class GetFriendsLeaderboardResponse(BaseModel):
+    status: str
+    message: str
+    week_start: datetime
+    week_end: datetime
+    # The learner and everyone they follow
+    members: List[LeaderboardMemberDetail]
+    my_position: int
+    my_xp: int
+    total_members: int
+
+
 class InitiatePaymentResponse(BaseModel):
     status: str
     message: str
@@ -661,6 +744,12 @@ class AdminStatsResponse(BaseModel):
     pending_redeem_requests: int
 
 
+class RefreshAchievementCatalogResponse(BaseModel):
+    status: str
+    message: str
+    achievement_count: int
+
+
 # ─── Tutor Analytics response models ─────────────────────────────
 
 class TrendPoint(BaseModel):
@@ -1,15 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from sqlalchemy import select, func
+from sqlalchemy import select, update, func
 from app.auth.dependencies import require_role
 from app.utils.db_utils import get_db
 from app.models.models import TokenUser
 from app.models.request_models import UpdateRedeemStatusRequest
 from app.models.response_models import (
     GetAdminRedeemRequestsResponse, RedeemRequestDetail,
-    UpdateRedeemStatusResponse, AdminStatsResponse
+    UpdateRedeemStatusResponse, AdminStatsResponse, RefreshAchievementCatalogResponse
 )
-from app.models.db_models import TutorRedeemRequest, UserInventory, User, Course, Enrollment
+from app.models.db_models import TutorRedeemRequest, User, Course, Enrollment
+from app.utils.achievement_catalog_utils import refresh_achievement_catalog, bump_achievement_catalog_version
+from app.utils.inventory_utils import credit_inventory
 import logging
 from datetime import datetime, timezone
 
@@ -76,33 +78,31 @@ async def update_redeem_status(
         if request.status not in ("paid", "rejected"):
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="status must be 'paid' or 'rejected'")
 
-        redeem_req = db.execute(
-            select(TutorRedeemRequest).where(TutorRedeemRequest.id == request.request_id)
-        ).scalar_one_or_none()
-
-        if not redeem_req:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Redeem request not found")
-
-        if redeem_req.status != "pending":
+        # Move the request out of pending atomically, so it is only ever processed (and refunded) once
+        processed = db.execute(
+            update(TutorRedeemRequest)
+            .where(TutorRedeemRequest.id == request.request_id, TutorRedeemRequest.status == "pending")
+            .values(status=request.status, notes=request.notes, processed_at=datetime.now(timezone.utc))
+            .returning(TutorRedeemRequest.tutor_id, TutorRedeemRequest.gems_requested)
+        ).first()
+
+        if processed is None:
+            exists = db.execute(
+                select(TutorRedeemRequest.id).where(TutorRedeemRequest.id == request.request_id)
+            ).scalar_one_or_none()
+            if not exists:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Redeem request not found")
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Only pending requests can be updated")
 
         # If rejected, refund gems to tutor
         if request.status == "rejected":
-            tutor_inventory = db.execute(
-                select(UserInventory).where(UserInventory.user_id == redeem_req.tutor_id)
-            ).scalar_one_or_none()
-            if tutor_inventory:
-                tutor_inventory.gems += redeem_req.gems_requested
-
-        redeem_req.status = request.status
-        redeem_req.notes = request.notes
-        redeem_req.processed_at = datetime.now(timezone.utc)
+            credit_inventory(processed.tutor_id, db, gems=processed.gems_requested)
         db.commit()
 
         return UpdateRedeemStatusResponse(
             status="success",
             message=f"Request {request.status} successfully",
-            request_id=redeem_req.id,
+            request_id=request.request_id,
         )
     except HTTPException:
         raise
@@ -139,3 +139,26 @@ async def get_admin_stats(
     except Exception as e:
         logger.exception(f"Error getting admin stats: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Internal Server Error")
+
+
+@router.post("/achievements/refresh-catalog")
+async def refresh_achievements(
+    current_user: TokenUser = Depends(require_role("admin")),
+    db: Session = Depends(get_db),
+):
+    """Reload the achievement catalog in every process after the achievements table was changed (admin only)."""
+    try:
+        bump_achievement_catalog_version(db)
+        db.commit()
+        catalog = refresh_achievement_catalog(db)
+
+        return RefreshAchievementCatalogResponse(
+            status="success",
+            message="Achievement catalog refreshed successfully",
+            achievement_count=len(catalog.achievements),
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Error refreshing achievement catalog: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Internal Server Error")
@@ -8,7 +8,7 @@ from datetime import date, datetime, timedelta, timezone
 
 from app.models.request_models import SignUpRequest, SignInRequest, ForgotPasswordRequest, ResetPasswordRequest
 from app.models.response_models import SignUpResponse, SignInResponse, ErrorResponse
-from app.models.db_models import User, UserInventory, ForgotPasswordRequests
+from app.models.db_models import User, UserInventory, UserStats, ForgotPasswordRequests
 from app.utils.auth_utils import hash_password, verify_password, create_access_token
 from app.utils.db_utils import get_db
 from app.utils.email_utils import send_forgot_password_email
@@ -88,6 +88,7 @@ async def signup(
                 user_id=user_id
             )
             db.add(inventory)
+            db.add(UserStats(user_id=user_id))
 
         db.commit()
         db.refresh(new_user)
@@ -1,11 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
 from app.utils.db_utils import get_db
 from app.auth.dependencies import require_role
 from sqlalchemy.orm import Session
 from app.models.models import TokenUser
 from app.models.request_models import (
     CourseCreateRequest, AddUnitRequest, AddChapterRequest, AddLessonRequest,
-    AddMCQQuestionRequest, AddTextQuestionRequest,
+    AddMCQQuestionRequest, AddTextQuestionRequest, ImportCourseRequest,
     EditCourseRequest, DeleteCourseRequest,
     EditUnitRequest, DeleteUnitRequest,
     EditChapterRequest, DeleteChapterRequest,
@@ -16,7 +17,7 @@ from app.models.request_models import (
 )
 from app.models.response_models import (
     CourseCreationResponse, AddUnitResponse, AddChapterResponse, AddLessonResponse,
-    AddMCQQuestionResponse, AddTextQuestionResponse,
+    AddMCQQuestionResponse, AddTextQuestionResponse, ImportCourseResponse,
     EditCourseResponse, DeleteCourseResponse,
     EditUnitResponse, DeleteUnitResponse,
     EditChapterResponse, DeleteChapterResponse,
@@ -31,9 +32,17 @@ from app.models.response_models import (
 )
 import logging
 from sqlalchemy import select, func, desc
-from app.models.db_models import Course, Unit, Chapter, Lesson, Question, MCQOption, TextAnswer, LessonAttachment, Tag, CourseTag, Badge
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from app.models.db_models import Course, CourseStats, Unit, Chapter, Lesson, Question, MCQOption, TextAnswer, LessonAttachment, Tag, CourseTag, Badge
 from app.utils.exceptions import UnauthorizedUserException, NotFoundException, ExistingResourceException
 from app.utils.boto3_utils import upload_file_to_s3, delete_file_from_s3, get_presigned_url_from_path
+from app.utils.course_tree_utils import CourseTree, load_course_tree
+from app.utils.course_snapshot_utils import publish_course_snapshot
+from app.utils.course_document_utils import validate_course_document, insert_course_document, export_course_document
+from app.utils.lesson_sequence_utils import sync_lesson_sequence
+from app.utils.course_stats_utils import get_course_stats, set_course_content_counts, adjust_course_stats
+from app.utils.cache_utils import bump_catalog_version
+from app.utils.etag_utils import make_etag, etag_matches, not_modified, set_etag
 import uuid
 import os
 
@@ -46,6 +55,33 @@ router = APIRouter(
 
 logger = logging.getLogger(__name__)
 
+
+def _refresh_course_structure(course_id: str, db: Session, lessons_removed: bool = False) -> None:
+    """
+    Refresh the data derived from a course's structure (lesson sequence, content counters, snapshot).
+    Call after flushing a unit/chapter/lesson change and before committing.
+    """
+    tree = load_course_tree(course_id, db)
+    sync_lesson_sequence(course_id, db, tree, lessons_removed)
+    set_course_content_counts(tree, db)
+    _on_course_content_changed(course_id, db, tree)
+
+
+def _on_course_content_changed(
+    course_id: str, db: Session, tree: CourseTree | None = None, affects_snapshot: bool = True
+) -> None:
+    """
+    Bump the course's content version and, if the course is live and the change is part of
+    the learner-facing snapshot, write a new snapshot. Drafts get their first one when published.
+    """
+    course = db.get(Course, course_id)
+    if course is None:
+        return
+    course.content_version = Course.content_version + 1
+    if affects_snapshot and course.status == "published":
+        publish_course_snapshot(course, db, tree)
+
+
 @router.post("/create_course")
 async def create_course(
     request: CourseCreateRequest,
@@ -75,6 +111,7 @@ async def create_course(
         )
 
         db.add(new_course)
+        db.add(CourseStats(course_id=course_id))
         db.commit()
         db.refresh(new_course)
 
@@ -90,6 +127,82 @@ async def create_course(
         logger.exception(f"An error occurred while creating course: {str(e)}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Internal Server Error")
 
+@router.post("/import_course")
+async def import_course(
+    request: ImportCourseRequest,
+    current_user: TokenUser = Depends(require_role("tutor", "admin")),
+    db: Session = Depends(get_db)
+):
+    """
+    Create a draft course from a whole course document (units, chapters, lessons, questions, tags)
+    in a single transaction. Accepts the format produced by the course export.
+    """
+    try:
+        user_id = current_user.user_id
+        course_name = request.name.strip()
+
+        stmt = select(func.count()).select_from(Course).where((Course.created_by == user_id) & (func.lower(Course.name) == course_name.lower()))
+        existing_course_count = db.execute(stmt).scalar_one()
+
+        if existing_course_count > 0:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Course with similar name already exists")
+
+        try:
+            validate_course_document(request, db)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+        course_id = insert_course_document(request, user_id, db)
+        tree = load_course_tree(course_id, db)
+        sync_lesson_sequence(course_id, db, tree)
+        set_course_content_counts(tree, db)
+        db.commit()
+
+        return ImportCourseResponse(
+            status="success",
+            message="Course imported successfully",
+            course_id=course_id,
+            unit_count=tree.unit_count,
+            chapter_count=tree.chapter_count,
+            lesson_count=tree.lesson_count,
+            question_count=tree.question_count
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"An error occurred while importing course: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Internal Server Error")
+
+@router.get("/course/{course_id}/export")
+async def export_course(
+    course_id: str,
+    current_user: TokenUser = Depends(require_role("tutor", "admin")),
+    db: Session = Depends(get_db)
+):
+    """
+    Stream a course as a JSON course document that can be passed back to /import_course.
+    """
+    try:
+        course_stmt = select(Course).where(Course.id == course_id)
+        course = db.execute(course_stmt).scalar_one_or_none()
+
+        if course is None:
+            raise NotFoundException("Course")
+        if course.created_by != current_user.user_id:
+            raise UnauthorizedUserException()
+
+        chunks = export_course_document(course, db)
+        return StreamingResponse(
+            chunks,
+            media_type="application/json",
+            headers={"Content-Disposition": f'attachment; filename="course-{course_id}.json"'}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"An error occurred while exporting course: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Internal Server Error")
+
 @router.get("/courses")
 async def get_courses(
     current_user: TokenUser = Depends(require_role("tutor", "admin")),
@@ -105,28 +218,12 @@ async def get_courses(
         courses_stmt = select(Course).where(Course.created_by == user_id).order_by(Course.created_at.desc())
         courses = db.execute(courses_stmt).scalars().all()
 
+        # Counters are denormalized into course_stats, one query for every course
+        stats = get_course_stats([course.id for course in courses], db)
+
         course_summaries = []
         for course in courses:
-            # Count units
-            unit_count = len(course.units)
-
-            # Count chapters
-            chapter_count = sum(len(unit.chapters) for unit in course.units)
-
-            # Count lessons
-            lesson_count = sum(
-                len(chapter.lessons)
-                for unit in course.units
-                for chapter in unit.chapters
-            )
-
-            # Count questions
-            question_count = sum(
-                len(lesson.questions)
-                for unit in course.units
-                for chapter in unit.chapters
-                for lesson in chapter.lessons
-            )
+            course_stats = stats[course.id]
 
             course_summaries.append(CourseSummary(
                 id=course.id,
@@ -134,10 +231,10 @@ async def get_courses(
                 description=course.description,
                 status=course.status,
                 created_at=course.created_at,
-                unit_count=unit_count,
-                chapter_count=chapter_count,
-                lesson_count=lesson_count,
-                question_count=question_count,
+                unit_count=course_stats.unit_count,
+                chapter_count=course_stats.chapter_count,
+                lesson_count=course_stats.lesson_count,
+                question_count=course_stats.question_count,
                 price_gems=course.price_gems,
                 discount_percent=course.discount_percent
             ))
@@ -156,6 +253,8 @@ async def get_courses(
 @router.get("/course/{course_id}")
 async def get_course_detail(
     course_id: str,
+    request: Request,
+    response: Response,
     current_user: TokenUser = Depends(require_role("tutor", "admin")),
     db: Session = Depends(get_db)
 ):
@@ -173,19 +272,25 @@ async def get_course_detail(
         if course.created_by != current_user.user_id:
             raise UnauthorizedUserException()
 
+        etag = make_etag("course", course.id, course.content_version)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        set_etag(response, etag)
+
         # Build nested structure
+        tree = load_course_tree(course_id, db)
         units = []
-        for unit in sorted(course.units, key=lambda u: u.unit_index):
+        for unit in tree.units:
             chapters = []
-            for chapter in sorted(unit.chapters, key=lambda c: c.chapter_index):
+            for chapter in unit.chapters:
                 lessons = []
-                for lesson in sorted(chapter.lessons, key=lambda l: l.lesson_index):
+                for lesson in chapter.lessons:
                     lessons.append(LessonDetail(
                         id=lesson.id,
                         name=lesson.name,
                         lesson_index=lesson.lesson_index,
                         created_at=lesson.created_at,
-                        question_count=len(lesson.questions)
+                        question_count=lesson.question_count
                     ))
 
                 chapters.append(ChapterDetail(
@@ -276,6 +381,9 @@ async def add_unit(
         )
 
         db.add(new_unit)
+        db.flush()
+        _refresh_course_structure(course_id, db)
+        bump_catalog_version(db)
         db.commit()
         db.refresh(new_unit)
 
@@ -340,6 +448,9 @@ async def add_chapter(
         )
 
         db.add(new_chapter)
+        db.flush()
+        _refresh_course_structure(unit.course_id, db)
+        bump_catalog_version(db)
         db.commit()
         db.refresh(new_chapter)
 
@@ -404,6 +515,9 @@ async def add_lesson(
         )
 
         db.add(new_lesson)
+        db.flush()
+        _refresh_course_structure(chapter.unit.course_id, db)
+        bump_catalog_version(db)
         db.commit()
         db.refresh(new_lesson)
 
@@ -459,16 +573,20 @@ async def add_mcq_question(
         db.add(new_question)
 
         # Create MCQ options
-        for option in request.options:
+        for option_index, option in enumerate(request.options, start=1):
             option_id = str(uuid.uuid4())
             new_option = MCQOption(
                 id = option_id,
                 option_text = option.option_text,
                 is_correct = option.is_correct,
+                option_index = option_index,
                 question_id = question_id
             )
             db.add(new_option)
 
+        db.flush()
+        adjust_course_stats(lesson.chapter.unit.course_id, db, question_count=1)
+        _on_course_content_changed(lesson.chapter.unit.course_id, db)
         db.commit()
         db.refresh(new_question)
 
@@ -527,6 +645,9 @@ async def add_text_question(
         )
         db.add(new_answer)
 
+        db.flush()
+        adjust_course_stats(lesson.chapter.unit.course_id, db, question_count=1)
+        _on_course_content_changed(lesson.chapter.unit.course_id, db)
         db.commit()
         db.refresh(new_question)
 
@@ -579,6 +700,9 @@ async def edit_course(
         course.name = course_name
         course.description = request.description
 
+        db.flush()
+        _on_course_content_changed(course_id, db)
+        bump_catalog_version(db)
         db.commit()
         db.refresh(course)
 
@@ -617,6 +741,7 @@ async def delete_course(
 
         # Delete course (cascade will handle related records)
         db.delete(course)
+        bump_catalog_version(db)
         db.commit()
 
         return DeleteCourseResponse(
@@ -659,53 +784,24 @@ async def publish_course(
                 detail="Course is already published"
             )
 
-        # Validate course has at least one unit
-        unit_count_stmt = select(func.count()).select_from(Unit).where(Unit.course_id == course_id)
-        unit_count = db.execute(unit_count_stmt).scalar_one()
-
-        if unit_count == 0:
+        # Validate structure from the course tree, which also becomes the published snapshot
+        tree = load_course_tree(course_id, db)
+        if tree.unit_count == 0:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Course must have at least one unit before publishing"
             )
-
-        # Validate that at least one unit has chapters
-        chapter_count_stmt = select(func.count()).select_from(Chapter).join(
-            Unit, Chapter.unit_id == Unit.id
-        ).where(Unit.course_id == course_id)
-        chapter_count = db.execute(chapter_count_stmt).scalar_one()
-
-        if chapter_count == 0:
+        if tree.chapter_count == 0:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Course must have at least one chapter before publishing"
             )
-
-        # Validate that at least one chapter has lessons
-        lesson_count_stmt = select(func.count()).select_from(Lesson).join(
-            Chapter, Lesson.chapter_id == Chapter.id
-        ).join(
-            Unit, Chapter.unit_id == Unit.id
-        ).where(Unit.course_id == course_id)
-        lesson_count = db.execute(lesson_count_stmt).scalar_one()
-
-        if lesson_count == 0:
+        if tree.lesson_count == 0:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Course must have at least one lesson before publishing"
             )
-
-        # Validate that at least one lesson has questions
-        question_count_stmt = select(func.count()).select_from(Question).join(
-            Lesson, Question.lesson_id == Lesson.id
-        ).join(
-            Chapter, Lesson.chapter_id == Chapter.id
-        ).join(
-            Unit, Chapter.unit_id == Unit.id
-        ).where(Unit.course_id == course_id)
-        question_count = db.execute(question_count_stmt).scalar_one()
-
-        if question_count == 0:
+        if tree.question_count == 0:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Course must have at least one question before publishing"
@@ -713,6 +809,11 @@ async def publish_course(
 
         # Update course status to published
         course.status = "published"
+        course.content_version = Course.content_version + 1
+        publish_course_snapshot(course, db, tree)
+        # The catalog joins on course_stats, so make sure the row exists
+        get_course_stats([course_id], db)
+        bump_catalog_version(db)
         db.commit()
         db.refresh(course)
 
@@ -750,6 +851,8 @@ async def set_course_price(
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="price_gems must be a positive integer")
 
         course.price_gems = request.price_gems
+        _on_course_content_changed(course.id, db, affects_snapshot=False)
+        bump_catalog_version(db)
         db.commit()
 
         return SetCoursePriceResponse(
@@ -792,6 +895,8 @@ async def set_course_discount(
                 raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cannot set a discount on a free course. Set a price first.")
 
         course.discount_percent = request.discount_percent
+        _on_course_content_changed(course.id, db, affects_snapshot=False)
+        bump_catalog_version(db)
         db.commit()
 
         effective_price = None
@@ -849,6 +954,8 @@ async def edit_unit(
         unit.name = request.name
         unit.description = request.description
 
+        db.flush()
+        _on_course_content_changed(unit.course_id, db)
         db.commit()
         db.refresh(unit)
 
@@ -886,7 +993,13 @@ async def delete_unit(
             raise UnauthorizedUserException()
 
         # Delete unit (cascade will handle related records)
+        course_id = unit.course_id
+        # The delete cascade loads the children anyway
+        lessons_removed = any(chapter.lessons for chapter in unit.chapters)
         db.delete(unit)
+        db.flush()
+        _refresh_course_structure(course_id, db, lessons_removed)
+        bump_catalog_version(db)
         db.commit()
 
         return DeleteUnitResponse(
@@ -935,6 +1048,8 @@ async def edit_chapter(
         # Update chapter
         chapter.name = request.name
 
+        db.flush()
+        _on_course_content_changed(chapter.unit.course_id, db)
         db.commit()
         db.refresh(chapter)
 
@@ -972,7 +1087,13 @@ async def delete_chapter(
             raise UnauthorizedUserException()
 
         # Delete chapter (cascade will handle related records)
+        course_id = chapter.unit.course_id
+        # The delete cascade loads the lessons anyway
+        lessons_removed = bool(chapter.lessons)
         db.delete(chapter)
+        db.flush()
+        _refresh_course_structure(course_id, db, lessons_removed)
+        bump_catalog_version(db)
         db.commit()
 
         return DeleteChapterResponse(
@@ -1021,6 +1142,8 @@ async def edit_lesson(
         # Update lesson
         lesson.name = request.name
 
+        db.flush()
+        _on_course_content_changed(lesson.chapter.unit.course_id, db)
         db.commit()
         db.refresh(lesson)
 
@@ -1058,7 +1181,11 @@ async def delete_lesson(
             raise UnauthorizedUserException()
 
         # Delete lesson (cascade will handle related records)
+        course_id = lesson.chapter.unit.course_id
         db.delete(lesson)
+        db.flush()
+        _refresh_course_structure(course_id, db, lessons_removed=True)
+        bump_catalog_version(db)
         db.commit()
 
         return DeleteLessonResponse(
@@ -1108,16 +1235,19 @@ async def edit_mcq_question(
             db.delete(option)
 
         # Create new options
-        for option in request.options:
+        for option_index, option in enumerate(request.options, start=1):
             option_id = str(uuid.uuid4())
             new_option = MCQOption(
                 id = option_id,
                 option_text = option.option_text,
                 is_correct = option.is_correct,
+                option_index = option_index,
                 question_id = question_id
             )
             db.add(new_option)
 
+        db.flush()
+        _on_course_content_changed(question.lesson.chapter.unit.course_id, db, affects_snapshot=False)
         db.commit()
         db.refresh(question)
 
@@ -1175,6 +1305,8 @@ async def edit_text_question(
             )
             db.add(new_answer)
 
+        db.flush()
+        _on_course_content_changed(question.lesson.chapter.unit.course_id, db, affects_snapshot=False)
         db.commit()
         db.refresh(question)
 
@@ -1211,8 +1343,13 @@ async def delete_question(
         if question.lesson.chapter.unit.course.created_by != current_user.user_id:
             raise UnauthorizedUserException()
 
+        course_id = question.lesson.chapter.unit.course_id
+
         # Delete question (cascade will handle related MCQ options or text answers)
         db.delete(question)
+        db.flush()
+        adjust_course_stats(course_id, db, question_count=-1)
+        _on_course_content_changed(course_id, db)
         db.commit()
 
         return DeleteQuestionResponse(
@@ -1338,6 +1475,8 @@ async def upload_lesson_attachment(
         )
 
         db.add(new_attachment)
+        db.flush()
+        _on_course_content_changed(lesson.chapter.unit.course_id, db, affects_snapshot=False)
         db.commit()
         db.refresh(new_attachment)
 
@@ -1442,7 +1581,10 @@ async def delete_lesson_attachment(
                 # Continue with database deletion even if S3 deletion fails
 
         # Delete attachment record from database
+        course_id = attachment.lesson.chapter.unit.course_id
         db.delete(attachment)
+        db.flush()
+        _on_course_content_changed(course_id, db, affects_snapshot=False)
         db.commit()
 
         return DeleteLessonAttachmentResponse(
@@ -1460,6 +1602,8 @@ async def delete_lesson_attachment(
 
 @router.get("/tags")
 async def get_tags(
+    request: Request,
+    response: Response,
     current_user: TokenUser = Depends(require_role("tutor", "admin")),
     db: Session = Depends(get_db)
 ):
@@ -1467,6 +1611,15 @@ async def get_tags(
     Get all available tags.
     """
     try:
+        # Digest of the tag list computed in the database, so a match skips loading the rows
+        tags_digest = db.execute(
+            select(func.md5(func.string_agg(Tag.id + ":" + Tag.name, aggregate_order_by(",", Tag.id))))
+        ).scalar_one()
+        etag = make_etag("tags", tags_digest)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        set_etag(response, etag)
+
         tags_stmt = select(Tag).order_by(Tag.name)
         tags = db.execute(tags_stmt).scalars().all()
 
@@ -1558,6 +1711,9 @@ async def save_course_tags(
             )
             db.add(new_ct)
 
+        db.flush()
+        _on_course_content_changed(course_id, db)
+        bump_catalog_version(db)
         db.commit()
 
         return SaveCourseTagsResponse(
@@ -1658,6 +1814,9 @@ async def create_badge_icon(
         )
 
         db.add(new_badge)
+        db.flush()
+        _on_course_content_changed(course_id, db)
+        bump_catalog_version(db)
         db.commit()
         db.refresh(new_badge)
 
@@ -1732,6 +1891,9 @@ async def create_badge_image(
         )
 
         db.add(new_badge)
+        db.flush()
+        _on_course_content_changed(course_id, db)
+        bump_catalog_version(db)
         db.commit()
         db.refresh(new_badge)
 
@@ -1,12 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.responses import RedirectResponse
 from sqlalchemy.orm import Session
+from sqlalchemy import update
 from app.auth.dependencies import get_current_user
 from app.utils.db_utils import get_db
 from app.models.models import TokenUser
 from app.models.request_models import InitiatePaymentRequest
 from app.models.response_models import InitiatePaymentResponse
-from app.models.db_models import GemPurchaseOrder, UserInventory
+from app.models.db_models import GemPurchaseOrder
+from app.utils.inventory_utils import credit_inventory
+from app.utils.idempotency_utils import begin_idempotent_request
 import logging
 import uuid
 import hmac
@@ -44,9 +47,15 @@ def _sign(secret_key: str, total_amount: str, transaction_uuid: str, product_cod
 @router.post("/initiate", response_model=InitiatePaymentResponse)
 async def initiate_payment(
     request: InitiatePaymentRequest,
+    http_request: Request,
     current_user: TokenUser = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
+    # A retry with the same Idempotency-Key gets the first order back instead of a new one
+    idempotency = begin_idempotent_request(http_request, "payment.initiate", current_user.user_id, request, db)
+    if idempotency.replay is not None:
+        return idempotency.replay
+
     pkg = PACKAGE_MAP.get(request.package_id)
     if not pkg:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Package not found")
@@ -70,11 +79,10 @@ async def initiate_payment(
         status="pending",
     )
     db.add(order)
-    db.commit()
 
     signature = _sign(secret_key, total_amount, transaction_uuid, product_code)
 
-    return InitiatePaymentResponse(
+    response = InitiatePaymentResponse(
         status="success",
         message="Payment initiated",
         amount=total_amount,
@@ -90,6 +98,8 @@ async def initiate_payment(
         signature=signature,
         epay_url=epay_url,
     )
+    replay = idempotency.commit(response, db)
+    return replay if replay is not None else response
 
 
 @router.get("/success")
@@ -141,12 +151,19 @@ async def payment_success(data: str, db: Session = Depends(get_db)):
         # Already processed (duplicate callback) — just redirect to success
         return RedirectResponse(f"{frontend_url}/student/marketplace/success?gems={order.gems}")
 
-    # Credit gems to the user's inventory
-    inventory = db.query(UserInventory).filter_by(user_id=order.user_id).first()
-    if inventory:
-        inventory.gems += order.gems
+    # Complete the order atomically, so concurrent duplicate callbacks credit the gems only once
+    claimed = db.execute(
+        update(GemPurchaseOrder)
+        .where(GemPurchaseOrder.id == order.id, GemPurchaseOrder.status == "pending")
+        .values(status="completed")
+        .returning(GemPurchaseOrder.id)
+    ).first()
+    if claimed is None:
+        db.rollback()
+        return RedirectResponse(f"{frontend_url}/student/marketplace/success?gems={order.gems}")
 
-    order.status = "completed"
+    # Credit gems to the user's inventory
+    credit_inventory(order.user_id, db, gems=order.gems)
     db.commit()
 
     logger.info(f"Credited {order.gems} gems to user {order.user_id} (transaction {transaction_uuid})")
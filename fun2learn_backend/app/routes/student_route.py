@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from app.utils.db_utils import get_db
 from app.auth.dependencies import get_current_user, require_role
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload, selectinload, aliased
 from app.models.models import TokenUser
-from app.models.request_models import EnrollCourseRequest, SubmitAnswerRequest, CompleteLessonRequest, SubmitFeedbackRequest
+from app.models.request_models import (
+    EnrollCourseRequest, SubmitAnswerRequest, CompleteLessonRequest, SyncRequest, SyncAction, SubmitFeedbackRequest
+)
 from app.models.response_models import (
     GetBrowseCoursesResponse, BrowseCourseSummary,
     GetCoursePublicDetailResponse, CourseFeedbackItem, GetCourseFeedbackResponse,
@@ -12,27 +14,56 @@ from app.models.response_models import (
     GetMyCoursesResponse, EnrolledCourseSummary,
     GetStudentCourseDetailResponse, StudentCourseDetail, StudentUnitDetail, StudentChapterDetail, StudentLessonDetail,
     GetStudentLessonResponse, StudentQuestionDetail, StudentMCQOption, LessonAttachmentDetail,
-    SubmitAnswerResponse, CompleteLessonResponse, NewlyUnlockedAchievement,
+    SubmitAnswerResponse, CompleteLessonResponse, SyncActionResult, SyncResponse, GetRewardsResponse,
     TagDetail, BadgeDetail,
     GetStreakResponse,
     UserAchievementDetail, GetAchievementsResponse,
-    CompletedQuestInfo, DailyQuestDetail, GetDailyQuestsResponse,
-    LeaderboardMemberDetail, GetLeaderboardResponse
+    DailyQuestDetail, GetDailyQuestsResponse,
+    ActivityDayDetail, GetActivityHeatmapResponse, XpHistoryPoint, GetXpHistoryResponse,
+    LeaderboardMemberDetail, GetLeaderboardResponse, GetFriendsLeaderboardResponse
 )
 import logging
-from sqlalchemy import select, func
+from typing import List, Optional
+from sqlalchemy import select, insert, update, func, tuple_, and_
 from app.models.db_models import (
-    Course, Unit, Chapter, Lesson, Question, MCQOption, TextAnswer,
+    Course, Unit, Chapter, Lesson, Question, TextAnswer,
     LessonAttachment, Enrollment, CourseProgress, LessonCompletion, Tag, CourseTag,
-    UserInventory, StreakEntry, Achievement, UserAchievement, UserDailyQuestProgress,
-    Leaderboard, LeaderboardEntry, Feedback
+    UserAchievement,
+    Leaderboard, LeaderboardEntry, Feedback, CourseStats, CourseLessonSequence, User, OutboxEvent
+)
+from app.utils.leaderboard_utils import (
+    RANKS, PROMOTION_COUNT, RELEGATION_COUNT, get_current_week_bounds, claim_leaderboard_seat,
+    reset_leaderboards_if_due
 )
-from app.utils.leaderboard_utils import RANKS, LEADERBOARD_MAX_SIZE, PROMOTION_COUNT, RELEGATION_COUNT, get_current_week_bounds
 from app.utils.exceptions import NotFoundException
 from app.utils.boto3_utils import get_presigned_url_from_path
+from app.utils.course_snapshot_utils import get_course_snapshot
+from app.utils.course_stats_utils import get_course_stats, adjust_course_stats
+from app.utils.user_stats_utils import adjust_user_stats, user_stats_update
+from app.utils.daily_activity_utils import (
+    daily_activity_upsert, parse_activity_range, get_daily_activity, period_start, iter_periods,
+    XP_HISTORY_GRANULARITIES
+)
+from app.utils.cache_utils import catalog_cache, get_catalog_version, bump_catalog_version
+from app.utils.progress_bitmap_utils import ensure_progress_bitmap, has_bit, set_bit, count_bits
+from app.utils.etag_utils import make_etag, etag_matches, not_modified, set_etag
+from app.utils.pagination_utils import encode_cursor, decode_cursor, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.utils.lesson_sequence_utils import get_first_lesson_entry, get_lesson_entry_with_next
+from app.utils.gamification_utils import get_achievement_values
+from app.utils.quest_utils import QUEST_REGISTRY, load_quest_progress, quest_detail
+from app.utils.achievement_catalog_utils import get_achievement_catalog
+from app.utils.outbox_utils import outbox_event_insert
+from app.utils.idempotency_utils import begin_idempotent_request
+from app.utils.inventory_utils import get_or_create_inventory, credit_inventory, debit_gems
+from app.utils.leaderboard_membership_utils import (
+    LeaderboardMembership, get_leaderboard_membership, remember_leaderboard_membership
+)
+from app.utils.leaderboard_ranking_utils import RankedLeaderboard, get_ranked_leaderboard, load_ranked_leaderboard
+from app.utils.weekly_xp_utils import get_friends_weekly_xp
 from datetime import date, timedelta, datetime, timezone
 import uuid
 import os
+import time
 
 _SHOW_NAME = "student"
 router = APIRouter(
@@ -43,256 +74,13 @@ router = APIRouter(
 
 logger = logging.getLogger(__name__)
 
+# Lesson attachment URLs are presigned for an hour, lesson ETags change every half hour
+LESSON_ETAG_WINDOW_SECONDS = 1800
 
-def _get_first_lesson(course: Course):
-    """Get the first unit, chapter, and lesson of a course (by index order)."""
-    units = sorted(course.units, key=lambda u: u.unit_index)
-    for unit in units:
-        chapters = sorted(unit.chapters, key=lambda c: c.chapter_index)
-        for chapter in chapters:
-            lessons = sorted(chapter.lessons, key=lambda l: l.lesson_index)
-            if lessons:
-                return unit, chapter, lessons[0]
-    return None, None, None
-
-
-def _get_all_lessons_ordered(course: Course):
-    """Get all lessons in course order as a flat list of (unit, chapter, lesson) tuples."""
-    result = []
-    for unit in sorted(course.units, key=lambda u: u.unit_index):
-        for chapter in sorted(unit.chapters, key=lambda c: c.chapter_index):
-            for lesson in sorted(chapter.lessons, key=lambda l: l.lesson_index):
-                result.append((unit, chapter, lesson))
-    return result
-
-
-def _count_lessons(course: Course):
-    """Count total lessons in a course."""
-    return sum(
-        len(chapter.lessons)
-        for unit in course.units
-        for chapter in unit.chapters
-    )
-
-
-def _get_or_create_inventory(user_id: str, db: Session) -> UserInventory:
-    """Get or create UserInventory for a user."""
-    inventory = db.execute(
-        select(UserInventory).where(UserInventory.user_id == user_id)
-    ).scalar_one_or_none()
-
-    if not inventory:
-        inventory = UserInventory(
-            id=str(uuid.uuid4()),
-            user_id=user_id
-        )
-        db.add(inventory)
-        db.flush()
-
-    return inventory
-
-
-def _update_streak(inventory: UserInventory, user_id: str, db: Session) -> bool:
-    """
-    Update daily streak. Returns True if streak was updated (first completion today).
-    Logic:
-    - If last_streak_recorded is today: already counted, no update
-    - If last_streak_recorded is yesterday: increment streak
-    - Otherwise: reset streak to 1
-    Also records a StreakEntry for calendar tracking.
-    """
-    today = date.today()
-
-    if inventory.last_streak_recorded == today:
-        return False
-
-    if inventory.last_streak_recorded == today - timedelta(days=1):
-        inventory.daily_streak += 1
-    else:
-        inventory.daily_streak = 1
-
-    inventory.last_streak_recorded = today
-
-    if inventory.daily_streak > inventory.longest_streak:
-        inventory.longest_streak = inventory.daily_streak
-
-    # Record streak entry for calendar
-    entry = StreakEntry(
-        id=str(uuid.uuid4()),
-        user_id=user_id,
-        date=today
-    )
-    db.add(entry)
-
-    return True
-
-
-DAILY_QUEST_DEFINITIONS = [
-    {
-        "key": "streak_today",
-        "title": "Flame Keeper",
-        "description": "Keep your streak alive today",
-        "icon": "flame",
-        "quest_type": "streak_today",
-        "goal": 1,
-        "gems": 0,
-        "xp": 30,
-    },
-    {
-        "key": "complete_3_lessons",
-        "title": "On a Roll",
-        "description": "Complete 3 new lessons today",
-        "icon": "zap",
-        "quest_type": "lessons_today",
-        "goal": 3,
-        "gems": 0,
-        "xp": 50,
-    },
-    {
-        "key": "complete_5_lessons",
-        "title": "Knowledge Seeker",
-        "description": "Complete 5 new lessons today",
-        "icon": "book-open",
-        "quest_type": "lessons_today",
-        "goal": 5,
-        "gems": 5,
-        "xp": 0,
-    },
-]
-
-
-def _get_or_create_quest_progress(
-    user_id: str, quest_key: str, today: date, db: Session
-) -> UserDailyQuestProgress:
-    qp = db.execute(
-        select(UserDailyQuestProgress).where(
-            UserDailyQuestProgress.user_id == user_id,
-            UserDailyQuestProgress.quest_key == quest_key,
-            UserDailyQuestProgress.date == today,
-        )
-    ).scalar_one_or_none()
-    if not qp:
-        qp = UserDailyQuestProgress(
-            id=str(uuid.uuid4()),
-            user_id=user_id,
-            quest_key=quest_key,
-            date=today,
-            progress=0,
-            completed=False,
-            gems_claimed=False,
-        )
-        db.add(qp)
-    return qp
-
-
-def _update_daily_quests(
-    user_id: str,
-    lessons_today: int,
-    inventory: UserInventory,
-    lb_entry,
-    db: Session,
-) -> tuple[list[CompletedQuestInfo], int, list[DailyQuestDetail], int]:
-    """
-    Update daily quest progress based on today's lesson count and streak status.
-    Returns (newly_completed_quests, gems_earned, all_quest_details, xp_earned).
-    """
-    today = date.today()
-    newly_completed: list[CompletedQuestInfo] = []
-    gems_earned = 0
-    xp_earned = 0
-    all_details: list[DailyQuestDetail] = []
-
-    for qdef in DAILY_QUEST_DEFINITIONS:
-        qp = _get_or_create_quest_progress(user_id, qdef["key"], today, db)
-
-        if qdef["quest_type"] == "lessons_today":
-            qp.progress = min(lessons_today, qdef["goal"])
-        elif qdef["quest_type"] == "streak_today":
-            if inventory.last_streak_recorded == today:
-                qp.progress = 1
-
-        # Award gems and XP for newly completed quests
-        was_completed = qp.completed
-        if qp.progress >= qdef["goal"]:
-            qp.completed = True
-        if qp.completed and not qp.gems_claimed:
-            qp.gems_claimed = True
-            inventory.gems += qdef["gems"]
-            gems_earned += qdef["gems"]
-            quest_xp = qdef.get("xp", 0)
-            if quest_xp > 0 and lb_entry is not None:
-                lb_entry.xp_earned += quest_xp
-                inventory.experience_points += quest_xp
-                xp_earned += quest_xp
-            if not was_completed:
-                newly_completed.append(CompletedQuestInfo(
-                    key=qdef["key"],
-                    title=qdef["title"],
-                    gems=qdef["gems"],
-                    xp=quest_xp,
-                ))
-
-        all_details.append(DailyQuestDetail(
-            key=qdef["key"],
-            title=qdef["title"],
-            description=qdef["description"],
-            icon=qdef["icon"],
-            quest_type=qdef["quest_type"],
-            goal=qdef["goal"],
-            gems=qdef["gems"],
-            xp=qdef.get("xp", 0),
-            progress=qp.progress,
-            completed=qp.completed,
-        ))
-
-    return newly_completed, gems_earned, all_details, xp_earned
-
-
-def _update_achievement_progress(
-    user_id: str, achievement_type: str, current_value: int, db: Session
-) -> list[NewlyUnlockedAchievement]:
-    """
-    Upsert UserAchievement progress for all achievements of a given type.
-    - Sets progress = current_value on every call.
-    - If current_value >= goal and not yet achieved, marks as achieved.
-    Returns a list of newly unlocked achievements (those that just crossed their goal).
-    """
-    achievements = db.execute(
-        select(Achievement).where(Achievement.achievement_type == achievement_type)
-    ).scalars().all()
-
-    newly_unlocked = []
-
-    for ach in achievements:
-        ua = db.execute(
-            select(UserAchievement).where(
-                UserAchievement.user_id == user_id,
-                UserAchievement.achievement_id == ach.id
-            )
-        ).scalar_one_or_none()
-
-        if ua is None:
-            ua = UserAchievement(
-                id=str(uuid.uuid4()),
-                user_id=user_id,
-                achievement_id=ach.id,
-                progress=0,
-                achieved=False
-            )
-            db.add(ua)
-
-        ua.progress = current_value
-
-        if not ua.achieved and current_value >= ach.goal:
-            ua.achieved = True
-            ua.achieved_at = datetime.now(timezone.utc)
-            newly_unlocked.append(NewlyUnlockedAchievement(
-                name=ach.name,
-                description=ach.description,
-                achievement_type=ach.achievement_type
-            ))
-
-    return newly_unlocked
+# Largest batch /sync accepts
+MAX_SYNC_ACTIONS = 100
+# Offline activity older than this is counted on the oldest day still accepted
+SYNC_MAX_OFFLINE_DAYS = 7
 
 
 @router.get("/streak")
@@ -302,7 +90,7 @@ async def get_streak(
 ):
     """Get current user's streak data."""
     try:
-        inventory = _get_or_create_inventory(current_user.user_id, db)
+        inventory = get_or_create_inventory(current_user.user_id, db)
         db.commit()
 
         today = date.today()
@@ -334,68 +122,111 @@ async def get_streak(
 
 @router.get("/browse")
 async def browse_courses(
+    tag_id: Optional[List[str]] = Query(None),
+    price: Optional[str] = None,
+    min_price: Optional[int] = None,
+    max_price: Optional[int] = None,
+    has_discount: Optional[bool] = None,
+    min_rating: Optional[float] = None,
+    tutor_id: Optional[str] = None,
+    sort: str = "newest",
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     current_user: TokenUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get all published courses for browsing."""
+    """
+    Get a page of published courses for browsing.
+    Filters: tag_id (any of, repeatable), price ("free" / "paid"), min_price / max_price (gems),
+    has_discount, min_rating and tutor_id. Sort: "newest", "popular" (enrollments) or "rating".
+    Pages are keyset-paginated; pass the returned next_cursor to get the following page.
+    """
     try:
-        courses_stmt = select(Course).where(Course.status == "published").order_by(Course.created_at.desc())
-        courses = db.execute(courses_stmt).scalars().all()
-
-        # Batch-fetch feedback stats for all courses
-        feedback_stats_rows = db.execute(
-            select(
-                Feedback.course_id,
-                func.avg(Feedback.rating).label("avg_rating"),
-                func.count(Feedback.id).label("review_count")
-            ).group_by(Feedback.course_id)
-        ).all()
-        feedback_stats = {row.course_id: row for row in feedback_stats_rows}
-
-        course_list = []
-        for course in courses:
-            unit_count = len(course.units)
-            chapter_count = sum(len(u.chapters) for u in course.units)
-            lesson_count = _count_lessons(course)
-            enrollment_count = len(course.enrollments)
-
-            tags = [TagDetail(id=ct.tag.id, name=ct.tag.name) for ct in course.course_tags]
-
-            badge_detail = None
-            if course.badge:
-                badge_detail = BadgeDetail(
-                    id=course.badge.id, name=course.badge.name,
-                    badge_type=course.badge.badge_type, icon_name=course.badge.icon_name,
-                    image_url=course.badge.image_url, course_id=course.badge.course_id
-                )
-
-            stats = feedback_stats.get(course.id)
-            avg_rating = round(float(stats.avg_rating), 1) if stats else None
-            review_count = stats.review_count if stats else 0
+        sort_columns = {
+            "newest": Course.created_at,
+            "popular": CourseStats.enrollment_count,
+            "rating": CourseStats.avg_rating,
+        }
+        if sort not in sort_columns:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="sort must be one of: newest, popular, rating")
+        if price not in (None, "free", "paid"):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="price must be 'free' or 'paid'")
+        sort_column = sort_columns[sort]
+
+        # The catalog is the same for every learner, so pages are cached per catalog version
+        cache_key = (
+            "browse", get_catalog_version(db), tuple(sorted(tag_id or [])), price, min_price, max_price,
+            has_discount, min_rating, tutor_id, sort, cursor, limit
+        )
+        cached = catalog_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        stmt = (
+            select(Course, CourseStats)
+            .join(CourseStats, CourseStats.course_id == Course.id)
+            .where(Course.status == "published")
+            .options(
+                joinedload(Course.user),
+                joinedload(Course.badge),
+                selectinload(Course.course_tags).joinedload(CourseTag.tag),
+            )
+        )
 
-            course_list.append(BrowseCourseSummary(
-                id=course.id,
-                name=course.name,
-                description=course.description,
-                tutor_id=course.created_by,
-                tutor_name=course.user.full_name,
-                unit_count=unit_count,
-                chapter_count=chapter_count,
-                lesson_count=lesson_count,
-                enrollment_count=enrollment_count,
-                tags=tags,
-                badge=badge_detail,
-                price_gems=course.price_gems,
-                discount_percent=course.discount_percent,
-                avg_rating=avg_rating,
-                review_count=review_count
+        if tag_id:
+            stmt = stmt.where(Course.id.in_(
+                select(CourseTag.course_id).where(CourseTag.tag_id.in_(tag_id))
             ))
-
-        return GetBrowseCoursesResponse(
+        if price == "free":
+            stmt = stmt.where(func.coalesce(Course.price_gems, 0) == 0)
+        elif price == "paid":
+            stmt = stmt.where(Course.price_gems > 0)
+        if min_price is not None:
+            stmt = stmt.where(func.coalesce(Course.price_gems, 0) >= min_price)
+        if max_price is not None:
+            stmt = stmt.where(func.coalesce(Course.price_gems, 0) <= max_price)
+        if has_discount is not None:
+            has_discount_clause = func.coalesce(Course.discount_percent, 0) > 0
+            stmt = stmt.where(has_discount_clause if has_discount else ~has_discount_clause)
+        if min_rating is not None:
+            stmt = stmt.where(CourseStats.review_count > 0, CourseStats.avg_rating >= min_rating)
+        if tutor_id:
+            stmt = stmt.where(Course.created_by == tutor_id)
+
+        if cursor:
+            try:
+                last_value, last_id = decode_cursor(cursor)
+                if sort == "newest":
+                    last_value = datetime.fromisoformat(last_value)
+            except (ValueError, TypeError):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+            stmt = stmt.where(tuple_(sort_column, Course.id) < tuple_(last_value, last_id))
+
+        # Fetch one extra row to know whether another page exists
+        stmt = stmt.order_by(sort_column.desc(), Course.id.desc()).limit(limit + 1)
+        rows = db.execute(stmt).unique().all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last_course, last_stats = rows[-1]
+            last_value = {
+                "newest": last_course.created_at.isoformat(),
+                "popular": last_stats.enrollment_count,
+                "rating": last_stats.avg_rating,
+            }[sort]
+            next_cursor = encode_cursor([last_value, last_course.id])
+
+        course_list = [_browse_summary_from_stats(course, course_stats) for course, course_stats in rows]
+
+        response = GetBrowseCoursesResponse(
             status="success",
             message="Courses retrieved successfully",
-            courses=course_list
+            courses=course_list,
+            next_cursor=next_cursor
         )
+        catalog_cache.set(cache_key, response)
+        return response
     except HTTPException:
         raise
     except Exception as e:
@@ -406,13 +237,17 @@ async def browse_courses(
 @router.post("/enroll")
 async def enroll_in_course(
     request: EnrollCourseRequest,
+    http_request: Request,
     current_user: TokenUser = Depends(require_role("learner")),
     db: Session = Depends(get_db)
 ):
-    """Enroll in a published course."""
+    """Enroll in a published course. Retries with the same Idempotency-Key replay the first response."""
     try:
         course_id = request.course_id
         user_id = current_user.user_id
+        idempotency = begin_idempotent_request(http_request, "student.enroll", user_id, request, db)
+        if idempotency.replay is not None:
+            return idempotency.replay
 
         # Verify course exists and is published
         course = db.execute(select(Course).where(Course.id == course_id)).scalar_one_or_none()
@@ -421,6 +256,10 @@ async def enroll_in_course(
         if course.status != "published":
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Course is not published")
 
+        # Enrollments of the learner in this course are made one at a time, so a duplicate
+        # request waits here and then finds the first enrollment instead of paying again
+        db.execute(select(func.pg_advisory_xact_lock(func.hashtext(f"enroll:{user_id}:{course_id}"))))
+
         # Check if already enrolled
         existing = db.execute(
             select(Enrollment).where(Enrollment.user_id == user_id, Enrollment.course_id == course_id)
@@ -437,29 +276,16 @@ async def enroll_in_course(
             else:
                 effective_price = course.price_gems
 
-            student_inventory = _get_or_create_inventory(user_id, db)
-            if student_inventory.gems < effective_price:
+            # Deduct gems from student, only if the balance still covers the price
+            if debit_gems(user_id, effective_price, db) is None:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail=f"Insufficient gems. You need {effective_price} gems to enroll."
                 )
-            # Deduct gems from student
-            student_inventory.gems -= effective_price
             gems_paid = effective_price
 
             # Credit 90% to tutor (app takes 10% commission)
-            tutor_gems_earned = int(effective_price * 0.9)
-            tutor_inventory = db.execute(
-                select(UserInventory).where(UserInventory.user_id == course.created_by)
-            ).scalar_one_or_none()
-            if not tutor_inventory:
-                tutor_inventory = UserInventory(
-                    id=str(uuid.uuid4()),
-                    user_id=course.created_by
-                )
-                db.add(tutor_inventory)
-                db.flush()
-            tutor_inventory.gems += tutor_gems_earned
+            credit_inventory(course.created_by, db, gems=int(effective_price * 0.9))
 
         # Create enrollment
         enrollment_id = str(uuid.uuid4())
@@ -471,30 +297,33 @@ async def enroll_in_course(
         db.add(new_enrollment)
 
         # Create progress record initialized to first lesson
-        first_unit, first_chapter, first_lesson = _get_first_lesson(course)
+        first_entry = get_first_lesson_entry(course_id, db)
         progress_id = str(uuid.uuid4())
         new_progress = CourseProgress(
             id=progress_id, user_id=user_id, course_id=course_id,
-            current_unit_id=first_unit.id if first_unit else None,
-            current_chapter_id=first_chapter.id if first_chapter else None,
-            current_lesson_id=first_lesson.id if first_lesson else None
+            current_unit_id=first_entry.unit_id if first_entry else None,
+            current_chapter_id=first_entry.chapter_id if first_entry else None,
+            current_lesson_id=first_entry.lesson_id if first_entry else None,
+            # Nothing completed yet, so the bitmap never needs rebuilding for this ordering
+            completed_bitmap=b"",
+            bitmap_version=course.sequence_version
         )
         db.add(new_progress)
         db.flush()
+        # Not a catalog change (see cache_utils): cached pages catch up within the cache TTL
+        adjust_course_stats(course_id, db, enrollment_count=1)
+        adjust_user_stats(user_id, db, courses_enrolled=1)
 
-        # Track courses_enrolled achievement progress
-        enrollment_count = db.execute(
-            select(func.count()).select_from(Enrollment).where(Enrollment.user_id == user_id)
-        ).scalar_one()
-        _update_achievement_progress(user_id, "courses_enrolled", enrollment_count, db)
+        # courses_enrolled achievement progress is tracked by the outbox worker
+        _, event_insert = outbox_event_insert("course_enrolled", user_id, {"course_id": course_id})
 
-        db.commit()
-
-        return EnrollCourseResponse(
+        response = EnrollCourseResponse(
             status="success",
             message="Enrolled successfully",
             enrollment_id=enrollment_id
         )
+        replay = idempotency.commit(response, db, [event_insert])
+        return replay if replay is not None else response
     except HTTPException:
         raise
     except Exception as e:
@@ -511,31 +340,51 @@ async def get_my_courses(
     try:
         user_id = current_user.user_id
 
-        enrollments = db.execute(
-            select(Enrollment).where(Enrollment.user_id == user_id).order_by(Enrollment.enrolled_at.desc())
-        ).scalars().all()
+        # Everything in a fixed number of queries, however many courses the learner is enrolled in:
+        # enrollments joined with course, tutor, progress, current lesson name and lesson totals,
+        # plus one batched load of the badges
+        rows = db.execute(
+            select(
+                Enrollment.enrolled_at, Course, CourseProgress,
+                User.full_name.label("tutor_name"),
+                Lesson.name.label("current_lesson_name"),
+                CourseStats.lesson_count
+            )
+            .join(Course, Course.id == Enrollment.course_id)
+            .join(User, User.user_id == Course.created_by)
+            .outerjoin(
+                CourseProgress,
+                (CourseProgress.course_id == Enrollment.course_id) & (CourseProgress.user_id == Enrollment.user_id)
+            )
+            .outerjoin(Lesson, Lesson.id == CourseProgress.current_lesson_id)
+            .outerjoin(CourseStats, CourseStats.course_id == Course.id)
+            .where(Enrollment.user_id == user_id)
+            .order_by(Enrollment.enrolled_at.desc())
+            .options(selectinload(Course.badge))
+        ).all()
 
-        course_list = []
-        for enrollment in enrollments:
-            course = enrollment.course
-            total_lessons = _count_lessons(course)
+        # Courses created before course_stats existed
+        missing_stats = [row.Course.id for row in rows if row.lesson_count is None]
+        backfilled_stats = get_course_stats(missing_stats, db) if missing_stats else {}
 
-            completed_count = db.execute(
-                select(func.count()).select_from(LessonCompletion)
-                .where(LessonCompletion.user_id == user_id, LessonCompletion.course_id == course.id)
-            ).scalar_one()
+        needs_commit = False
+        course_list = []
+        for row in rows:
+            course = row.Course
+            progress = row.CourseProgress
+            total_lessons = row.lesson_count
+            if total_lessons is None:
+                total_lessons = backfilled_stats[course.id].lesson_count
+
+            completed_count = 0
+            if progress is not None:
+                # Only rebuilds (one query) if the course's lessons were reordered since the last read
+                bitmap, rebuilt = ensure_progress_bitmap(progress, course.sequence_version, db)
+                needs_commit = needs_commit or rebuilt
+                completed_count = count_bits(bitmap)
 
             progress_percent = (completed_count / total_lessons * 100) if total_lessons > 0 else 0
 
-            # Get current lesson name
-            progress = db.execute(
-                select(CourseProgress).where(CourseProgress.user_id == user_id, CourseProgress.course_id == course.id)
-            ).scalar_one_or_none()
-
-            current_lesson_name = None
-            if progress and progress.current_lesson:
-                current_lesson_name = progress.current_lesson.name
-
             badge_detail = None
             if course.badge:
                 badge_detail = BadgeDetail(
@@ -548,15 +397,18 @@ async def get_my_courses(
                 id=course.id,
                 name=course.name,
                 description=course.description,
-                tutor_name=course.user.full_name,
+                tutor_name=row.tutor_name,
                 total_lessons=total_lessons,
                 completed_lessons=completed_count,
                 progress_percent=round(progress_percent, 1),
-                current_lesson_name=current_lesson_name,
+                current_lesson_name=row.current_lesson_name,
                 badge=badge_detail,
-                enrolled_at=enrollment.enrolled_at
+                enrolled_at=row.enrolled_at
             ))
 
+        if needs_commit:
+            db.commit()
+
         return GetMyCoursesResponse(
             status="success",
             message="Enrolled courses retrieved successfully",
@@ -572,6 +424,8 @@ async def get_my_courses(
 @router.get("/course/{course_id}")
 async def get_student_course_detail(
     course_id: str,
+    request: Request,
+    response: Response,
     current_user: TokenUser = Depends(require_role("learner")),
     db: Session = Depends(get_db)
 ):
@@ -579,6 +433,18 @@ async def get_student_course_detail(
     try:
         user_id = current_user.user_id
 
+        # Cheap version check first: the body only depends on the snapshot and the learner's progress.
+        # A progress row exists exactly when the learner is enrolled.
+        versions = db.execute(
+            select(Course.snapshot_version, CourseProgress.progress_version)
+            .join(CourseProgress, CourseProgress.course_id == Course.id)
+            .where(Course.id == course_id, CourseProgress.user_id == user_id)
+        ).one_or_none()
+        if versions is not None and versions.snapshot_version is not None:
+            etag = make_etag("student-course", course_id, user_id, versions.snapshot_version, versions.progress_version)
+            if etag_matches(request, etag):
+                return not_modified(etag)
+
         # Verify enrollment
         enrollment = db.execute(
             select(Enrollment).where(Enrollment.user_id == user_id, Enrollment.course_id == course_id)
@@ -595,50 +461,63 @@ async def get_student_course_detail(
             select(CourseProgress).where(CourseProgress.user_id == user_id, CourseProgress.course_id == course_id)
         ).scalar_one_or_none()
 
-        # Get completed lesson ids
-        completed_rows = db.execute(
-            select(LessonCompletion.lesson_id)
-            .where(LessonCompletion.user_id == user_id, LessonCompletion.course_id == course_id)
-        ).scalars().all()
-        completed_ids = set(completed_rows)
+        # Structure comes from the published snapshot, progress is merged on top
+        snapshot, needs_commit = get_course_snapshot(course, db)
+
+        # Completed lessons come from the progress bitmap, whose positions match the snapshot order
+        if progress is not None and snapshot.get("sequence_version") == course.sequence_version:
+            bitmap, rebuilt = ensure_progress_bitmap(progress, course.sequence_version, db)
+            needs_commit = needs_commit or rebuilt
+            completed_ids = {
+                lesson["id"]
+                for position, (_, _, lesson) in enumerate(_iter_snapshot_lessons(snapshot))
+                if has_bit(bitmap, position)
+            }
+        else:
+            completed_ids = set(db.execute(
+                select(LessonCompletion.lesson_id)
+                .where(LessonCompletion.user_id == user_id, LessonCompletion.course_id == course_id)
+            ).scalars().all())
 
         # Resolve current lesson if NULL (content was deleted)
         current_lesson_id = progress.current_lesson_id if progress else None
         if progress and current_lesson_id is None:
-            all_lessons = _get_all_lessons_ordered(course)
-            for unit, chapter, lesson in all_lessons:
-                if lesson.id not in completed_ids:
-                    current_lesson_id = lesson.id
-                    progress.current_unit_id = unit.id
-                    progress.current_chapter_id = chapter.id
-                    progress.current_lesson_id = lesson.id
-                    db.commit()
+            for unit, chapter, lesson in _iter_snapshot_lessons(snapshot):
+                if lesson["id"] not in completed_ids:
+                    current_lesson_id = lesson["id"]
+                    progress.current_unit_id = unit["id"]
+                    progress.current_chapter_id = chapter["id"]
+                    progress.current_lesson_id = lesson["id"]
+                    progress.progress_version = CourseProgress.progress_version + 1
+                    needs_commit = True
                     break
+        if needs_commit:
+            db.commit()
 
         # Build response structure
         total_lessons = 0
         total_completed = 0
         units_detail = []
 
-        for unit in sorted(course.units, key=lambda u: u.unit_index):
+        for unit in snapshot["units"]:
             unit_completed = 0
             unit_total = 0
             chapters_detail = []
 
-            for chapter in sorted(unit.chapters, key=lambda c: c.chapter_index):
+            for chapter in unit["chapters"]:
                 lessons_detail = []
                 chapter_has_current = False
                 chapter_all_completed = True
 
-                for lesson in sorted(chapter.lessons, key=lambda l: l.lesson_index):
+                for lesson in chapter["lessons"]:
                     unit_total += 1
                     total_lessons += 1
 
-                    if lesson.id in completed_ids:
+                    if lesson["id"] in completed_ids:
                         lesson_status = "completed"
                         unit_completed += 1
                         total_completed += 1
-                    elif lesson.id == current_lesson_id:
+                    elif lesson["id"] == current_lesson_id:
                         lesson_status = "current"
                         chapter_has_current = True
                         chapter_all_completed = False
@@ -646,12 +525,7 @@ async def get_student_course_detail(
                         lesson_status = "locked"
                         chapter_all_completed = False
 
-                    lessons_detail.append(StudentLessonDetail(
-                        id=lesson.id, name=lesson.name,
-                        lesson_index=lesson.lesson_index,
-                        question_count=len(lesson.questions),
-                        status=lesson_status
-                    ))
+                    lessons_detail.append(StudentLessonDetail(**lesson, status=lesson_status))
 
                 # Determine chapter status
                 if not lessons_detail:
@@ -664,33 +538,31 @@ async def get_student_course_detail(
                     chapter_status = "locked"
 
                 chapters_detail.append(StudentChapterDetail(
-                    id=chapter.id, name=chapter.name,
-                    chapter_index=chapter.chapter_index,
+                    id=chapter["id"], name=chapter["name"],
+                    chapter_index=chapter["chapter_index"],
                     lessons=lessons_detail, status=chapter_status
                 ))
 
             units_detail.append(StudentUnitDetail(
-                id=unit.id, name=unit.name, description=unit.description,
-                unit_index=unit.unit_index, chapters=chapters_detail,
+                id=unit["id"], name=unit["name"], description=unit["description"],
+                unit_index=unit["unit_index"], chapters=chapters_detail,
                 completed_lessons=unit_completed, total_lessons=unit_total
             ))
 
         progress_percent = (total_completed / total_lessons * 100) if total_lessons > 0 else 0
 
-        badge_detail = None
-        if course.badge:
-            badge_detail = BadgeDetail(
-                id=course.badge.id, name=course.badge.name,
-                badge_type=course.badge.badge_type, icon_name=course.badge.icon_name,
-                image_url=course.badge.image_url, course_id=course.badge.course_id
-            )
+        if progress is not None:
+            set_etag(response, make_etag(
+                "student-course", course_id, user_id, course.snapshot_version, progress.progress_version
+            ))
 
         course_detail = StudentCourseDetail(
-            id=course.id, name=course.name, description=course.description,
-            tutor_name=course.user.full_name,
+            id=snapshot["id"], name=snapshot["name"], description=snapshot["description"],
+            tutor_name=snapshot["tutor_name"],
             total_lessons=total_lessons, completed_lessons=total_completed,
             progress_percent=round(progress_percent, 1),
-            units=units_detail, badge=badge_detail
+            units=units_detail,
+            badge=BadgeDetail(**snapshot["badge"]) if snapshot["badge"] else None
         )
 
         return GetStudentCourseDetailResponse(
@@ -709,6 +581,8 @@ async def get_student_course_detail(
 async def get_student_lesson(
     course_id: str,
     lesson_id: str,
+    request: Request,
+    response: Response,
     current_user: TokenUser = Depends(require_role("learner")),
     db: Session = Depends(get_db)
 ):
@@ -716,12 +590,48 @@ async def get_student_lesson(
     try:
         user_id = current_user.user_id
 
-        # Verify enrollment
-        enrollment = db.execute(
-            select(Enrollment).where(Enrollment.user_id == user_id, Enrollment.course_id == course_id)
-        ).scalar_one_or_none()
-        if not enrollment:
+        # Enrollment, lock state and content version in one query. A progress row exists exactly
+        # when the learner is enrolled; the lesson's position is looked up in the course sequence.
+        access = db.execute(
+            select(
+                Course.content_version, Course.sequence_version,
+                CourseProgress, CourseLessonSequence.position
+            )
+            .join(CourseProgress, CourseProgress.course_id == Course.id)
+            .outerjoin(
+                CourseLessonSequence,
+                (CourseLessonSequence.course_id == Course.id) & (CourseLessonSequence.lesson_id == lesson_id)
+            )
+            .where(Course.id == course_id, CourseProgress.user_id == user_id)
+        ).one_or_none()
+        if access is None:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enrolled in this course")
+        progress = access.CourseProgress
+
+        is_completed = False
+        if access.position is not None:
+            bitmap, rebuilt = ensure_progress_bitmap(progress, access.sequence_version, db)
+            if rebuilt:
+                db.commit()
+            is_completed = has_bit(bitmap, access.position)
+        else:
+            # Lesson missing from the sequence (legacy course or foreign lesson), use the history
+            is_completed = db.execute(
+                select(LessonCompletion.id).where(
+                    LessonCompletion.user_id == user_id,
+                    LessonCompletion.course_id == course_id,
+                    LessonCompletion.lesson_id == lesson_id
+                )
+            ).first() is not None
+        is_current = progress.current_lesson_id == lesson_id
+
+        # Attachment URLs are presigned, so the ETag also rolls over well before they expire
+        url_window = int(time.time() // LESSON_ETAG_WINDOW_SECONDS)
+        etag = None
+        if is_completed or is_current:
+            etag = make_etag("student-lesson", course_id, lesson_id, access.content_version, url_window)
+            if etag_matches(request, etag):
+                return not_modified(etag)
 
         # Verify lesson exists and belongs to course
         lesson = db.execute(select(Lesson).where(Lesson.id == lesson_id)).scalar_one_or_none()
@@ -730,19 +640,7 @@ async def get_student_lesson(
         if lesson.chapter.unit.course_id != course_id:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Lesson does not belong to this course")
 
-        # Verify lesson is accessible (completed or current, not locked)
-        progress = db.execute(
-            select(CourseProgress).where(CourseProgress.user_id == user_id, CourseProgress.course_id == course_id)
-        ).scalar_one_or_none()
-
-        is_completed = db.execute(
-            select(LessonCompletion).where(
-                LessonCompletion.user_id == user_id, LessonCompletion.lesson_id == lesson_id
-            )
-        ).scalar_one_or_none()
-
-        is_current = progress and progress.current_lesson_id == lesson_id
-
+        # Only completed lessons and the current one are accessible
         if not is_completed and not is_current:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Lesson is locked")
 
@@ -770,6 +668,9 @@ async def get_student_lesson(
             for att in lesson.lesson_attachments
         ]
 
+        if etag is not None:
+            set_etag(response, etag)
+
         return GetStudentLessonResponse(
             status="success",
             message="Lesson retrieved successfully",
@@ -784,6 +685,32 @@ async def get_student_lesson(
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Internal Server Error")
 
 
+def _grade_answer(question: Question, answer: str) -> tuple[bool, Optional[str]]:
+    """Check an answer to a question. Returns (is_correct, correct answer text for feedback)."""
+    if question.question_type == "mcq":
+        # answer is the option_id the student selected
+        selected_option = next((opt for opt in question.mcq_options if opt.id == answer), None)
+        if not selected_option:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid option selected")
+
+        # Get correct answer text(s) for feedback
+        correct_options = [opt for opt in question.mcq_options if opt.is_correct]
+        return bool(selected_option.is_correct), ", ".join(opt.option_text for opt in correct_options)
+
+    if question.question_type == "text":
+        if not question.text_answers:
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Question has no answer configured")
+
+        text_answer = question.text_answers[0]
+        if text_answer.casing_matters:
+            is_correct = answer.strip() == text_answer.correct_answer.strip()
+        else:
+            is_correct = answer.strip().lower() == text_answer.correct_answer.strip().lower()
+        return is_correct, text_answer.correct_answer
+
+    return False, None
+
+
 @router.post("/submit-answer")
 async def submit_answer(
     request: SubmitAnswerRequest,
@@ -796,35 +723,7 @@ async def submit_answer(
         if not question:
             raise NotFoundException("Question")
 
-        is_correct = False
-        correct_answer = None
-
-        if question.question_type == "mcq":
-            # answer is the option_id the student selected
-            selected_option = db.execute(
-                select(MCQOption).where(MCQOption.id == request.answer, MCQOption.question_id == question.id)
-            ).scalar_one_or_none()
-
-            if not selected_option:
-                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid option selected")
-
-            is_correct = selected_option.is_correct
-
-            # Get correct answer text(s) for feedback
-            correct_options = [opt for opt in question.mcq_options if opt.is_correct]
-            correct_answer = ", ".join(opt.option_text for opt in correct_options)
-
-        elif question.question_type == "text":
-            if not question.text_answers:
-                raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Question has no answer configured")
-
-            text_answer = question.text_answers[0]
-            correct_answer = text_answer.correct_answer
-
-            if text_answer.casing_matters:
-                is_correct = request.answer.strip() == text_answer.correct_answer.strip()
-            else:
-                is_correct = request.answer.strip().lower() == text_answer.correct_answer.strip().lower()
+        is_correct, correct_answer = _grade_answer(question, request.answer)
 
         return SubmitAnswerResponse(
             status="success",
@@ -842,194 +741,405 @@ async def submit_answer(
 @router.post("/complete-lesson")
 async def complete_lesson(
     request: CompleteLessonRequest,
+    http_request: Request,
     current_user: TokenUser = Depends(require_role("learner")),
     db: Session = Depends(get_db)
 ):
-    """Mark a lesson as complete and advance progress to the next lesson."""
+    """
+    Mark a lesson as complete and advance progress to the next lesson.
+    Streak, XP, quests, achievements and leaderboard XP are applied by the outbox worker;
+    the learner polls GET /rewards/{reward_event_id} for them.
+    Takes two statements: one read and all writes (including the outbox event) as one statement.
+    With an Idempotency-Key header, a retry is answered with the stored response after one lookup.
+    """
     try:
         user_id = current_user.user_id
+        idempotency = begin_idempotent_request(http_request, "student.complete_lesson", user_id, request, db)
+        if idempotency.replay is not None:
+            return idempotency.replay
         course_id = request.course_id
         lesson_id = request.lesson_id
+        now = datetime.now(timezone.utc)
+        today = date.today()
 
-        # Verify enrollment
-        enrollment = db.execute(
-            select(Enrollment).where(Enrollment.user_id == user_id, Enrollment.course_id == course_id)
-        ).scalar_one_or_none()
-        if not enrollment:
+        # Enrollment, progress and the lesson with its successor, in one query
+        next_entry_alias = aliased(CourseLessonSequence, name="next_entry")
+        context = db.execute(
+            select(
+                Enrollment.id.label("enrollment_id"),
+                Enrollment.status.label("enrollment_status"),
+                CourseProgress,
+                Course.sequence_version,
+                CourseLessonSequence,
+                next_entry_alias,
+            )
+            .select_from(Enrollment)
+            .join(Course, Course.id == Enrollment.course_id)
+            .join(CourseProgress, and_(
+                CourseProgress.user_id == Enrollment.user_id, CourseProgress.course_id == Enrollment.course_id
+            ))
+            .outerjoin(CourseLessonSequence, and_(
+                CourseLessonSequence.lesson_id == lesson_id, CourseLessonSequence.course_id == Enrollment.course_id
+            ))
+            .outerjoin(next_entry_alias, next_entry_alias.lesson_id == CourseLessonSequence.next_lesson_id)
+            .where(Enrollment.user_id == user_id, Enrollment.course_id == course_id)
+            # Completions in one course are applied one at a time; a concurrent request waits
+            # here and then reads the progress the first one wrote
+            .with_for_update(of=[Enrollment, CourseProgress])
+        ).first()
+
+        # Verify enrollment (every enrollment is created with its progress record)
+        if context is None:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enrolled in this course")
+        progress = context.CourseProgress
+
+        # Resolve the lesson and its successor from the course's lesson sequence
+        lesson_entry, next_entry = context.CourseLessonSequence, context.next_entry
+        if lesson_entry is None:
+            # Falls back to syncing the sequence of courses that predate it
+            lesson_entry, next_entry = get_lesson_entry_with_next(course_id, lesson_id, db)
+        if lesson_entry is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Lesson does not belong to this course")
 
-        # Get progress
-        progress = db.execute(
-            select(CourseProgress).where(CourseProgress.user_id == user_id, CourseProgress.course_id == course_id)
-        ).scalar_one_or_none()
-        if not progress:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No progress record found")
+        # Check if already completed (idempotent) against the completed-lessons bitmap
+        bitmap, _ = ensure_progress_bitmap(progress, context.sequence_version, db)
+        # The bitmap is written below together with the rest of the progress update
+        progress_id = progress.id
+        db.expire(progress)
+        is_new_completion = not has_bit(bitmap, lesson_entry.position)
+        if is_new_completion:
+            bitmap = set_bit(bitmap, lesson_entry.position)
 
-        # Check if already completed (idempotent)
-        already_completed = db.execute(
-            select(LessonCompletion).where(
-                LessonCompletion.user_id == user_id, LessonCompletion.lesson_id == lesson_id
-            )
-        ).scalar_one_or_none()
+        course_completed = next_entry is None
+        next_lesson_id = next_entry.lesson_id if next_entry is not None else None
 
-        is_new_completion = not already_completed
+        # Writes, sent to the database as a single statement
+        writes = []
         if is_new_completion:
-            # Create completion record
-            completion = LessonCompletion(
+            writes.append(insert(LessonCompletion).values(
                 id=str(uuid.uuid4()),
                 user_id=user_id,
                 lesson_id=lesson_id,
                 course_id=course_id
-            )
-            db.add(completion)
-            db.flush()
-
-        # Find next lesson
-        course = db.execute(select(Course).where(Course.id == course_id)).scalar_one_or_none()
-        all_lessons = _get_all_lessons_ordered(course)
-
-        # Find index of current lesson
-        current_idx = None
-        for i, (unit, chapter, lesson) in enumerate(all_lessons):
-            if lesson.id == lesson_id:
-                current_idx = i
-                break
-
-        next_lesson_id = None
-        course_completed = False
-
-        if current_idx is not None and current_idx + 1 < len(all_lessons):
-            next_unit, next_chapter, next_lesson = all_lessons[current_idx + 1]
-            next_lesson_id = next_lesson.id
-            progress.current_unit_id = next_unit.id
-            progress.current_chapter_id = next_chapter.id
-            progress.current_lesson_id = next_lesson.id
-        else:
+            ))
+        if course_completed:
             # No more lessons — course complete
-            course_completed = True
-            progress.current_lesson_id = None
-            progress.current_chapter_id = None
-            progress.current_unit_id = None
-            enrollment.status = "completed"
-            enrollment.completed_at = datetime.now(timezone.utc)
-
-        # Update streak and award XP
-        inventory = _get_or_create_inventory(user_id, db)
-        streak_updated = _update_streak(inventory, user_id, db)
-
-        # Fetch/create leaderboard entry (needed for both lesson XP and quest XP)
-        week_start, week_end = get_current_week_bounds()
-        lb_entry = db.execute(
-            select(LeaderboardEntry)
-            .join(Leaderboard)
-            .where(
-                LeaderboardEntry.user_id == user_id,
-                Leaderboard.status == "open",
-                Leaderboard.week_start >= week_start,
-                Leaderboard.week_start < week_end,
+            writes.append(
+                update(Enrollment)
+                .where(Enrollment.id == context.enrollment_id)
+                .values(status="completed", completed_at=now)
             )
-        ).scalar_one_or_none()
-        if not lb_entry:
-            user_rank = inventory.current_rank if inventory.current_rank in RANKS else RANKS[0]
-            candidates = db.execute(
-                select(Leaderboard).where(
-                    Leaderboard.rank == user_rank,
-                    Leaderboard.status == "open",
-                    Leaderboard.week_start >= week_start,
-                    Leaderboard.week_start < week_end,
-                )
-            ).scalars().all()
-            lb = None
-            for candidate in candidates:
-                if len(candidate.entries) < LEADERBOARD_MAX_SIZE:
-                    lb = candidate
-                    break
-            if not lb:
-                lb = Leaderboard(
-                    id=str(uuid.uuid4()),
-                    rank=user_rank,
-                    status="open",
-                    week_start=week_start,
-                    week_end=week_end,
-                )
-                db.add(lb)
-                db.flush()
-            lb_entry = LeaderboardEntry(
-                id=str(uuid.uuid4()),
-                leaderboard_id=lb.id,
-                user_id=user_id,
-                xp_earned=0,
+
+        # Activity counters; finishing an already completed course again does not count
+        newly_completed_course = course_completed and context.enrollment_status != "completed"
+        if is_new_completion or newly_completed_course:
+            writes.append(user_stats_update(
+                user_id,
+                lessons_completed=int(is_new_completion),
+                courses_completed=int(newly_completed_course),
+            ))
+        # Today's row also marks the day as active for repeat completions
+        writes.append(daily_activity_upsert(user_id, today, lessons=int(is_new_completion)))
+
+        # Rewards are worked out by the worker. Repeat completions still count towards the streak.
+        reward_event_id, event_insert = outbox_event_insert("lesson_completed", user_id, {
+            "course_id": course_id,
+            "lesson_id": lesson_id,
+            "new_completion": is_new_completion,
+            "course_completed": newly_completed_course,
+            "activity_date": today.isoformat(),
+            "week_start": get_current_week_bounds()[0].isoformat(),
+        })
+        writes.append(event_insert)
+
+        writes.append(
+            update(CourseProgress)
+            .where(CourseProgress.id == progress_id)
+            .values(
+                completed_bitmap=bitmap,
+                bitmap_version=context.sequence_version,
+                progress_version=CourseProgress.progress_version + 1,
+                updated_at=now,
+                current_unit_id=next_entry.unit_id if next_entry else None,
+                current_chapter_id=next_entry.chapter_id if next_entry else None,
+                current_lesson_id=next_lesson_id,
             )
-            db.add(lb_entry)
-            db.flush()
+        )
+        response = CompleteLessonResponse(
+            status="success",
+            message="Course completed!" if course_completed else "Lesson completed",
+            next_lesson_id=next_lesson_id,
+            course_completed=course_completed,
+            reward_event_id=reward_event_id,
+        )
+        # Stores the response for retries in the same statement as the writes
+        replay = idempotency.commit(response, db, writes)
+        return replay if replay is not None else response
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Error completing lesson: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Internal Server Error")
 
-        xp_earned = 0
-        if is_new_completion:
-            xp_earned = 30
-            inventory.experience_points += xp_earned
-            lb_entry.xp_earned += xp_earned
 
-        # Track achievement progress (only on new completions)
-        newly_unlocked: list[NewlyUnlockedAchievement] = []
-        if is_new_completion:
-            # lessons_completed: total lessons ever completed by this user
-            total_lessons_completed = db.execute(
-                select(func.count()).select_from(LessonCompletion).where(LessonCompletion.user_id == user_id)
-            ).scalar_one()
-            newly_unlocked.extend(
-                _update_achievement_progress(user_id, "lessons_completed", total_lessons_completed, db)
+def _sync_activity_time(client_timestamp: datetime, now: datetime) -> datetime:
+    """When a synced action counts as done: its client timestamp, kept within the offline window."""
+    if client_timestamp.tzinfo is None:
+        client_timestamp = client_timestamp.replace(tzinfo=timezone.utc)
+    return min(max(client_timestamp, now - timedelta(days=SYNC_MAX_OFFLINE_DAYS)), now)
+
+
+def _sync_error(index: int, action: SyncAction, message: str) -> SyncActionResult:
+    return SyncActionResult(index=index, type=action.type, result="error", message=message)
+
+
+@router.post("/sync")
+async def sync_progress(
+    request: SyncRequest,
+    http_request: Request,
+    current_user: TokenUser = Depends(require_role("learner")),
+    db: Session = Depends(get_db)
+):
+    """
+    Replay answers and lesson completions made offline, in order, in one transaction.
+    An action that fails is reported in its result and does not stop the rest of the batch.
+    Completions count on the day of their client timestamp (up to SYNC_MAX_OFFLINE_DAYS back).
+    Their rewards are worked out once for the whole batch by the outbox worker;
+    the learner polls GET /rewards/{reward_event_id} for them.
+    """
+    try:
+        user_id = current_user.user_id
+        if not request.actions:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No actions to sync")
+        if len(request.actions) > MAX_SYNC_ACTIONS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Cannot sync more than {MAX_SYNC_ACTIONS} actions at once"
             )
+        idempotency = begin_idempotent_request(http_request, "student.sync", user_id, request, db)
+        if idempotency.replay is not None:
+            return idempotency.replay
+
+        now = datetime.now(timezone.utc)
+        answers = [action for action in request.actions if action.type == "answer"]
+        completions = [action for action in request.actions if action.type == "complete_lesson"]
+
+        # Every question answered in the batch, with its options and answers
+        questions = {}
+        if answers:
+            questions = {
+                question.id: question
+                for question in db.execute(
+                    select(Question)
+                    .where(Question.id.in_({action.question_id for action in answers}))
+                    .options(selectinload(Question.mcq_options), selectinload(Question.text_answers))
+                ).scalars().all()
+            }
+
+        # Enrollment and progress of every course in the batch, locked as in complete-lesson,
+        # and the lessons with their successors
+        contexts, entries = {}, {}
+        if completions:
+            contexts = {
+                row.course_id: row
+                for row in db.execute(
+                    select(
+                        Enrollment.course_id,
+                        Enrollment.id.label("enrollment_id"),
+                        Enrollment.status.label("enrollment_status"),
+                        CourseProgress,
+                        Course.sequence_version,
+                    )
+                    .select_from(Enrollment)
+                    .join(Course, Course.id == Enrollment.course_id)
+                    .join(CourseProgress, and_(
+                        CourseProgress.user_id == Enrollment.user_id, CourseProgress.course_id == Enrollment.course_id
+                    ))
+                    .where(
+                        Enrollment.user_id == user_id,
+                        Enrollment.course_id.in_({action.course_id for action in completions}),
+                    )
+                    .with_for_update(of=[Enrollment, CourseProgress])
+                ).all()
+            }
+            next_entry_alias = aliased(CourseLessonSequence, name="next_entry")
+            entries = {
+                (entry.course_id, entry.lesson_id): (entry, next_entry)
+                for entry, next_entry in db.execute(
+                    select(CourseLessonSequence, next_entry_alias)
+                    .outerjoin(next_entry_alias, next_entry_alias.lesson_id == CourseLessonSequence.next_lesson_id)
+                    .where(tuple_(CourseLessonSequence.course_id, CourseLessonSequence.lesson_id).in_(
+                        {(action.course_id, action.lesson_id) for action in completions}
+                    ))
+                ).all()
+            }
+
+        results: list[SyncActionResult] = []
+        # course_id -> {"bitmap", "next_entry", "completed"} for courses with a completion in the batch
+        course_states: dict[str, dict] = {}
+        completion_rows: list[dict] = []
+        activity_dates: list[date] = []
+        newly_completed_courses: list[str] = []
+
+        for index, action in enumerate(request.actions):
+            if action.type == "answer":
+                question = questions.get(action.question_id)
+                if question is None or action.answer is None:
+                    results.append(_sync_error(index, action, "Question not found"))
+                    continue
+                try:
+                    is_correct, correct_answer = _grade_answer(question, action.answer)
+                except HTTPException as e:
+                    results.append(_sync_error(index, action, e.detail))
+                    continue
+                results.append(SyncActionResult(
+                    index=index, type=action.type, result="ok",
+                    message="Correct!" if is_correct else "Incorrect",
+                    is_correct=is_correct, correct_answer=correct_answer,
+                ))
+                continue
+
+            context = contexts.get(action.course_id)
+            if context is None:
+                results.append(_sync_error(index, action, "Not enrolled in this course"))
+                continue
+            lesson_entry, next_entry = entries.get((action.course_id, action.lesson_id), (None, None))
+            if lesson_entry is None:
+                # Falls back to syncing the sequence of courses that predate it
+                lesson_entry, next_entry = get_lesson_entry_with_next(action.course_id, action.lesson_id, db)
+            if lesson_entry is None:
+                results.append(_sync_error(index, action, "Lesson does not belong to this course"))
+                continue
+
+            state = course_states.get(action.course_id)
+            if state is None:
+                bitmap, _ = ensure_progress_bitmap(context.CourseProgress, context.sequence_version, db)
+                state = course_states[action.course_id] = {
+                    "bitmap": bitmap, "completed": context.enrollment_status == "completed"
+                }
+
+            completed_at = _sync_activity_time(action.client_timestamp, now)
+            activity_dates.append(completed_at.astimezone().date())
+            if not has_bit(state["bitmap"], lesson_entry.position):
+                state["bitmap"] = set_bit(state["bitmap"], lesson_entry.position)
+                completion_rows.append({
+                    "id": str(uuid.uuid4()),
+                    "user_id": user_id,
+                    "lesson_id": action.lesson_id,
+                    "course_id": action.course_id,
+                    "completed_at": completed_at,
+                })
+            # Progress moves on from the last lesson completed in the batch
+            state["next_entry"] = next_entry
+            course_completed = next_entry is None
+            if course_completed and not state["completed"]:
+                state["completed"] = True
+                newly_completed_courses.append(action.course_id)
+            results.append(SyncActionResult(
+                index=index, type=action.type, result="ok",
+                message="Course completed!" if course_completed else "Lesson completed",
+                next_lesson_id=next_entry.lesson_id if next_entry is not None else None,
+                course_completed=course_completed,
+            ))
 
-            # courses_completed: count of enrollments now marked completed
-            if course_completed:
-                completed_courses_count = db.execute(
-                    select(func.count()).select_from(Enrollment)
-                    .where(Enrollment.user_id == user_id, Enrollment.status == "completed")
-                ).scalar_one()
-                newly_unlocked.extend(
-                    _update_achievement_progress(user_id, "courses_completed", completed_courses_count, db)
+        # Writes, sent to the database as a single statement
+        writes = []
+        reward_event_id = None
+        if course_states:
+            if completion_rows:
+                writes.append(insert(LessonCompletion).values(completion_rows))
+            if newly_completed_courses:
+                writes.append(
+                    update(Enrollment)
+                    .where(Enrollment.user_id == user_id, Enrollment.course_id.in_(newly_completed_courses))
+                    .values(status="completed", completed_at=now)
                 )
-
-            # streak_days: longest streak ever achieved
-            if streak_updated:
-                newly_unlocked.extend(
-                    _update_achievement_progress(user_id, "streak_days", inventory.longest_streak, db)
+            if completion_rows or newly_completed_courses:
+                writes.append(user_stats_update(
+                    user_id,
+                    lessons_completed=len(completion_rows),
+                    courses_completed=len(newly_completed_courses),
+                ))
+            # One row per day; days with only repeat completions are still marked active
+            lessons_by_date = {day: 0 for day in activity_dates}
+            for row in completion_rows:
+                lessons_by_date[row["completed_at"].astimezone().date()] += 1
+            for day, lessons in lessons_by_date.items():
+                writes.append(daily_activity_upsert(user_id, day, lessons=lessons))
+
+            reward_event_id, event_insert = outbox_event_insert("lessons_synced", user_id, {
+                "activity_dates": [day.isoformat() for day in activity_dates],
+                "new_completions": len(completion_rows),
+                "course_completed": bool(newly_completed_courses),
+                "week_start": get_current_week_bounds()[0].isoformat(),
+            })
+            writes.append(event_insert)
+
+            for course_id, state in course_states.items():
+                next_entry = state["next_entry"]
+                context = contexts[course_id]
+                progress_id = context.CourseProgress.id
+                db.expire(context.CourseProgress)
+                writes.append(
+                    update(CourseProgress)
+                    .where(CourseProgress.id == progress_id)
+                    .values(
+                        completed_bitmap=state["bitmap"],
+                        bitmap_version=context.sequence_version,
+                        progress_version=CourseProgress.progress_version + 1,
+                        updated_at=now,
+                        current_unit_id=next_entry.unit_id if next_entry else None,
+                        current_chapter_id=next_entry.chapter_id if next_entry else None,
+                        current_lesson_id=next_entry.lesson_id if next_entry else None,
+                    )
                 )
 
-        # Update daily quests (completion record already flushed above, so count is accurate)
-        today = date.today()
-        lessons_today = db.execute(
-            select(func.count()).select_from(LessonCompletion).where(
-                LessonCompletion.user_id == user_id,
-                func.date(LessonCompletion.completed_at) == today,
-            )
-        ).scalar_one()
-        newly_completed_quests, gems_earned, quest_progress, quest_xp = _update_daily_quests(
-            user_id, lessons_today, inventory, lb_entry, db
+        synced = sum(result.result == "ok" for result in results)
+        response = SyncResponse(
+            status="success",
+            message=f"Synced {synced} of {len(results)} actions",
+            results=results,
+            reward_event_id=reward_event_id,
         )
-        xp_earned += quest_xp
+        replay = idempotency.commit(response, db, writes)
+        return replay if replay is not None else response
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Error syncing progress: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Internal Server Error")
 
-        db.commit()
 
-        return CompleteLessonResponse(
+@router.get("/rewards/{event_id}")
+async def get_rewards(
+    event_id: str,
+    current_user: TokenUser = Depends(require_role("learner")),
+    db: Session = Depends(get_db)
+):
+    """
+    Get the rewards of a complete-lesson (or other activity) call once the worker has applied them.
+    event_status stays "pending" until then; clients poll this endpoint.
+    """
+    try:
+        event = db.execute(
+            select(OutboxEvent.status, OutboxEvent.result)
+            .where(OutboxEvent.id == event_id, OutboxEvent.user_id == current_user.user_id)
+        ).one_or_none()
+        if event is None:
+            raise NotFoundException("Rewards")
+
+        event_status = "pending" if event.status == "processing" else event.status
+        rewards = event.result if event.status == "processed" else {}
+        return GetRewardsResponse(
             status="success",
-            message="Course completed!" if course_completed else "Lesson completed",
-            next_lesson_id=next_lesson_id,
-            course_completed=course_completed,
-            streak_updated=streak_updated,
-            daily_streak=inventory.daily_streak,
-            newly_unlocked_achievements=newly_unlocked,
-            newly_completed_quests=newly_completed_quests,
-            gems_earned=gems_earned,
-            total_gems=inventory.gems,
-            daily_quest_progress=quest_progress,
-            xp_earned=xp_earned,
-            total_xp=inventory.experience_points,
+            message="Rewards retrieved successfully",
+            event_status=event_status,
+            **rewards,
         )
     except HTTPException:
         raise
     except Exception as e:
-        logger.exception(f"Error completing lesson: {str(e)}")
+        logger.exception(f"Error getting rewards: {str(e)}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Internal Server Error")
 
 
@@ -1042,17 +1152,18 @@ async def get_achievements(
     try:
         user_id = current_user.user_id
 
-        achievements = db.execute(
-            select(Achievement).order_by(Achievement.achievement_type, Achievement.goal)
-        ).scalars().all()
+        catalog = get_achievement_catalog(db)
+        # Locked achievements have no stored progress; it is the learner's current value for the type
+        values = get_achievement_values(user_id, db)
 
         user_ach_rows = db.execute(
-            select(UserAchievement).where(UserAchievement.user_id == user_id)
-        ).scalars().all()
+            select(UserAchievement.achievement_id, UserAchievement.achieved, UserAchievement.achieved_at)
+            .where(UserAchievement.user_id == user_id, UserAchievement.achieved == True)
+        ).all()
         user_ach_map = {ua.achievement_id: ua for ua in user_ach_rows}
 
         result = []
-        for ach in achievements:
+        for ach in catalog.achievements:
             ua = user_ach_map.get(ach.id)
             result.append(UserAchievementDetail(
                 achievement_id=ach.id,
@@ -1060,8 +1171,8 @@ async def get_achievements(
                 description=ach.description,
                 achievement_type=ach.achievement_type,
                 goal=ach.goal,
-                progress=ua.progress if ua else 0,
-                achieved=ua.achieved if ua else False,
+                progress=values.get(ach.achievement_type, 0),
+                achieved=ua is not None,
                 achieved_at=ua.achieved_at if ua else None,
                 image_url=ach.image_url
             ))
@@ -1083,36 +1194,19 @@ async def get_daily_quests(
     current_user: TokenUser = Depends(require_role("learner")),
     db: Session = Depends(get_db)
 ):
-    """Get today's daily quests with the current user's progress."""
+    """Get today's daily quests and this week's/month's challenges with the current user's progress."""
     try:
         user_id = current_user.user_id
         today = date.today()
 
-        inventory = _get_or_create_inventory(user_id, db)
+        inventory = get_or_create_inventory(user_id, db)
         db.commit()
 
+        progress_by_key = load_quest_progress(user_id, today, db)
         quests: list[DailyQuestDetail] = []
-        for qdef in DAILY_QUEST_DEFINITIONS:
-            qp = db.execute(
-                select(UserDailyQuestProgress).where(
-                    UserDailyQuestProgress.user_id == user_id,
-                    UserDailyQuestProgress.quest_key == qdef["key"],
-                    UserDailyQuestProgress.date == today,
-                )
-            ).scalar_one_or_none()
-
-            quests.append(DailyQuestDetail(
-                key=qdef["key"],
-                title=qdef["title"],
-                description=qdef["description"],
-                icon=qdef["icon"],
-                quest_type=qdef["quest_type"],
-                goal=qdef["goal"],
-                gems=qdef["gems"],
-                xp=qdef.get("xp", 0),
-                progress=qp.progress if qp else 0,
-                completed=qp.completed if qp else False,
-            ))
+        for quest in QUEST_REGISTRY.values():
+            qp = progress_by_key.get(quest.key)
+            quests.append(quest_detail(quest, qp.progress if qp else 0, qp.completed if qp else False))
 
         return GetDailyQuestsResponse(
             status="success",
@@ -1127,26 +1221,96 @@ async def get_daily_quests(
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Internal Server Error")
 
 
-@router.get("/leaderboard")
-async def get_leaderboard(
+@router.get("/activity/heatmap")
+async def get_activity_heatmap(
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None),
     current_user: TokenUser = Depends(require_role("learner")),
     db: Session = Depends(get_db)
 ):
-    """Get or join the current week's leaderboard for the authenticated student."""
+    """Get the current user's lessons, XP and gems per active day, for an activity heatmap. Defaults to the last year."""
     try:
-        user_id = current_user.user_id
+        try:
+            start_date, end_date = parse_activity_range(start_date, end_date)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
-        # Close any expired leaderboards and update ranks before assigning the user.
-        # This is the reliable reset path — the APScheduler job is best-effort only.
-        from app.utils.leaderboard_utils import process_leaderboard_resets
-        process_leaderboard_resets(db)
+        rows = get_daily_activity(current_user.user_id, start_date, end_date, db)
 
-        inventory = _get_or_create_inventory(user_id, db)
-        user_rank = inventory.current_rank if inventory.current_rank in RANKS else RANKS[0]
+        return GetActivityHeatmapResponse(
+            status="success",
+            message="Activity retrieved successfully",
+            start_date=start_date,
+            end_date=end_date,
+            days=[
+                ActivityDayDetail(date=row.date, lessons=row.lessons, xp=row.xp, gems=row.gems)
+                for row in rows
+            ],
+            active_days=len(rows),
+            total_lessons=sum(row.lessons for row in rows),
+            total_xp=sum(row.xp for row in rows),
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Error getting activity heatmap: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Internal Server Error")
+
+
+@router.get("/activity/xp-history")
+async def get_xp_history(
+    granularity: str = Query("day"),
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None),
+    current_user: TokenUser = Depends(require_role("learner")),
+    db: Session = Depends(get_db)
+):
+    """Get the current user's XP per day, week or month, with a running total, for an XP chart."""
+    try:
+        if granularity not in XP_HISTORY_GRANULARITIES:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"granularity must be one of: {', '.join(XP_HISTORY_GRANULARITIES)}"
+            )
+        try:
+            start_date, end_date = parse_activity_range(start_date, end_date)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+        xp_by_period: dict[date, int] = {}
+        for row in get_daily_activity(current_user.user_id, start_date, end_date, db):
+            period = period_start(row.date, granularity)
+            xp_by_period[period] = xp_by_period.get(period, 0) + row.xp
+
+        points = []
+        cumulative_xp = 0
+        for period in iter_periods(start_date, end_date, granularity):
+            xp = xp_by_period.get(period, 0)
+            cumulative_xp += xp
+            points.append(XpHistoryPoint(period=period.isoformat(), xp=xp, cumulative_xp=cumulative_xp))
+
+        return GetXpHistoryResponse(
+            status="success",
+            message="XP history retrieved successfully",
+            granularity=granularity,
+            start_date=start_date,
+            end_date=end_date,
+            points=points,
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Error getting XP history: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Internal Server Error")
 
-        week_start, week_end = get_current_week_bounds()
 
-        # Check if user already has an active entry this week
+def _load_leaderboard_for(
+    user_id: str, membership: Optional[LeaderboardMembership], week_start: datetime, week_end: datetime, db: Session
+) -> RankedLeaderboard:
+    """Find or take the learner's seat for the week, then load and cache the leaderboard's ranking."""
+    # Check if user already has an active entry this week, by primary key when its pointer is cached
+    existing_entry = db.get(LeaderboardEntry, membership.entry_id) if membership else None
+    if existing_entry is None:
         existing_entry = db.execute(
             select(LeaderboardEntry)
             .join(Leaderboard)
@@ -1158,37 +1322,18 @@ async def get_leaderboard(
             )
         ).scalar_one_or_none()
 
-        if existing_entry:
-            lb = existing_entry.leaderboard
-            my_entry = existing_entry
-        else:
-            # Find an open leaderboard with room, or create one
-            candidates = db.execute(
-                select(Leaderboard).where(
-                    Leaderboard.rank == user_rank,
-                    Leaderboard.status == "open",
-                    Leaderboard.week_start >= week_start,
-                    Leaderboard.week_start < week_end,
-                )
-            ).scalars().all()
-
-            lb = None
-            for candidate in candidates:
-                if len(candidate.entries) < LEADERBOARD_MAX_SIZE:
-                    lb = candidate
-                    break
-
-            if not lb:
-                lb = Leaderboard(
-                    id=str(uuid.uuid4()),
-                    rank=user_rank,
-                    status="open",
-                    week_start=week_start,
-                    week_end=week_end,
-                )
-                db.add(lb)
-                db.flush()
+    if existing_entry:
+        lb = existing_entry.leaderboard
+        my_entry = existing_entry
+    else:
+        inventory = get_or_create_inventory(user_id, db)
+        user_rank = inventory.current_rank if inventory.current_rank in RANKS else RANKS[0]
 
+        leaderboard_id, entry_id = claim_leaderboard_seat(user_id, user_rank, db)
+        lb = db.get(Leaderboard, leaderboard_id)
+        # A concurrent request may have placed the user since the check above
+        my_entry = db.get(LeaderboardEntry, entry_id) if entry_id else None
+        if my_entry is None:
             my_entry = LeaderboardEntry(
                 id=str(uuid.uuid4()),
                 leaderboard_id=lb.id,
@@ -1198,57 +1343,114 @@ async def get_leaderboard(
             db.add(my_entry)
             db.flush()
 
-        db.commit()
-        db.refresh(lb)
+    db.commit()
+    remember_leaderboard_membership(user_id, week_start, lb.id, my_entry.id)
+    return load_ranked_leaderboard(lb, db)
 
-        # Build sorted member list
-        entries = sorted(lb.entries, key=lambda e: e.xp_earned, reverse=True)
-        n = len(entries)
 
-        members = []
-        my_position = 1
-        my_xp = my_entry.xp_earned
+def _leaderboard_response(board: RankedLeaderboard, user_id: str) -> GetLeaderboardResponse:
+    n = len(board.members)
+    members = [
+        LeaderboardMemberDetail(
+            user_id=member.user_id,
+            full_name=member.full_name,
+            xp_earned=member.xp_earned,
+            rank_position=i + 1,
+        )
+        for i, member in enumerate(board.members)
+    ]
+    my_position = board.position_of(user_id) or 1
+    effective_relegation = RELEGATION_COUNT if n >= (PROMOTION_COUNT + RELEGATION_COUNT) else 0
+
+    return GetLeaderboardResponse(
+        status="success",
+        message="Leaderboard retrieved",
+        leaderboard_id=board.leaderboard_id,
+        rank=board.rank,
+        week_start=board.week_start,
+        week_end=board.week_end,
+        members=members,
+        my_position=my_position,
+        my_xp=board.members[my_position - 1].xp_earned if n else 0,
+        promotion_zone=PROMOTION_COUNT,
+        relegation_zone=effective_relegation,
+        total_members=n,
+    )
+
+
+@router.get("/leaderboard")
+async def get_leaderboard(
+    current_user: TokenUser = Depends(require_role("learner")),
+    db: Session = Depends(get_db)
+):
+    """Get or join the current week's leaderboard for the authenticated student."""
+    try:
+        user_id = current_user.user_id
+
+        # Close any expired leaderboards and update ranks before assigning the user, in case the
+        # scheduled reset has not run yet. Free once the week's reset is done.
+        reset_leaderboards_if_due(db)
+
+        week_start, week_end = get_current_week_bounds()
+
+        # Served from the cached ranking when the learner's seat is known: at most a version check
+        membership = get_leaderboard_membership(user_id, week_start)
+        board = get_ranked_leaderboard(membership.leaderboard_id, db) if membership else None
+        if board is None or board.position_of(user_id) is None:
+            board = _load_leaderboard_for(user_id, membership, week_start, week_end, db)
+
+        return _leaderboard_response(board, user_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Error getting leaderboard: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Internal Server Error")
 
-        for i, entry in enumerate(entries):
-            members.append(LeaderboardMemberDetail(
-                user_id=entry.user_id,
-                full_name=entry.user.full_name,
-                xp_earned=entry.xp_earned,
-                rank_position=i + 1,
-            ))
-            if entry.user_id == user_id:
-                my_position = i + 1
-                my_xp = entry.xp_earned
 
-        effective_relegation = RELEGATION_COUNT if n >= (PROMOTION_COUNT + RELEGATION_COUNT) else 0
+@router.get("/leaderboard/friends")
+async def get_friends_leaderboard(
+    current_user: TokenUser = Depends(require_role("learner")),
+    db: Session = Depends(get_db)
+):
+    """This week's XP ranking of the authenticated student and the people they follow."""
+    try:
+        user_id = current_user.user_id
+        week_start, week_end = get_current_week_bounds()
+        rows = get_friends_weekly_xp(user_id, week_start.date(), db)
 
-        return GetLeaderboardResponse(
+        members = [
+            LeaderboardMemberDetail(
+                user_id=row.user_id,
+                full_name=row.full_name,
+                xp_earned=row.xp,
+                rank_position=i + 1,
+            )
+            for i, row in enumerate(rows)
+        ]
+        me = next((member for member in members if member.user_id == user_id), None)
+        if me is None:
+            # The user row is gone, e.g. the account was deleted after the token was issued
+            raise NotFoundException("User")
+
+        return GetFriendsLeaderboardResponse(
             status="success",
-            message="Leaderboard retrieved",
-            leaderboard_id=lb.id,
-            rank=lb.rank,
-            week_start=lb.week_start,
-            week_end=lb.week_end,
+            message="Friends leaderboard retrieved",
+            week_start=week_start,
+            week_end=week_end,
             members=members,
-            my_position=my_position,
-            my_xp=my_xp,
-            promotion_zone=PROMOTION_COUNT,
-            relegation_zone=effective_relegation,
-            total_members=n,
+            my_position=me.rank_position,
+            my_xp=me.xp_earned,
+            total_members=len(members),
         )
     except HTTPException:
         raise
     except Exception as e:
-        logger.exception(f"Error getting leaderboard: {str(e)}")
+        logger.exception(f"Error getting friends leaderboard: {str(e)}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Internal Server Error")
 
 
-def _build_browse_summary(course: Course, db: Session) -> BrowseCourseSummary:
-    """Build a BrowseCourseSummary for a single course including feedback stats."""
-    unit_count = len(course.units)
-    chapter_count = sum(len(u.chapters) for u in course.units)
-    lesson_count = _count_lessons(course)
-    enrollment_count = len(course.enrollments)
+def _browse_summary_from_stats(course: Course, course_stats: CourseStats) -> BrowseCourseSummary:
+    """Build a BrowseCourseSummary from a course and its denormalized stats row."""
     tags = [TagDetail(id=ct.tag.id, name=ct.tag.name) for ct in course.course_tags]
 
     badge_detail = None
@@ -1259,32 +1461,59 @@ def _build_browse_summary(course: Course, db: Session) -> BrowseCourseSummary:
             image_url=course.badge.image_url, course_id=course.badge.course_id
         )
 
-    row = db.execute(
-        select(func.avg(Feedback.rating).label("avg"), func.count(Feedback.id).label("cnt"))
-        .where(Feedback.course_id == course.id)
-    ).one()
-    avg_rating = round(float(row.avg), 1) if row.avg else None
-    review_count = row.cnt or 0
-
     return BrowseCourseSummary(
         id=course.id,
         name=course.name,
         description=course.description,
         tutor_id=course.created_by,
         tutor_name=course.user.full_name,
-        unit_count=unit_count,
-        chapter_count=chapter_count,
-        lesson_count=lesson_count,
-        enrollment_count=enrollment_count,
+        unit_count=course_stats.unit_count,
+        chapter_count=course_stats.chapter_count,
+        lesson_count=course_stats.lesson_count,
+        enrollment_count=course_stats.enrollment_count,
         tags=tags,
         badge=badge_detail,
         price_gems=course.price_gems,
         discount_percent=course.discount_percent,
-        avg_rating=avg_rating,
-        review_count=review_count,
+        avg_rating=round(course_stats.avg_rating, 1) if course_stats.review_count else None,
+        review_count=course_stats.review_count,
     )
 
 
+def _build_browse_summary(course: Course, db: Session) -> BrowseCourseSummary:
+    """Build a BrowseCourseSummary for a single published course from its snapshot and stats."""
+    snapshot, snapshot_created = get_course_snapshot(course, db)
+    if snapshot_created:
+        db.commit()
+    course_stats = get_course_stats([course.id], db)[course.id]
+
+    return BrowseCourseSummary(
+        id=snapshot["id"],
+        name=snapshot["name"],
+        description=snapshot["description"],
+        tutor_id=snapshot["tutor_id"],
+        tutor_name=snapshot["tutor_name"],
+        unit_count=snapshot["unit_count"],
+        chapter_count=snapshot["chapter_count"],
+        lesson_count=snapshot["lesson_count"],
+        enrollment_count=course_stats.enrollment_count,
+        tags=[TagDetail(**tag) for tag in snapshot["tags"]],
+        badge=BadgeDetail(**snapshot["badge"]) if snapshot["badge"] else None,
+        price_gems=course.price_gems,
+        discount_percent=course.discount_percent,
+        avg_rating=round(course_stats.avg_rating, 1) if course_stats.review_count else None,
+        review_count=course_stats.review_count,
+    )
+
+
+def _iter_snapshot_lessons(snapshot: dict):
+    """Yield (unit, chapter, lesson) dicts of a course snapshot in course order."""
+    for unit in snapshot["units"]:
+        for chapter in unit["chapters"]:
+            for lesson in chapter["lessons"]:
+                yield unit, chapter, lesson
+
+
 @router.get("/course/{course_id}/public")
 async def get_course_public_detail(
     course_id: str,
@@ -1293,17 +1522,24 @@ async def get_course_public_detail(
 ):
     """Public course detail page — no enrollment required."""
     try:
+        cache_key = ("course_public", get_catalog_version(db), course_id)
+        cached = catalog_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         course = db.execute(
             select(Course).where(Course.id == course_id, Course.status == "published")
         ).scalar_one_or_none()
         if not course:
             raise NotFoundException("Course")
 
-        return GetCoursePublicDetailResponse(
+        response = GetCoursePublicDetailResponse(
             status="success",
             message="Course retrieved",
             course=_build_browse_summary(course, db)
         )
+        catalog_cache.set(cache_key, response)
+        return response
     except HTTPException:
         raise
     except Exception as e:
@@ -1399,9 +1635,14 @@ async def submit_feedback(
         ).scalar_one_or_none()
 
         if existing:
+            rating_delta = request.rating - existing.rating
             existing.rating = request.rating
             existing.comment = request.comment
             existing.updated_at = datetime.now(timezone.utc)
+            db.flush()
+            if rating_delta:
+                adjust_course_stats(course_id, db, rating_sum=rating_delta)
+            bump_catalog_version(db)
             db.commit()
             return SubmitFeedbackResponse(status="success", message="Review updated", feedback_id=existing.id)
         else:
@@ -1413,6 +1654,9 @@ async def submit_feedback(
                 comment=request.comment,
             )
             db.add(fb)
+            db.flush()
+            adjust_course_stats(course_id, db, rating_sum=request.rating, review_count=1)
+            bump_catalog_version(db)
             db.commit()
             return SubmitFeedbackResponse(status="success", message="Review submitted", feedback_id=fb.id)
     except HTTPException:
@@ -4,6 +4,7 @@ from sqlalchemy import select, func, and_
 from app.auth.dependencies import require_role
 from app.utils.db_utils import get_db
 from app.utils.analytics_utils import monthly_periods, parse_date_bounds
+from app.utils.inventory_utils import get_or_create_inventory, get_gem_balance, debit_gems
 from app.models.models import TokenUser
 from app.models.request_models import CreateRedeemRequestRequest
 from app.models.response_models import (
@@ -14,7 +15,7 @@ from app.models.response_models import (
     LessonFunnelItem, ProgressBucket, RecentFeedbackItem,
 )
 from app.models.db_models import (
-    UserInventory, TutorRedeemRequest, User,
+    TutorRedeemRequest, User,
     Course, Enrollment, LessonCompletion, Feedback,
     Unit, Chapter, Lesson,
 )
@@ -35,17 +36,6 @@ logger = logging.getLogger(__name__)
 GEM_TO_RS = 0.8
 
 
-def _get_or_create_inventory(user_id: str, db: Session) -> UserInventory:
-    inventory = db.execute(
-        select(UserInventory).where(UserInventory.user_id == user_id)
-    ).scalar_one_or_none()
-    if not inventory:
-        inventory = UserInventory(id=str(uuid.uuid4()), user_id=user_id)
-        db.add(inventory)
-        db.flush()
-    return inventory
-
-
 @router.get("/inventory")
 async def get_tutor_inventory(
     current_user: TokenUser = Depends(require_role("tutor", "admin")),
@@ -53,7 +43,7 @@ async def get_tutor_inventory(
 ):
     """Return the tutor's redeemable gem balance."""
     try:
-        inventory = _get_or_create_inventory(current_user.user_id, db)
+        inventory = get_or_create_inventory(current_user.user_id, db)
         db.commit()
         return TutorInventoryResponse(
             status="success",
@@ -81,16 +71,13 @@ async def create_redeem_request(
         if request.gems < 100:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Minimum redemption is 100 gems")
 
-        inventory = _get_or_create_inventory(current_user.user_id, db)
-        if inventory.gems < request.gems:
+        # Deduct gems immediately (held while pending), only if the balance covers them
+        if debit_gems(current_user.user_id, request.gems, db) is None:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Insufficient gems. You have {inventory.gems} gems."
+                detail=f"Insufficient gems. You have {get_gem_balance(current_user.user_id, db)} gems."
             )
 
-        # Deduct gems immediately (held while pending)
-        inventory.gems -= request.gems
-
         amount_rs = int(request.gems * GEM_TO_RS)
         redeem_request = TutorRedeemRequest(
             id=str(uuid.uuid4()),
@@ -127,7 +114,7 @@ async def get_tutor_redeem_requests(
             .order_by(TutorRedeemRequest.created_at.desc())
         ).scalars().all()
 
-        inventory = _get_or_create_inventory(current_user.user_id, db)
+        inventory = get_or_create_inventory(current_user.user_id, db)
         db.commit()
 
         tutor_name = db.execute(
@@ -14,12 +14,17 @@ from app.models.response_models import (
     GetFollowersResponse, GetFollowingResponse, SearchUsersResponse, UserSummaryDetail
 )
 from app.models.db_models import (
-    User, UserInventory, LessonCompletion, Enrollment, UserAchievement,
-    Following, Course, Badge, Feedback
+    User, UserInventory, Enrollment,
+    Following, Course, CourseStats, Badge
 )
 from app.auth.dependencies import get_current_user
 from app.utils.db_utils import get_db
 from app.utils.boto3_utils import upload_file_to_s3, get_presigned_url_from_path
+from app.utils.course_stats_utils import get_course_stats
+from app.utils.user_stats_utils import get_user_stats
+from app.utils.leaderboard_utils import get_current_week_bounds
+from app.utils.leaderboard_membership_utils import get_leaderboard_membership
+from app.utils.leaderboard_ranking_utils import record_leaderboard_xp, ranking_version_bump
 
 _SHOW_NAME = "user"
 router = APIRouter(
@@ -65,20 +70,10 @@ def _build_user_profile(target_user: User, viewer_user_id: str, db: Session) ->
         select(UserInventory).where(UserInventory.user_id == target_user.user_id)
     ).scalar_one_or_none()
 
-    lessons_completed = db.execute(
-        select(func.count()).select_from(LessonCompletion).where(LessonCompletion.user_id == target_user.user_id)
-    ).scalar_one()
-
-    courses_enrolled = db.execute(
-        select(func.count()).select_from(Enrollment).where(Enrollment.user_id == target_user.user_id)
-    ).scalar_one()
-
-    total_achievements = db.execute(
-        select(func.count()).select_from(UserAchievement).where(
-            UserAchievement.user_id == target_user.user_id,
-            UserAchievement.achieved == True
-        )
-    ).scalar_one()
+    stats = get_user_stats([target_user.user_id], db)[target_user.user_id]
+    lessons_completed = stats.lessons_completed
+    courses_enrolled = stats.courses_enrolled
+    total_achievements = stats.achievements_unlocked
 
     followers_count = db.execute(
         select(func.count()).select_from(Following).where(Following.following_user_id == target_user.user_id)
@@ -130,15 +125,21 @@ def _build_user_profile(target_user: User, viewer_user_id: str, db: Session) ->
     tutor_courses = None
 
     if target_user.role == "tutor":
-        tutor_courses_db = db.execute(
-            select(Course).where(
+        # Rating and enrollment counters come from course_stats, joined in the same query
+        course_rows = db.execute(
+            select(Course, CourseStats)
+            .outerjoin(CourseStats, CourseStats.course_id == Course.id)
+            .where(
                 Course.created_by == target_user.user_id,
                 Course.status == "published"
             )
-        ).scalars().all()
+        ).all()
+        missing = [course.id for course, stats in course_rows if stats is None]
+        backfilled = get_course_stats(missing, db)
+        tutor_courses_db = [(course, stats or backfilled[course.id]) for course, stats in course_rows]
 
         courses_created = len(tutor_courses_db)
-        course_ids = [c.id for c in tutor_courses_db]
+        course_ids = [course.id for course, _ in tutor_courses_db]
 
         if course_ids:
             total_unique_students = db.execute(
@@ -147,27 +148,16 @@ def _build_user_profile(target_user: User, viewer_user_id: str, db: Session) ->
                 )
             ).scalar_one()
 
-            overall_avg = db.execute(
-                select(func.avg(Feedback.rating)).where(
-                    Feedback.course_id.in_(course_ids)
-                )
-            ).scalar_one()
-            avg_course_rating = round(float(overall_avg), 1) if overall_avg else None
+            # Average over all reviews of the tutor's courses, not of the per-course averages
+            rating_sum = sum(stats.rating_sum for _, stats in tutor_courses_db)
+            review_count = sum(stats.review_count for _, stats in tutor_courses_db)
+            avg_course_rating = round(rating_sum / review_count, 1) if review_count else None
         else:
             total_unique_students = 0
             avg_course_rating = None
 
         tutor_courses = []
-        for course in tutor_courses_db:
-            course_avg = db.execute(
-                select(func.avg(Feedback.rating)).where(Feedback.course_id == course.id)
-            ).scalar_one()
-            course_review_count = db.execute(
-                select(func.count()).select_from(Feedback).where(Feedback.course_id == course.id)
-            ).scalar_one()
-            course_enrollment_count = db.execute(
-                select(func.count()).select_from(Enrollment).where(Enrollment.course_id == course.id)
-            ).scalar_one()
+        for course, stats in tutor_courses_db:
             badge_detail = None
             if course.badge:
                 badge_detail = BadgeDetail(
@@ -182,9 +172,9 @@ def _build_user_profile(target_user: User, viewer_user_id: str, db: Session) ->
                 id=course.id,
                 name=course.name,
                 description=course.description,
-                avg_rating=round(float(course_avg), 1) if course_avg else None,
-                review_count=course_review_count,
-                enrollment_count=course_enrollment_count,
+                avg_rating=round(stats.avg_rating, 1) if stats.review_count else None,
+                review_count=stats.review_count,
+                enrollment_count=stats.enrollment_count,
                 badge=badge_detail,
                 price_gems=course.price_gems,
                 discount_percent=course.discount_percent,
@@ -280,6 +270,11 @@ async def update_profile(
 
         if request.full_name:
             user.full_name = request.full_name
+            # Show the new name on the learner's cached leaderboard ranking
+            membership = get_leaderboard_membership(user.user_id, get_current_week_bounds()[0])
+            if membership:
+                record_leaderboard_xp(db, membership.leaderboard_id, user.user_id, request.full_name, 0)
+                db.execute(ranking_version_bump(membership.leaderboard_id))
 
         db.commit()
         return UpdateProfileResponse(status="success", message="Profile updated successfully")
@@ -0,0 +1,117 @@
+"""
+Benchmark for POST /api/student/complete-lesson.
+
+Runs two passes against the database in POSTGRES_CONNECTION_URL, inside a transaction that is rolled back:
+  - outbox: the request alone; rewards are left in the outbox for the worker
+  - inline: the request followed by applying its outbox event in the same call, which is
+            what the endpoint used to do before the side effects moved to the outbox
+and prints p50 / p95 / p99 latency for each.
+
+Usage:
+    cd fun2learn_backend
+    python -m app.scripts.benchmark_complete_lesson [lessons_per_pass]
+"""
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import sys
+import time
+import statistics
+from sqlalchemy.orm import sessionmaker
+from fastapi.testclient import TestClient
+from app.main import app
+from app.utils.db_utils import get_db
+from app.connection.postgres_connection import engine
+from app.utils.outbox_utils import drain_outbox
+
+PASSWORD = "password123"
+
+
+def _signup_and_login(client: TestClient, role: str, tag: str) -> dict:
+    email = f"bench.{role}.{tag}@example.com"
+    client.post("/api/auth/signup", json={
+        "email": email, "password": PASSWORD, "full_name": f"Bench {role}", "username": f"bench_{role}_{tag}",
+        "birthday": "2000-01-01", "gender": "male", "role": role,
+    })
+    token = client.post("/api/auth/login", json={"email": email, "password": PASSWORD}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _create_course(client: TestClient, tutor: dict, lesson_count: int) -> tuple[str, list[str]]:
+    course_id = client.post(
+        "/api/course/create_course", json={"name": f"Benchmark {time.time_ns()}", "description": "bench"}, headers=tutor
+    ).json()["course_id"]
+    unit_id = client.post(
+        "/api/course/add_unit", json={"name": "Unit", "description": "bench", "course_id": course_id}, headers=tutor
+    ).json()["unit_id"]
+    chapter_id = client.post(
+        "/api/course/add_chapter", json={"name": "Chapter", "unit_id": unit_id}, headers=tutor
+    ).json()["chapter_id"]
+    lesson_ids = []
+    for i in range(lesson_count):
+        lesson_id = client.post(
+            "/api/course/add_lesson", json={"name": f"Lesson {i}", "chapter_id": chapter_id}, headers=tutor
+        ).json()["lesson_id"]
+        client.post(
+            "/api/course/add_text_question",
+            json={"question_text": "Q", "lesson_id": lesson_id, "correct_answer": "a"},
+            headers=tutor,
+        )
+        lesson_ids.append(lesson_id)
+    client.post("/api/course/publish_course", json={"course_id": course_id}, headers=tutor)
+    return course_id, lesson_ids
+
+
+def _percentile(samples: list[float], pct: int) -> float:
+    return statistics.quantiles(samples, n=100, method="inclusive")[pct - 1] if len(samples) > 1 else samples[0]
+
+
+def _run_pass(client: TestClient, db, tutor: dict, tag: str, lesson_count: int, inline: bool) -> list[float]:
+    learner = _signup_and_login(client, "learner", tag)
+    course_id, lesson_ids = _create_course(client, tutor, lesson_count)
+    client.post("/api/student/enroll", json={"course_id": course_id}, headers=learner)
+    drain_outbox(db)
+
+    timings = []
+    for lesson_id in lesson_ids:
+        start = time.perf_counter()
+        response = client.post(
+            "/api/student/complete-lesson", json={"lesson_id": lesson_id, "course_id": course_id}, headers=learner
+        )
+        if inline:
+            drain_outbox(db)
+        timings.append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+    if not inline:
+        drain_outbox(db)
+    return timings
+
+
+def run(lesson_count: int):
+    connection = engine.connect()
+    transaction = connection.begin()
+    db = sessionmaker(bind=connection, autocommit=False, autoflush=False, join_transaction_mode="create_savepoint")()
+
+    def override_get_db():
+        yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    client = TestClient(app)
+    try:
+        tutor = _signup_and_login(client, "tutor", str(time.time_ns()))
+        for mode, inline in (("inline", True), ("outbox", False)):
+            timings = _run_pass(client, db, tutor, f"{mode}{time.time_ns()}", lesson_count, inline)
+            print(
+                f"{mode:>7}: n={len(timings)}  p50={_percentile(timings, 50):.2f}ms  "
+                f"p95={_percentile(timings, 95):.2f}ms  p99={_percentile(timings, 99):.2f}ms"
+            )
+    finally:
+        app.dependency_overrides.clear()
+        db.close()
+        transaction.rollback()
+        connection.close()
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -0,0 +1,106 @@
+"""
+Benchmark for the weekly leaderboard reset (process_leaderboard_resets).
+
+For each size, seeds that many learners on full leaderboards of last week, with random XP and ranks,
+runs the reset and prints how long it took. The seeded rows are committed (the reset commits per
+chunk, and rows inserted by the same transaction would make Postgres re-check every foreign key
+on update) and deleted again afterwards. Run it against a development database in
+POSTGRES_CONNECTION_URL: expired leaderboards already there are closed by the reset as well.
+
+Usage:
+    cd fun2learn_backend
+    python -m app.scripts.benchmark_leaderboard_reset [entries ...] [--chunk-size N]
+
+Defaults to 10000 100000 1000000 entries and LEADERBOARD_RESET_CHUNK_SIZE.
+"""
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import sys
+import time
+from datetime import timedelta
+from sqlalchemy import text
+from app.connection.postgres_connection import SessionLocal
+from app.utils.leaderboard_utils import (
+    RANKS, LEADERBOARD_MAX_SIZE, LEADERBOARD_RESET_CHUNK_SIZE, get_current_week_bounds, process_leaderboard_resets
+)
+
+SEED_STATEMENTS = [
+    """
+    INSERT INTO users (user_id, full_name, email, password, role, gender)
+    SELECT 'bench-' || :tag || '-' || n, 'Bench learner', 'bench.' || :tag || '.' || n || '@example.com',
+           'x', 'learner', 'other'
+    FROM generate_series(1, :entries) AS n
+    """,
+    """
+    INSERT INTO user_inventory (id, user_id, current_rank)
+    SELECT 'bench-' || :tag || '-' || n, 'bench-' || :tag || '-' || n,
+           (:ranks)[1 + floor(random() * cardinality(:ranks))::int]
+    FROM generate_series(1, :entries) AS n
+    """,
+    """
+    INSERT INTO leaderboards (id, rank, status, week_start, week_end, member_count)
+    SELECT 'bench-' || :tag || '-' || n, (:ranks)[1 + n % cardinality(:ranks)], 'open',
+           :week_start, :week_end, :size
+    FROM generate_series(0, (:entries - 1) / :size) AS n
+    """,
+    """
+    INSERT INTO leaderboard_entries (id, leaderboard_id, user_id, xp_earned)
+    SELECT 'bench-' || :tag || '-' || n, 'bench-' || :tag || '-' || ((n - 1) / :size),
+           'bench-' || :tag || '-' || n, floor(random() * 500)::int
+    FROM generate_series(1, :entries) AS n
+    """,
+]
+
+
+def _cleanup(tag: str) -> None:
+    with SessionLocal() as db:
+        # Entries go with their leaderboards and inventories with their users (ON DELETE CASCADE).
+        # Leaderboards first: entries are indexed by leaderboard, not by user.
+        db.execute(text("DELETE FROM leaderboards WHERE id LIKE :prefix"), {"prefix": f"bench-{tag}-%"})
+        db.execute(text("DELETE FROM users WHERE user_id LIKE :prefix"), {"prefix": f"bench-{tag}-%"})
+        db.commit()
+
+
+def run(sizes: list[int], chunk_size: int):
+    this_week_start, _ = get_current_week_bounds()
+    for entries in sizes:
+        tag = str(time.time_ns())
+        params = {
+            "tag": tag,
+            "entries": entries,
+            "size": LEADERBOARD_MAX_SIZE,
+            "ranks": RANKS,
+            "week_start": this_week_start - timedelta(days=7),
+            "week_end": this_week_start,
+        }
+        try:
+            with SessionLocal() as db:
+                for statement in SEED_STATEMENTS:
+                    db.execute(text(statement), params)
+                db.commit()
+                # Planner statistics for the seeded rows, as autovacuum would gather them for real data
+                for table in ("user_inventory", "leaderboards", "leaderboard_entries"):
+                    db.execute(text(f"ANALYZE {table}"))
+                db.commit()
+
+                start = time.perf_counter()
+                closed = process_leaderboard_resets(db, chunk_size)
+                elapsed = time.perf_counter() - start
+            print(
+                f"{entries:>9} entries: {closed} leaderboards closed in {elapsed:.2f}s "
+                f"({entries / elapsed:,.0f} entries/s, chunk size {chunk_size})"
+            )
+        finally:
+            _cleanup(tag)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    chunk_size = LEADERBOARD_RESET_CHUNK_SIZE
+    if "--chunk-size" in args:
+        i = args.index("--chunk-size")
+        chunk_size = int(args[i + 1])
+        del args[i:i + 2]
+    run([int(arg) for arg in args] or [10_000, 100_000, 1_000_000], chunk_size)
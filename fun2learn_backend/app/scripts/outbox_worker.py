@@ -0,0 +1,55 @@
+"""
+Worker that applies gamification side effects (streaks, XP, quests, achievements, leaderboard XP)
+recorded in the outbox by complete-lesson and enroll. Several workers can run side by side.
+Run the API with OUTBOX_IN_PROCESS=false when using this.
+
+Usage:
+    cd fun2learn_backend
+    python -m app.scripts.outbox_worker
+"""
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import os
+import time
+import logging
+from app.connection.postgres_connection import SessionLocal
+from app.utils.logging_utils import setup_logging
+from app.utils.outbox_utils import drain_outbox, purge_outbox_events
+
+# How long to sleep when the outbox is empty
+POLL_INTERVAL_SECONDS = float(os.getenv("OUTBOX_POLL_INTERVAL_SECONDS", "0.2"))
+PURGE_INTERVAL_SECONDS = 3600
+
+
+def run():
+    setup_logging()
+    logger = logging.getLogger(__name__)
+    logger.info("Outbox worker started")
+
+    last_purge = 0.0
+    while True:
+        db = SessionLocal()
+        try:
+            if time.monotonic() - last_purge > PURGE_INTERVAL_SECONDS:
+                deleted = purge_outbox_events(db)
+                logger.info(f"Purged {deleted} processed outbox events")
+                last_purge = time.monotonic()
+
+            claimed = drain_outbox(db)
+        except Exception as e:
+            logger.exception(f"Error draining outbox: {e}")
+            claimed = 0
+        finally:
+            db.close()
+
+        if not claimed:
+            time.sleep(POLL_INTERVAL_SECONDS)
+
+
+if __name__ == "__main__":
+    try:
+        run()
+    except KeyboardInterrupt:
+        pass
@@ -12,6 +12,7 @@ load_dotenv()
 import uuid
 from app.connection.postgres_connection import SessionLocal
 from app.models.db_models import Achievement
+from app.utils.achievement_catalog_utils import bump_achievement_catalog_version
 
 ACHIEVEMENTS = [
     # ── Lessons Completed ──────────────────────────────────
@@ -165,6 +166,8 @@ def seed_achievements():
             return
 
         db.add_all(new_achievements)
+        # Running API and outbox processes reload their catalog on next use
+        bump_achievement_catalog_version(db)
         db.commit()
         print(f"Inserted {len(new_achievements)} new achievements ({len(existing_names)} already existed).")
 
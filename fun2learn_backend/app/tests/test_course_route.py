@@ -1,12 +1,16 @@
 import pytest
+import uuid
+from contextlib import contextmanager
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import event
+from sqlalchemy import event, select, delete
 from fastapi.testclient import TestClient
 
 from app.main import app
 from app.utils.db_utils import get_db
 from app.connection.postgres_connection import engine
-from app.models.db_models import Course, Unit, Chapter, Lesson
+from app.models.db_models import Course, CourseStats, Unit, Chapter, Lesson, Question, CourseLessonSequence
+from app.utils.course_tree_utils import load_course_tree, load_course_trees
+from app.utils.lesson_sequence_utils import get_first_lesson_entry, get_lesson_entry_with_next
 
 client = TestClient(app)
 
@@ -68,6 +72,8 @@ TUTOR_PAYLOAD = {
     "role": "tutor",
 }
 
+STRUCTURE_TUTOR_PAYLOAD = {**TUTOR_PAYLOAD, "email": "structure@example.com", "username": "structure_tutor"}
+
 
 # ─── Helpers ──────────────────────────────────────────────────────────────────
 
@@ -84,6 +90,54 @@ def auth_headers(token):
     return {"Authorization": f"Bearer {token}"}
 
 
+@contextmanager
+def count_queries():
+    """Collect the SQL statements executed on the engine inside the block, minus the fixture's savepoints."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if "SAVEPOINT" not in statement:
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def create_course(token, name="Structure Course"):
+    return client.post(
+        "/api/course/create_course", json={"name": name, "description": "desc"}, headers=auth_headers(token)
+    ).json()["course_id"]
+
+
+def add_unit(token, course_id, name="Unit"):
+    return client.post(
+        "/api/course/add_unit", json={"name": name, "description": "desc", "course_id": course_id},
+        headers=auth_headers(token),
+    ).json()["unit_id"]
+
+
+def add_chapter(token, unit_id, name="Chapter"):
+    return client.post(
+        "/api/course/add_chapter", json={"name": name, "unit_id": unit_id}, headers=auth_headers(token)
+    ).json()["chapter_id"]
+
+
+def add_lesson(token, chapter_id, name):
+    return client.post(
+        "/api/course/add_lesson", json={"name": name, "chapter_id": chapter_id}, headers=auth_headers(token)
+    ).json()["lesson_id"]
+
+
+def delete_structure(token, kind, item_id):
+    """Delete a unit, chapter or lesson through its endpoint."""
+    return client.request(
+        "DELETE", f"/api/course/delete_{kind}", json={f"{kind}_id": item_id}, headers=auth_headers(token)
+    )
+
+
 # ─── POST /api/course/create_course ───────────────────────────────────────────
 
 class TestCreateCourse:
@@ -307,3 +361,419 @@ class TestAddLesson:
                                headers=auth_headers(token))
 
         assert response.json()["lesson_index"] == 2
+
+
+# ─── POST /api/course/import_course, GET /api/course/course/{id}/export ───────
+
+IMPORT_TUTOR_PAYLOAD = {**TUTOR_PAYLOAD, "email": "importer@example.com", "username": "importer"}
+
+COURSE_DOCUMENT = {
+    "name": "Imported Course",
+    "description": "Built from a document",
+    "tag_ids": [],
+    "units": [
+        {
+            "name": f"Unit {u}",
+            "description": "unit",
+            "chapters": [
+                {
+                    "name": f"Chapter {c}",
+                    "lessons": [
+                        {
+                            "name": f"Lesson {l}",
+                            "questions": [
+                                {
+                                    "question_text": "2 + 2?",
+                                    "question_type": "mcq",
+                                    "options": [
+                                        {"option_text": "4", "is_correct": True},
+                                        {"option_text": "5", "is_correct": False},
+                                    ],
+                                },
+                                {
+                                    "question_text": "Capital of Nepal?",
+                                    "question_type": "text",
+                                    "correct_answer": "Kathmandu",
+                                    "casing_matters": False,
+                                },
+                            ],
+                        }
+                        for l in range(1, 4)
+                    ],
+                }
+                for c in range(1, 3)
+            ],
+        }
+        for u in range(1, 3)
+    ],
+}
+
+
+class TestImportExportCourse:
+    def test_import_creates_whole_tree(self, db_session):
+        token = signup_and_login(IMPORT_TUTOR_PAYLOAD)
+        response = client.post("/api/course/import_course", json=COURSE_DOCUMENT, headers=auth_headers(token))
+
+        assert response.status_code == 200
+        data = response.json()
+        assert (data["unit_count"], data["chapter_count"], data["lesson_count"], data["question_count"]) == (2, 4, 12, 24)
+        course = db_session.query(Course).filter(Course.id == data["course_id"]).first()
+        assert course.status == "draft"
+        indexes = sorted(
+            lesson.lesson_index
+            for lesson in db_session.query(Lesson).join(Chapter).join(Unit).filter(Unit.course_id == course.id)
+        )
+        assert indexes == sorted([1, 2, 3] * 4)
+
+    def test_import_rejects_mcq_without_correct_option(self, db_session):
+        token = signup_and_login(IMPORT_TUTOR_PAYLOAD)
+        document = {
+            "name": "Broken", "description": "d",
+            "units": [{"name": "U", "description": "u", "chapters": [{"name": "C", "lessons": [{
+                "name": "L",
+                "questions": [{"question_text": "?", "question_type": "mcq", "options": [{"option_text": "a", "is_correct": False}]}],
+            }]}]}],
+        }
+        response = client.post("/api/course/import_course", json=document, headers=auth_headers(token))
+
+        assert response.status_code == 400
+        assert db_session.query(Course).filter(Course.name == "Broken").first() is None
+
+    def test_export_round_trips_through_import(self, db_session):
+        token = signup_and_login(IMPORT_TUTOR_PAYLOAD)
+        course_id = client.post(
+            "/api/course/import_course", json=COURSE_DOCUMENT, headers=auth_headers(token)
+        ).json()["course_id"]
+
+        response = client.get(f"/api/course/course/{course_id}/export", headers=auth_headers(token))
+
+        assert response.status_code == 200
+        assert response.json() == COURSE_DOCUMENT
+
+    def test_other_tutor_cannot_export(self, db_session):
+        owner = signup_and_login(IMPORT_TUTOR_PAYLOAD)
+        other = signup_and_login({**IMPORT_TUTOR_PAYLOAD, "email": "other@example.com", "username": "othertutor"})
+        course_id = client.post(
+            "/api/course/import_course", json=COURSE_DOCUMENT, headers=auth_headers(owner)
+        ).json()["course_id"]
+
+        response = client.get(f"/api/course/course/{course_id}/export", headers=auth_headers(other))
+        assert response.status_code == 403
+
+
+# ─── load_course_trees ────────────────────────────────────────────────────────
+
+class TestCourseTree:
+    def _add_unit(self, db_session, course_id, unit_index):
+        unit = Unit(id=str(uuid.uuid4()), name=f"Unit {unit_index}", description="desc",
+                    unit_index=unit_index, course_id=course_id)
+        db_session.add(unit)
+        return unit
+
+    def _add_chapter(self, db_session, unit, chapter_index):
+        chapter = Chapter(id=str(uuid.uuid4()), name=f"{unit.name} Chapter {chapter_index}",
+                          chapter_index=chapter_index, unit_id=unit.id)
+        db_session.add(chapter)
+        return chapter
+
+    def _add_lesson(self, db_session, chapter, lesson_index, question_count=0):
+        lesson = Lesson(id=str(uuid.uuid4()), name=f"{chapter.name} Lesson {lesson_index}",
+                        lesson_index=lesson_index, chapter_id=chapter.id)
+        db_session.add(lesson)
+        db_session.add_all(
+            Question(id=str(uuid.uuid4()), question_text="Q", question_type="text", lesson_id=lesson.id)
+            for _ in range(question_count)
+        )
+        return lesson
+
+    def test_units_chapters_and_lessons_come_in_index_order(self, db_session):
+        course_id = create_course(signup_and_login(STRUCTURE_TUTOR_PAYLOAD))
+        # Added out of order, so only the *_index columns give the order
+        unit_2 = self._add_unit(db_session, course_id, 2)
+        unit_1 = self._add_unit(db_session, course_id, 1)
+        chapter_2 = self._add_chapter(db_session, unit_1, 2)
+        chapter_1 = self._add_chapter(db_session, unit_1, 1)
+        unit_2_chapter = self._add_chapter(db_session, unit_2, 1)
+        lessons = [self._add_lesson(db_session, chapter_1, i) for i in (3, 1, 2)]
+        lessons.append(self._add_lesson(db_session, chapter_2, 1))
+        lessons.append(self._add_lesson(db_session, unit_2_chapter, 1))
+        db_session.flush()
+
+        tree = load_course_tree(course_id, db_session)
+
+        assert [unit.unit_index for unit in tree.units] == [1, 2]
+        assert [chapter.chapter_index for chapter in tree.units[0].chapters] == [1, 2]
+        assert [lesson.lesson_index for lesson in tree.units[0].chapters[0].lessons] == [1, 2, 3]
+        assert [lesson.id for _, _, lesson in tree.iter_lessons()] == [
+            lessons[1].id, lessons[2].id, lessons[0].id, lessons[3].id, lessons[4].id
+        ]
+        assert tree.first_lesson()[2].id == lessons[1].id
+        assert (tree.unit_count, tree.chapter_count, tree.lesson_count) == (2, 3, 5)
+
+    def test_question_counts_per_lesson_and_course(self, db_session):
+        course_id = create_course(signup_and_login(STRUCTURE_TUTOR_PAYLOAD))
+        chapter = self._add_chapter(db_session, self._add_unit(db_session, course_id, 1), 1)
+        for lesson_index, question_count in enumerate((2, 0, 3), start=1):
+            self._add_lesson(db_session, chapter, lesson_index, question_count)
+        db_session.flush()
+
+        tree = load_course_tree(course_id, db_session)
+
+        assert [lesson.question_count for _, _, lesson in tree.iter_lessons()] == [2, 0, 3]
+        assert tree.question_count == 5
+
+    def test_empty_courses_are_present_with_no_content(self, db_session):
+        token = signup_and_login(STRUCTURE_TUTOR_PAYLOAD)
+        empty_id = create_course(token, "Empty")
+        hollow_id = create_course(token, "Hollow")
+        # A unit with an empty chapter still has no lessons
+        self._add_chapter(db_session, self._add_unit(db_session, hollow_id, 1), 1)
+        db_session.flush()
+
+        trees = load_course_trees([empty_id, hollow_id], db_session)
+
+        assert trees[empty_id].units == []
+        assert trees[empty_id].first_lesson() == (None, None, None)
+        assert (trees[hollow_id].unit_count, trees[hollow_id].chapter_count, trees[hollow_id].lesson_count) == (1, 1, 0)
+        assert trees[hollow_id].question_count == 0
+
+    def test_many_courses_load_in_three_queries(self, db_session):
+        token = signup_and_login(STRUCTURE_TUTOR_PAYLOAD)
+        course_ids = [create_course(token, f"Course {i}") for i in range(4)]
+        for course_id in course_ids[:3]:
+            for unit_index in (1, 2):
+                unit = self._add_unit(db_session, course_id, unit_index)
+                for chapter_index in (1, 2):
+                    chapter = self._add_chapter(db_session, unit, chapter_index)
+                    for lesson_index in (1, 2, 3):
+                        self._add_lesson(db_session, chapter, lesson_index, question_count=2)
+        db_session.flush()
+
+        with count_queries() as statements:
+            trees = load_course_trees(course_ids, db_session)
+
+        assert len(statements) == 3
+        assert [trees[course_id].lesson_count for course_id in course_ids] == [12, 12, 12, 0]
+        assert trees[course_ids[0]].question_count == 24
+
+    def test_no_courses_need_no_queries(self, db_session):
+        with count_queries() as statements:
+            assert load_course_trees([], db_session) == {}
+        assert statements == []
+
+
+# ─── Lesson sequence ──────────────────────────────────────────────────────────
+
+class TestLessonSequence:
+    def _sequence(self, db_session, course_id):
+        """(lesson_id, position, next_lesson_id) of the course's sequence rows, in position order."""
+        return [tuple(row) for row in db_session.execute(
+            select(CourseLessonSequence.lesson_id, CourseLessonSequence.position, CourseLessonSequence.next_lesson_id)
+            .where(CourseLessonSequence.course_id == course_id)
+            .order_by(CourseLessonSequence.position)
+        ).all()]
+
+    def _sequence_version(self, db_session, course_id):
+        return db_session.execute(select(Course.sequence_version).where(Course.id == course_id)).scalar_one()
+
+    def test_lessons_are_linked_in_course_order(self, db_session):
+        token = signup_and_login(STRUCTURE_TUTOR_PAYLOAD)
+        course_id = create_course(token)
+        chapter_1 = add_chapter(token, add_unit(token, course_id, "Unit 1"))
+        lesson_1 = add_lesson(token, chapter_1, "Lesson 1")
+        lesson_2 = add_lesson(token, chapter_1, "Lesson 2")
+        lesson_3 = add_lesson(token, add_chapter(token, add_unit(token, course_id, "Unit 2")), "Lesson 3")
+
+        assert self._sequence(db_session, course_id) == [
+            (lesson_1, 0, lesson_2), (lesson_2, 1, lesson_3), (lesson_3, 2, None)
+        ]
+
+    def test_empty_unit_and_chapter_leave_the_sequence_alone(self, db_session):
+        token = signup_and_login(STRUCTURE_TUTOR_PAYLOAD)
+        course_id = create_course(token)
+        lesson_1 = add_lesson(token, add_chapter(token, add_unit(token, course_id, "Unit 1")), "Lesson 1")
+        version = self._sequence_version(db_session, course_id)
+
+        add_chapter(token, add_unit(token, course_id, "Unit 2"))
+
+        assert self._sequence(db_session, course_id) == [(lesson_1, 0, None)]
+        assert self._sequence_version(db_session, course_id) == version
+
+    def test_inserting_before_later_lessons_shifts_them_and_bumps_the_version(self, db_session):
+        token = signup_and_login(STRUCTURE_TUTOR_PAYLOAD)
+        course_id = create_course(token)
+        unit_id = add_unit(token, course_id)
+        chapter_1, chapter_2 = add_chapter(token, unit_id, "Chapter 1"), add_chapter(token, unit_id, "Chapter 2")
+        lesson_1 = add_lesson(token, chapter_1, "Lesson 1")
+        lesson_2 = add_lesson(token, chapter_2, "Lesson 2")
+        version = self._sequence_version(db_session, course_id)
+
+        lesson_1b = add_lesson(token, chapter_1, "Lesson 1b")
+
+        assert self._sequence(db_session, course_id) == [
+            (lesson_1, 0, lesson_1b), (lesson_1b, 1, lesson_2), (lesson_2, 2, None)
+        ]
+        assert self._sequence_version(db_session, course_id) > version
+
+        # Appending keeps every existing position, so completed-lesson bitmaps stay valid
+        version = self._sequence_version(db_session, course_id)
+        lesson_3 = add_lesson(token, chapter_2, "Lesson 3")
+        assert self._sequence(db_session, course_id)[-2:] == [(lesson_2, 2, lesson_3), (lesson_3, 3, None)]
+        assert self._sequence_version(db_session, course_id) == version
+
+    def test_deleting_a_lesson_links_its_neighbours(self, db_session):
+        token = signup_and_login(STRUCTURE_TUTOR_PAYLOAD)
+        course_id = create_course(token)
+        chapter_id = add_chapter(token, add_unit(token, course_id))
+        lesson_1, lesson_2, lesson_3 = (add_lesson(token, chapter_id, f"Lesson {i}") for i in (1, 2, 3))
+
+        assert delete_structure(token, "lesson", lesson_2).status_code == 200
+
+        assert self._sequence(db_session, course_id) == [(lesson_1, 0, lesson_3), (lesson_3, 1, None)]
+
+    def test_deleting_a_chapter_or_unit_drops_its_lessons(self, db_session):
+        token = signup_and_login(STRUCTURE_TUTOR_PAYLOAD)
+        course_id = create_course(token)
+        unit_1 = add_unit(token, course_id, "Unit 1")
+        chapter_1, chapter_2 = add_chapter(token, unit_1, "Chapter 1"), add_chapter(token, unit_1, "Chapter 2")
+        unit_2 = add_unit(token, course_id, "Unit 2")
+        add_lesson(token, chapter_1, "Lesson 1")
+        lesson_2 = add_lesson(token, chapter_2, "Lesson 2")
+        lesson_3 = add_lesson(token, add_chapter(token, unit_2), "Lesson 3")
+
+        assert delete_structure(token, "chapter", chapter_1).status_code == 200
+        assert self._sequence(db_session, course_id) == [(lesson_2, 0, lesson_3), (lesson_3, 1, None)]
+
+        assert delete_structure(token, "unit", unit_2).status_code == 200
+        assert self._sequence(db_session, course_id) == [(lesson_2, 0, None)]
+
+    def test_entry_with_next_lesson(self, db_session):
+        token = signup_and_login(STRUCTURE_TUTOR_PAYLOAD)
+        course_id = create_course(token)
+        chapter_id = add_chapter(token, add_unit(token, course_id))
+        lesson_1, lesson_2 = add_lesson(token, chapter_id, "Lesson 1"), add_lesson(token, chapter_id, "Lesson 2")
+        other_course_id = create_course(token, "Other Course")
+        other_lesson = add_lesson(token, add_chapter(token, add_unit(token, other_course_id)), "Other Lesson")
+
+        entry, next_entry = get_lesson_entry_with_next(course_id, lesson_1, db_session)
+        assert (entry.position, entry.next_lesson_id, next_entry.lesson_id) == (0, lesson_2, lesson_2)
+        entry, next_entry = get_lesson_entry_with_next(course_id, lesson_2, db_session)
+        assert (entry.position, next_entry) == (1, None)
+        assert get_lesson_entry_with_next(course_id, other_lesson, db_session) == (None, None)
+
+    def test_missing_sequence_is_backfilled_on_first_use(self, db_session):
+        token = signup_and_login(STRUCTURE_TUTOR_PAYLOAD)
+        course_id = create_course(token)
+        chapter_id = add_chapter(token, add_unit(token, course_id))
+        lesson_1, lesson_2 = add_lesson(token, chapter_id, "Lesson 1"), add_lesson(token, chapter_id, "Lesson 2")
+        # As for courses created before the sequence existed
+        db_session.execute(delete(CourseLessonSequence).where(CourseLessonSequence.course_id == course_id))
+
+        entry = get_first_lesson_entry(course_id, db_session)
+
+        assert entry.lesson_id == lesson_1
+        assert self._sequence(db_session, course_id) == [(lesson_1, 0, lesson_2), (lesson_2, 1, None)]
+
+    def test_course_without_lessons_skips_the_backfill(self, db_session):
+        token = signup_and_login(STRUCTURE_TUTOR_PAYLOAD)
+        course_id = create_course(token)
+        add_chapter(token, add_unit(token, course_id))
+
+        with count_queries() as statements:
+            assert get_first_lesson_entry(course_id, db_session) is None
+
+        # The two lookups of the first entry; the tree has no lessons, so the sequence is not diffed
+        assert len([s for s in statements if "course_lesson_sequence" in s]) == 2
+        assert not any(s.lstrip().startswith(("INSERT", "UPDATE", "DELETE")) for s in statements)
+
+
+# ─── course_stats counters ────────────────────────────────────────────────────
+
+class TestCourseStats:
+    def _counts(self, db_session, course_id):
+        """(unit_count, chapter_count, lesson_count, question_count, enrollment_count) of the course."""
+        return tuple(db_session.execute(
+            select(
+                CourseStats.unit_count, CourseStats.chapter_count, CourseStats.lesson_count,
+                CourseStats.question_count, CourseStats.enrollment_count,
+            ).where(CourseStats.course_id == course_id)
+        ).one())
+
+    def _add_mcq_question(self, token, lesson_id):
+        return client.post(
+            "/api/course/add_mcq_question",
+            json={"question_text": "2 + 2?", "lesson_id": lesson_id,
+                  "options": [{"option_text": "4", "is_correct": True}, {"option_text": "5", "is_correct": False}]},
+            headers=auth_headers(token),
+        ).json()["question_id"]
+
+    def _add_text_question(self, token, lesson_id):
+        return client.post(
+            "/api/course/add_text_question",
+            json={"question_text": "Capital of Nepal?", "lesson_id": lesson_id, "correct_answer": "Kathmandu"},
+            headers=auth_headers(token),
+        ).json()["question_id"]
+
+    def test_counters_follow_creates(self, db_session):
+        token = signup_and_login(STRUCTURE_TUTOR_PAYLOAD)
+        course_id = create_course(token)
+        assert self._counts(db_session, course_id) == (0, 0, 0, 0, 0)
+
+        unit_id = add_unit(token, course_id)
+        assert self._counts(db_session, course_id) == (1, 0, 0, 0, 0)
+        chapter_id = add_chapter(token, unit_id)
+        assert self._counts(db_session, course_id) == (1, 1, 0, 0, 0)
+        lesson_id = add_lesson(token, chapter_id, "Lesson 1")
+        assert self._counts(db_session, course_id) == (1, 1, 1, 0, 0)
+        self._add_mcq_question(token, lesson_id)
+        assert self._counts(db_session, course_id) == (1, 1, 1, 1, 0)
+        self._add_text_question(token, lesson_id)
+        assert self._counts(db_session, course_id) == (1, 1, 1, 2, 0)
+
+    def test_counters_follow_deletes(self, db_session):
+        token = signup_and_login(STRUCTURE_TUTOR_PAYLOAD)
+        course_id = create_course(token)
+        unit_1, unit_2 = add_unit(token, course_id, "Unit 1"), add_unit(token, course_id, "Unit 2")
+        chapter_1, chapter_2 = add_chapter(token, unit_1, "Chapter 1"), add_chapter(token, unit_1, "Chapter 2")
+        chapter_3 = add_chapter(token, unit_2)
+        lesson_1, lesson_2 = add_lesson(token, chapter_1, "Lesson 1"), add_lesson(token, chapter_1, "Lesson 2")
+        lesson_3, lesson_4 = add_lesson(token, chapter_2, "Lesson 3"), add_lesson(token, chapter_3, "Lesson 4")
+        question_ids = [self._add_mcq_question(token, lesson_id) for lesson_id in (lesson_1, lesson_2, lesson_3, lesson_4)]
+        self._add_text_question(token, lesson_1)
+        assert self._counts(db_session, course_id) == (2, 3, 4, 5, 0)
+
+        response = client.request(
+            "DELETE", "/api/course/delete_question", json={"question_id": question_ids[0]}, headers=auth_headers(token)
+        )
+        assert response.status_code == 200
+        assert self._counts(db_session, course_id) == (2, 3, 4, 4, 0)
+        # A lesson takes its questions with it, a chapter its lessons and a unit its chapters
+        assert delete_structure(token, "lesson", lesson_1).status_code == 200
+        assert self._counts(db_session, course_id) == (2, 3, 3, 3, 0)
+        assert delete_structure(token, "chapter", chapter_1).status_code == 200
+        assert self._counts(db_session, course_id) == (2, 2, 2, 2, 0)
+        assert delete_structure(token, "unit", unit_1).status_code == 200
+        assert self._counts(db_session, course_id) == (1, 1, 1, 1, 0)
+        assert delete_structure(token, "unit", unit_2).status_code == 200
+        assert self._counts(db_session, course_id) == (0, 0, 0, 0, 0)
+
+    def test_enrollments_are_counted_once_per_learner(self, db_session):
+        tutor = signup_and_login(STRUCTURE_TUTOR_PAYLOAD)
+        course_id = create_course(tutor)
+        lesson_id = add_lesson(tutor, add_chapter(tutor, add_unit(tutor, course_id)), "Lesson 1")
+        self._add_text_question(tutor, lesson_id)
+        client.post("/api/course/publish_course", json={"course_id": course_id}, headers=auth_headers(tutor))
+        learners = [
+            signup_and_login({**LEARNER_PAYLOAD, "email": f"learner{i}@example.com", "username": f"learner{i}"})
+            for i in range(2)
+        ]
+
+        for learner in learners:
+            response = client.post("/api/student/enroll", json={"course_id": course_id}, headers=auth_headers(learner))
+            assert response.status_code == 200
+        assert self._counts(db_session, course_id) == (1, 1, 1, 1, 2)
+
+        # Enrolling again is refused and not counted
+        response = client.post("/api/student/enroll", json={"course_id": course_id}, headers=auth_headers(learners[0]))
+        assert response.status_code == 400
+        assert self._counts(db_session, course_id) == (1, 1, 1, 1, 2)
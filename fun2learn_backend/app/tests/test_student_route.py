@@ -0,0 +1,1476 @@
+import pytest
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy import event, select, delete, func
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.utils.db_utils import get_db
+from app.connection.postgres_connection import engine, SessionLocal
+from app.utils.auth_utils import decode_access_token
+from app.models.db_models import (
+    Course, CourseSnapshot, Lesson, Question, Achievement, UserAchievement, UserInventory, LeaderboardEntry, LessonCompletion,
+    OutboxEvent, UserStats, User, Leaderboard, LeaderboardResetState, Following, UserWeeklyXp
+)
+from app.utils.statement_counter_utils import STATEMENT_COUNT_HEADER
+from app.utils.course_snapshot_utils import publish_course_snapshot
+from app.utils.outbox_utils import drain_outbox
+from app.utils.user_stats_utils import get_user_stats
+from app.utils.quest_utils import QUEST_REGISTRY
+from app.utils.leaderboard_membership_utils import (
+    get_leaderboard_membership, invalidate_leaderboard_memberships, forget_leaderboard_membership
+)
+from app.utils.leaderboard_utils import (
+    get_current_week_bounds, claim_leaderboard_seat, process_leaderboard_resets, reset_leaderboards_if_due,
+    forget_leaderboard_reset, LEADERBOARD_MAX_SIZE
+)
+import app.utils.leaderboard_ranking_utils as leaderboard_ranking_utils
+from app.utils.leaderboard_ranking_utils import (
+    get_ranked_leaderboard, invalidate_leaderboard_rankings
+)
+from app.utils.cache_utils import catalog_cache, bump_cache_version, COURSE_CATALOG_CACHE
+from app.utils.idempotency_utils import idempotency_cache, IDEMPOTENCY_KEY_HEADER, IDEMPOTENT_REPLAYED_HEADER
+from app.utils.achievement_catalog_utils import (
+    AchievementCatalog, CatalogAchievement, refresh_achievement_catalog, invalidate_achievement_catalog,
+    get_achievement_catalog, bump_achievement_catalog_version,
+)
+
+client = TestClient(app)
+
+TestingSession = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+
+
+# ─── Fixtures ─────────────────────────────────────────────────────────────────
+
+@pytest.fixture
+def db_session():
+    connection = engine.connect()
+    transaction = connection.begin()
+    session = TestingSession(bind=connection)
+
+    nested = session.begin_nested()
+
+    @event.listens_for(session, "after_transaction_end")
+    def restart_savepoint(session, trans):
+        nonlocal nested
+        if trans.nested and not nested.is_active:
+            nested = session.begin_nested()
+
+    def override_get_db():
+        yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+
+    yield session
+
+    session.close()
+    transaction.rollback()
+    connection.close()
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_overrides():
+    yield
+    app.dependency_overrides.clear()
+    # Achievements added by a test are rolled back, so the catalog loaded from them must go too
+    invalidate_achievement_catalog()
+    # Catalog versions are rolled back too, so responses cached under them could be served again
+    catalog_cache.clear()
+    idempotency_cache.clear()
+    invalidate_leaderboard_memberships()
+    forget_leaderboard_reset()
+    invalidate_leaderboard_rankings()
+
+
+# ─── Shared payloads ──────────────────────────────────────────────────────────
+
+LEARNER_PAYLOAD = {
+    "email": "student.learner@example.com",
+    "password": "password123",
+    "full_name": "Student Learner",
+    "username": "student_learner",
+    "birthday": "2000-01-25",
+    "gender": "male",
+    "role": "learner",
+}
+
+TUTOR_PAYLOAD = {
+    "email": "student.tutor@example.com",
+    "password": "password123",
+    "full_name": "Student Tutor",
+    "username": "student_tutor",
+    "birthday": "1990-05-10",
+    "gender": "female",
+    "role": "tutor",
+}
+
+
+# ─── Helpers ──────────────────────────────────────────────────────────────────
+
+def signup_and_login(payload):
+    client.post("/api/auth/signup", json=payload)
+    resp = client.post("/api/auth/login", json={
+        "email": payload["email"],
+        "password": payload["password"],
+    })
+    return resp.json()["access_token"]
+
+
+def auth_headers(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def user_id_of(token):
+    return decode_access_token(token)["sub"]
+
+
+@contextmanager
+def count_queries():
+    """Collect the SQL statements executed on the engine inside the block, minus the fixture's savepoints."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if "SAVEPOINT" not in statement:
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def create_published_course(token, name, price_gems=None, lesson_count=1):
+    """Create a course with one unit/chapter, lesson_count lessons with a question each, and publish it."""
+    headers = auth_headers(token)
+    course_id = client.post(
+        "/api/course/create_course", json={"name": name, "description": "desc"}, headers=headers
+    ).json()["course_id"]
+    unit_id = client.post(
+        "/api/course/add_unit", json={"name": "Unit", "description": "desc", "course_id": course_id}, headers=headers
+    ).json()["unit_id"]
+    chapter_id = client.post(
+        "/api/course/add_chapter", json={"name": "Chapter", "unit_id": unit_id}, headers=headers
+    ).json()["chapter_id"]
+    lesson_ids = []
+    for i in range(lesson_count):
+        lesson_id = client.post(
+            "/api/course/add_lesson", json={"name": f"Lesson {i}", "chapter_id": chapter_id}, headers=headers
+        ).json()["lesson_id"]
+        client.post(
+            "/api/course/add_text_question",
+            json={"question_text": "Q", "lesson_id": lesson_id, "correct_answer": "a"},
+            headers=headers,
+        )
+        lesson_ids.append(lesson_id)
+    if price_gems is not None:
+        client.post("/api/course/set_price", json={"course_id": course_id, "price_gems": price_gems}, headers=headers)
+    client.post("/api/course/publish_course", json={"course_id": course_id}, headers=headers)
+    return course_id, lesson_ids
+
+
+# ─── GET /api/student/browse ──────────────────────────────────────────────────
+
+class TestBrowseCourses:
+    def test_returns_published_courses_with_counts(self, db_session):
+        tutor = signup_and_login(TUTOR_PAYLOAD)
+        learner = signup_and_login(LEARNER_PAYLOAD)
+        first, _ = create_published_course(tutor, "First", lesson_count=2)
+        second, _ = create_published_course(tutor, "Second")
+
+        response = client.get(
+            "/api/student/browse", params={"tutor_id": user_id_of(tutor)}, headers=auth_headers(learner)
+        )
+        assert response.status_code == 200
+        data = response.json()
+        # Both courses share the test transaction's created_at, so only the set is deterministic
+        lesson_counts = {c["id"]: c["lesson_count"] for c in data["courses"]}
+        assert lesson_counts == {first: 2, second: 1}
+        assert data["next_cursor"] is None
+
+    def test_cursor_pages_through_all_courses(self, db_session):
+        tutor = signup_and_login(TUTOR_PAYLOAD)
+        learner = signup_and_login(LEARNER_PAYLOAD)
+        created = [create_published_course(tutor, f"Course {i}")[0] for i in range(3)]
+
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 2, "tutor_id": user_id_of(tutor), **({"cursor": cursor} if cursor else {})}
+            data = client.get("/api/student/browse", params=params, headers=auth_headers(learner)).json()
+            seen += [c["id"] for c in data["courses"]]
+            cursor = data["next_cursor"]
+            if cursor is None:
+                break
+        assert sorted(seen) == sorted(created)
+
+    def test_filters_by_price(self, db_session):
+        tutor = signup_and_login(TUTOR_PAYLOAD)
+        learner = signup_and_login(LEARNER_PAYLOAD)
+        free, _ = create_published_course(tutor, "Free")
+        paid, _ = create_published_course(tutor, "Paid", price_gems=40)
+
+        paid_only = client.get(
+            "/api/student/browse", params={"price": "paid", "tutor_id": user_id_of(tutor)}, headers=auth_headers(learner)
+        ).json()
+        free_only = client.get(
+            "/api/student/browse", params={"price": "free", "tutor_id": user_id_of(tutor)}, headers=auth_headers(learner)
+        ).json()
+        assert [c["id"] for c in paid_only["courses"]] == [paid]
+        assert [c["id"] for c in free_only["courses"]] == [free]
+
+    def test_popular_sort_orders_by_enrollments(self, db_session):
+        tutor = signup_and_login(TUTOR_PAYLOAD)
+        learner = signup_and_login(LEARNER_PAYLOAD)
+        popular, _ = create_published_course(tutor, "Popular")
+        create_published_course(tutor, "Newer")
+        client.post("/api/student/enroll", json={"course_id": popular}, headers=auth_headers(learner))
+
+        data = client.get(
+            "/api/student/browse", params={"sort": "popular", "tutor_id": user_id_of(tutor)}, headers=auth_headers(learner)
+        ).json()
+        assert data["courses"][0]["id"] == popular
+        assert data["courses"][0]["enrollment_count"] == 1
+
+    def test_rejects_unknown_sort(self, db_session):
+        learner = signup_and_login(LEARNER_PAYLOAD)
+        response = client.get("/api/student/browse", params={"sort": "cheapest"}, headers=auth_headers(learner))
+        assert response.status_code == 400
+
+    def test_rejects_malformed_cursor(self, db_session):
+        learner = signup_and_login(LEARNER_PAYLOAD)
+        response = client.get("/api/student/browse", params={"cursor": "not-a-cursor"}, headers=auth_headers(learner))
+        assert response.status_code == 400
+
+    def test_repeat_browse_is_served_from_cache(self, db_session):
+        tutor = signup_and_login(TUTOR_PAYLOAD)
+        learner = signup_and_login(LEARNER_PAYLOAD)
+        create_published_course(tutor, "Cached")
+        params = {"tutor_id": user_id_of(tutor)}
+        first = client.get("/api/student/browse", params=params, headers=auth_headers(learner)).json()
+
+        with count_queries() as statements:
+            second = client.get("/api/student/browse", params=params, headers=auth_headers(learner)).json()
+
+        assert second == first
+        # Only the catalog version is read
+        assert len(statements) == 1 and "cache_versions" in statements[0]
+
+    def test_catalog_change_from_another_process_invalidates_cached_browse(self, db_session):
+        tutor = signup_and_login(TUTOR_PAYLOAD)
+        learner = signup_and_login(LEARNER_PAYLOAD)
+        course_id, _ = create_published_course(tutor, "Repriced elsewhere")
+        params = {"tutor_id": user_id_of(tutor)}
+        client.get("/api/student/browse", params=params, headers=auth_headers(learner))
+
+        # Another worker commits the change: this process's cache is not cleared, only the version moves
+        db_session.get(Course, course_id).price_gems = 40
+        bump_cache_version(COURSE_CATALOG_CACHE, db_session)
+        db_session.flush()
+
+        data = client.get("/api/student/browse", params=params, headers=auth_headers(learner)).json()
+        assert data["courses"][0]["price_gems"] == 40
+
+    def test_price_change_invalidates_cached_browse(self, db_session):
+        tutor = signup_and_login(TUTOR_PAYLOAD)
+        learner = signup_and_login(LEARNER_PAYLOAD)
+        course_id, _ = create_published_course(tutor, "Repriced")
+        params = {"tutor_id": user_id_of(tutor)}
+        client.get("/api/student/browse", params=params, headers=auth_headers(learner))
+
+        client.post(
+            "/api/course/set_price", json={"course_id": course_id, "price_gems": 25}, headers=auth_headers(tutor)
+        )
+        data = client.get("/api/student/browse", params=params, headers=auth_headers(learner)).json()
+        assert data["courses"][0]["price_gems"] == 25
+
+
+# ─── GET /api/student/course/{course_id} ──────────────────────────────────────
+
+class TestStudentCourseDetail:
+    def test_lesson_added_after_publish_appears_for_enrolled_learner(self, db_session):
+        tutor = signup_and_login(TUTOR_PAYLOAD)
+        learner = signup_and_login(LEARNER_PAYLOAD)
+        course_id, lesson_ids = create_published_course(tutor, "Growing")
+        client.post("/api/student/enroll", json={"course_id": course_id}, headers=auth_headers(learner))
+
+        chapter_id = db_session.get(Lesson, lesson_ids[0]).chapter_id
+        new_lesson_id = client.post(
+            "/api/course/add_lesson", json={"name": "Bonus", "chapter_id": chapter_id}, headers=auth_headers(tutor)
+        ).json()["lesson_id"]
+
+        response = client.get(f"/api/student/course/{course_id}", headers=auth_headers(learner))
+        assert response.status_code == 200
+        lessons = response.json()["course"]["units"][0]["chapters"][0]["lessons"]
+        assert [(l["id"], l["status"]) for l in lessons] == [(lesson_ids[0], "current"), (new_lesson_id, "locked")]
+
+    def test_publish_writes_snapshot(self, db_session):
+        tutor = signup_and_login(TUTOR_PAYLOAD)
+        course_id, _ = create_published_course(tutor, "Snapshotted")
+
+        course = db_session.get(Course, course_id)
+        snapshot = db_session.get(CourseSnapshot, (course_id, course.snapshot_version))
+        assert snapshot is not None
+        assert snapshot.payload["lesson_count"] == 1
+
+    def test_unchanged_detail_returns_304(self, db_session):
+        tutor = signup_and_login(TUTOR_PAYLOAD)
+        learner = signup_and_login(LEARNER_PAYLOAD)
+        course_id, _ = create_published_course(tutor, "Revalidated")
+        client.post("/api/student/enroll", json={"course_id": course_id}, headers=auth_headers(learner))
+
+        first = client.get(f"/api/student/course/{course_id}", headers=auth_headers(learner))
+        etag = first.headers["etag"]
+        second = client.get(
+            f"/api/student/course/{course_id}", headers={**auth_headers(learner), "If-None-Match": etag}
+        )
+        assert second.status_code == 304
+        assert second.headers["etag"] == etag
+
+    def test_completing_a_lesson_changes_detail_etag(self, db_session):
+        tutor = signup_and_login(TUTOR_PAYLOAD)
+        learner = signup_and_login(LEARNER_PAYLOAD)
+        course_id, lesson_ids = create_published_course(tutor, "Progressing", lesson_count=2)
+        client.post("/api/student/enroll", json={"course_id": course_id}, headers=auth_headers(learner))
+        etag = client.get(f"/api/student/course/{course_id}", headers=auth_headers(learner)).headers["etag"]
+
+        client.post(
+            "/api/student/complete-lesson",
+            json={"course_id": course_id, "lesson_id": lesson_ids[0]},
+            headers=auth_headers(learner),
+        )
+        response = client.get(
+            f"/api/student/course/{course_id}", headers={**auth_headers(learner), "If-None-Match": etag}
+        )
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+
+    def test_completed_lessons_survive_reordering(self, db_session):
+        tutor = signup_and_login(TUTOR_PAYLOAD)
+        learner = signup_and_login(LEARNER_PAYLOAD)
+        course_id, lesson_ids = create_published_course(tutor, "Reordered", lesson_count=3)
+        client.post("/api/student/enroll", json={"course_id": course_id}, headers=auth_headers(learner))
+        for lesson_id in lesson_ids[:2]:
+            client.post(
+                "/api/student/complete-lesson",
+                json={"course_id": course_id, "lesson_id": lesson_id},
+                headers=auth_headers(learner),
+            )
+
+        # Removing the first lesson shifts the positions of the remaining two
+        client.request("DELETE", "/api/course/delete_lesson", json={"lesson_id": lesson_ids[0]}, headers=auth_headers(tutor))
+
+        course = client.get(f"/api/student/course/{course_id}", headers=auth_headers(learner)).json()["course"]
+        lessons = course["units"][0]["chapters"][0]["lessons"]
+        assert [(l["id"], l["status"]) for l in lessons] == [(lesson_ids[1], "completed"), (lesson_ids[2], "current")]
+        assert course["completed_lessons"] == 1
+
+    def test_lesson_appended_after_a_deleted_last_lesson_is_not_completed(self, db_session):
+        tutor = signup_and_login(TUTOR_PAYLOAD)
+        learner = signup_and_login(LEARNER_PAYLOAD)
+        course_id, lesson_ids = create_published_course(tutor, "Replaced", lesson_count=2)
+        client.post("/api/student/enroll", json={"course_id": course_id}, headers=auth_headers(learner))
+        for lesson_id in lesson_ids:
+            client.post(
+                "/api/student/complete-lesson",
+                json={"course_id": course_id, "lesson_id": lesson_id},
+                headers=auth_headers(learner),
+            )
+
+        # The new lesson takes the position the deleted one had
+        client.request("DELETE", "/api/course/delete_lesson", json={"lesson_id": lesson_ids[1]}, headers=auth_headers(tutor))
+        chapter_id = db_session.get(Lesson, lesson_ids[0]).chapter_id
+        new_lesson_id = client.post(
+            "/api/course/add_lesson", json={"name": "Replacement", "chapter_id": chapter_id}, headers=auth_headers(tutor)
+        ).json()["lesson_id"]
+
+        course = client.get(f"/api/student/course/{course_id}", headers=auth_headers(learner)).json()["course"]
+        lessons = course["units"][0]["chapters"][0]["lessons"]
+        assert [(l["id"], l["status"]) for l in lessons] == [(lesson_ids[0], "completed"), (new_lesson_id, "current")]
+        assert course["completed_lessons"] == 1
+
+
+# ─── GET /api/user/profile/{user_id} (tutor courses) ──────────────────────────
+
+class TestTutorProfile:
+    def test_course_ratings_come_from_course_stats(self, db_session):
+        tutor = signup_and_login(TUTOR_PAYLOAD)
+        rated_id, _ = create_published_course(tutor, "Rated")
+        unrated_id, _ = create_published_course(tutor, "Unrated")
+        for i, rating in enumerate((5, 4)):
+            learner = signup_and_login({**LEARNER_PAYLOAD, "email": f"rater{i}@example.com", "username": f"rater{i}"})
+            client.post("/api/student/enroll", json={"course_id": rated_id}, headers=auth_headers(learner))
+            client.post(f"/api/student/course/{rated_id}/feedback", json={"rating": rating}, headers=auth_headers(learner))
+
+        with count_queries() as statements:
+            response = client.get(f"/api/user/profile/{user_id_of(tutor)}", headers=auth_headers(tutor))
+
+        assert response.status_code == 200
+        assert not any("FROM feedback" in s for s in statements)
+        profile = response.json()["profile"]
+        courses = {course["id"]: course for course in profile["tutor_courses"]}
+        assert (courses[rated_id]["avg_rating"], courses[rated_id]["review_count"]) == (4.5, 2)
+        assert courses[rated_id]["enrollment_count"] == 2
+        assert (courses[unrated_id]["avg_rating"], courses[unrated_id]["review_count"]) == (None, 0)
+        assert profile["avg_course_rating"] == 4.5
+        assert profile["courses_created"] == 2
+
+
+# ─── GET /api/student/my-courses ──────────────────────────────────────────────
+
+# Enrollment rows with course/tutor/progress/lesson/stats, then the batched badge load
+MY_COURSES_QUERY_BUDGET = 2
+
+
+class TestMyCourses:
+    def test_lists_progress_per_course(self, db_session):
+        tutor = signup_and_login(TUTOR_PAYLOAD)
+        learner = signup_and_login(LEARNER_PAYLOAD)
+        course_id, lesson_ids = create_published_course(tutor, "Tracked", lesson_count=2)
+        client.post("/api/student/enroll", json={"course_id": course_id}, headers=auth_headers(learner))
+        client.post(
+            "/api/student/complete-lesson",
+            json={"course_id": course_id, "lesson_id": lesson_ids[0]},
+            headers=auth_headers(learner),
+        )
+
+        courses = client.get("/api/student/my-courses", headers=auth_headers(learner)).json()["courses"]
+        assert len(courses) == 1
+        assert courses[0]["completed_lessons"] == 1
+        assert courses[0]["total_lessons"] == 2
+        assert courses[0]["progress_percent"] == 50.0
+        assert courses[0]["current_lesson_name"] == "Lesson 1"
+        assert courses[0]["tutor_name"] == TUTOR_PAYLOAD["full_name"]
+
+    def test_query_count_does_not_grow_with_enrollments(self, db_session):
+        tutor = signup_and_login(TUTOR_PAYLOAD)
+        learner = signup_and_login(LEARNER_PAYLOAD)
+        for i in range(6):
+            course_id, lesson_ids = create_published_course(tutor, f"Enrolled {i}", lesson_count=2)
+            client.post("/api/student/enroll", json={"course_id": course_id}, headers=auth_headers(learner))
+            client.post(
+                "/api/student/complete-lesson",
+                json={"course_id": course_id, "lesson_id": lesson_ids[0]},
+                headers=auth_headers(learner),
+            )
+
+        with count_queries() as statements:
+            response = client.get("/api/student/my-courses", headers=auth_headers(learner))
+
+        assert response.status_code == 200
+        assert len(response.json()["courses"]) == 6
+        assert len(statements) <= MY_COURSES_QUERY_BUDGET, statements
+
+
+# ─── POST /api/student/complete-lesson, GET /api/student/rewards/{id} ──────────
+
+# One read, then all writes (completion, progress, outbox event) as one statement
+COMPLETE_LESSON_STATEMENT_BUDGET = 2
+
+
+class TestCompleteLesson:
+    def _enroll(self, lesson_count=3):
+        tutor = signup_and_login(TUTOR_PAYLOAD)
+        learner = signup_and_login(LEARNER_PAYLOAD)
+        course_id, lesson_ids = create_published_course(tutor, "Completable", lesson_count=lesson_count)
+        client.post("/api/student/enroll", json={"course_id": course_id}, headers=auth_headers(learner))
+        return learner, course_id, lesson_ids
+
+    def _complete(self, learner, course_id, lesson_id):
+        return client.post(
+            "/api/student/complete-lesson",
+            json={"course_id": course_id, "lesson_id": lesson_id},
+            headers=auth_headers(learner),
+        )
+
+    def _complete_and_collect(self, db_session, learner, course_id, lesson_id):
+        """Complete a lesson, let the outbox worker run and return the rewards."""
+        event_id = self._complete(learner, course_id, lesson_id).json()["reward_event_id"]
+        drain_outbox(db_session)
+        return client.get(f"/api/student/rewards/{event_id}", headers=auth_headers(learner)).json()
+
+    def test_rewards_are_pending_until_the_worker_runs(self, db_session):
+        learner, course_id, lesson_ids = self._enroll()
+
+        data = self._complete(learner, course_id, lesson_ids[0]).json()
+
+        assert data["next_lesson_id"] == lesson_ids[1]
+        rewards = client.get(f"/api/student/rewards/{data['reward_event_id']}", headers=auth_headers(learner)).json()
+        assert rewards["event_status"] == "pending"
+        inventory = db_session.query(UserInventory).filter(UserInventory.user_id == user_id_of(learner)).one_or_none()
+        assert inventory is None or inventory.experience_points == 0
+
+    def test_first_completion_awards_lesson_and_streak_quest_xp(self, db_session):
+        learner, course_id, lesson_ids = self._enroll()
+
+        rewards = self._complete_and_collect(db_session, learner, course_id, lesson_ids[0])
+
+        assert rewards["event_status"] == "processed"
+        assert rewards["streak_updated"] is True
+        assert rewards["daily_streak"] == 1
+        # 30 for the lesson, 30 for the streak quest
+        assert rewards["xp_earned"] == 60
+        assert rewards["total_xp"] == 60
+        assert [q["key"] for q in rewards["newly_completed_quests"]] == ["streak_today"]
+        user_id = user_id_of(learner)
+        inventory = db_session.query(UserInventory).filter(UserInventory.user_id == user_id).one()
+        assert (inventory.experience_points, inventory.daily_streak) == (60, 1)
+        entry = db_session.query(LeaderboardEntry).filter(LeaderboardEntry.user_id == user_id).one()
+        assert entry.xp_earned == 60
+
+    def test_repeat_completion_is_idempotent(self, db_session):
+        learner, course_id, lesson_ids = self._enroll()
+        self._complete_and_collect(db_session, learner, course_id, lesson_ids[0])
+
+        rewards = self._complete_and_collect(db_session, learner, course_id, lesson_ids[0])
+
+        assert rewards["xp_earned"] == 0
+        assert rewards["total_xp"] == 60
+        completions = db_session.query(LessonCompletion).filter(
+            LessonCompletion.user_id == user_id_of(learner)
+        ).count()
+        assert completions == 1
+
+    def test_last_lesson_completes_course_and_unlocks_achievement(self, db_session):
+        db_session.add(Achievement(
+            id="test-first-course", name="Graduate", description="Finish a course",
+            achievement_type="courses_completed", goal=1,
+        ))
+        db_session.flush()
+        refresh_achievement_catalog(db_session)
+        learner, course_id, lesson_ids = self._enroll(lesson_count=1)
+
+        assert self._complete(learner, course_id, lesson_ids[0]).json()["course_completed"] is True
+        drain_outbox(db_session)
+
+        user_achievement = db_session.query(UserAchievement).filter(
+            UserAchievement.user_id == user_id_of(learner), UserAchievement.achievement_id == "test-first-course"
+        ).one()
+        assert user_achievement.achieved is True
+        assert user_achievement.achieved_at is not None
+
+    def test_activity_counters_are_maintained_by_the_write_paths(self, db_session):
+        learner, course_id, lesson_ids = self._enroll(lesson_count=2)
+        for lesson_id in (*lesson_ids, lesson_ids[1]):
+            self._complete(learner, course_id, lesson_id)
+        drain_outbox(db_session)
+
+        stats = db_session.query(UserStats).filter(UserStats.user_id == user_id_of(learner)).one()
+        db_session.refresh(stats)
+        assert (stats.lessons_completed, stats.courses_completed, stats.courses_enrolled) == (2, 1, 1)
+
+    def test_missing_counters_are_rebuilt_from_history(self, db_session):
+        learner, course_id, lesson_ids = self._enroll(lesson_count=2)
+        self._complete(learner, course_id, lesson_ids[0])
+        user_id = user_id_of(learner)
+        db_session.query(UserStats).filter(UserStats.user_id == user_id).delete()
+
+        stats = get_user_stats([user_id], db_session)[user_id]
+
+        assert (stats.lessons_completed, stats.courses_completed, stats.courses_enrolled) == (1, 0, 1)
+
+    def test_events_are_applied_once(self, db_session):
+        learner, course_id, lesson_ids = self._enroll()
+        self._complete(learner, course_id, lesson_ids[0])
+
+        drain_outbox(db_session)
+        drain_outbox(db_session)
+
+        events = db_session.query(OutboxEvent).filter(OutboxEvent.user_id == user_id_of(learner)).all()
+        assert sorted(e.event_type for e in events) == ["course_enrolled", "lesson_completed"]
+        assert {e.status for e in events} == {"processed"}
+        inventory = db_session.query(UserInventory).filter(UserInventory.user_id == user_id_of(learner)).one()
+        assert inventory.experience_points == 60
+
+    def test_other_learner_cannot_read_rewards(self, db_session):
+        learner, course_id, lesson_ids = self._enroll()
+        event_id = self._complete(learner, course_id, lesson_ids[0]).json()["reward_event_id"]
+        other = signup_and_login({**LEARNER_PAYLOAD, "email": "other.learner@example.com", "username": "other_learner"})
+
+        response = client.get(f"/api/student/rewards/{event_id}", headers=auth_headers(other))
+        assert response.status_code == 404
+
+    def test_completion_stays_within_statement_budget(self, db_session):
+        learner, course_id, lesson_ids = self._enroll()
+        self._complete(learner, course_id, lesson_ids[0])
+
+        with count_queries() as statements:
+            response = self._complete(learner, course_id, lesson_ids[1])
+
+        assert response.status_code == 200
+        assert len(statements) <= COMPLETE_LESSON_STATEMENT_BUDGET, statements
+        assert int(response.headers[STATEMENT_COUNT_HEADER]) >= len(statements)
+
+
+# ─── GET /api/student/achievements ────────────────────────────────────────────
+
+def _catalog_entry(achievement_id, achievement_type, goal):
+    return CatalogAchievement(achievement_id, achievement_id, "desc", achievement_type, goal, None)
+
+
+class TestAchievements:
+    def test_catalog_bisects_to_reached_goals(self):
+        catalog = AchievementCatalog([
+            _catalog_entry("l10", "lessons_completed", 10),
+            _catalog_entry("l1", "lessons_completed", 1),
+            _catalog_entry("l5", "lessons_completed", 5),
+            _catalog_entry("s3", "streak_days", 3),
+        ])
+
+        assert catalog.reached("lessons_completed", 0) == []
+        assert [a.id for a in catalog.reached("lessons_completed", 4)] == ["l1"]
+        assert [a.id for a in catalog.reached("lessons_completed", 10)] == ["l1", "l5", "l10"]
+        assert catalog.reached("courses_enrolled", 5) == []
+
+    def test_catalog_reloads_when_another_process_bumps_its_version(self, db_session):
+        before = len(get_achievement_catalog(db_session).achievements)
+        # What the seed script does: no refresh of this process's catalog, only the version bump
+        db_session.add(Achievement(
+            id="test-seeded", name="Seeded", description="desc", achievement_type="lessons_completed", goal=1,
+        ))
+        bump_achievement_catalog_version(db_session)
+        db_session.flush()
+
+        catalog = get_achievement_catalog(db_session)
+
+        assert len(catalog.achievements) == before + 1
+        assert "test-seeded" in [a.id for a in catalog.reached("lessons_completed", 1)]
+
+    def test_lists_progress_from_live_values_and_only_stores_unlocks(self, db_session):
+        for achievement_id, goal in (("test-lessons-1", 1), ("test-lessons-3", 3)):
+            db_session.add(Achievement(
+                id=achievement_id, name=achievement_id, description="desc",
+                achievement_type="lessons_completed", goal=goal,
+            ))
+        db_session.flush()
+        refresh_achievement_catalog(db_session)
+        tutor = signup_and_login(TUTOR_PAYLOAD)
+        learner = signup_and_login(LEARNER_PAYLOAD)
+        course_id, lesson_ids = create_published_course(tutor, "Achiever", lesson_count=2)
+        client.post("/api/student/enroll", json={"course_id": course_id}, headers=auth_headers(learner))
+        for lesson_id in lesson_ids:
+            client.post(
+                "/api/student/complete-lesson",
+                json={"course_id": course_id, "lesson_id": lesson_id},
+                headers=auth_headers(learner),
+            )
+        drain_outbox(db_session)
+
+        response = client.get("/api/student/achievements", headers=auth_headers(learner))
+
+        assert response.status_code == 200
+        by_id = {a["achievement_id"]: a for a in response.json()["achievements"]}
+        assert (by_id["test-lessons-1"]["achieved"], by_id["test-lessons-1"]["progress"]) == (True, 2)
+        assert (by_id["test-lessons-3"]["achieved"], by_id["test-lessons-3"]["progress"]) == (False, 2)
+        stored = db_session.query(UserAchievement.achievement_id).filter(
+            UserAchievement.user_id == user_id_of(learner),
+            UserAchievement.achievement_id.in_(["test-lessons-1", "test-lessons-3"]),
+        ).all()
+        assert [row.achievement_id for row in stored] == ["test-lessons-1"]
+
+# ─── GET /api/student/activity/* ──────────────────────────────────────────────
+
+class TestActivity:
+    def _complete_lessons(self, db_session, lesson_count):
+        tutor = signup_and_login(TUTOR_PAYLOAD)
+        learner = signup_and_login(LEARNER_PAYLOAD)
+        course_id, lesson_ids = create_published_course(tutor, "Active", lesson_count=lesson_count)
+        client.post("/api/student/enroll", json={"course_id": course_id}, headers=auth_headers(learner))
+        for lesson_id in lesson_ids:
+            client.post(
+                "/api/student/complete-lesson",
+                json={"course_id": course_id, "lesson_id": lesson_id},
+                headers=auth_headers(learner),
+            )
+        drain_outbox(db_session)
+        return learner
+
+    def test_heatmap_rolls_up_todays_lessons_and_rewards(self, db_session):
+        learner = self._complete_lessons(db_session, lesson_count=2)
+
+        response = client.get("/api/student/activity/heatmap", headers=auth_headers(learner))
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["end_date"] == date.today().isoformat()
+        assert data["active_days"] == 1
+        today = data["days"][0]
+        assert today["date"] == date.today().isoformat()
+        assert today["lessons"] == 2
+        # 30 per lesson plus the streak quest
+        assert today["xp"] == 2 * 30 + 30
+        assert data["total_xp"] == today["xp"]
+
+    def test_xp_history_has_a_point_per_period(self, db_session):
+        learner = self._complete_lessons(db_session, lesson_count=1)
+        start = date.today() - timedelta(days=6)
+
+        response = client.get(
+            "/api/student/activity/xp-history",
+            params={"start_date": start.isoformat(), "granularity": "day"},
+            headers=auth_headers(learner),
+        )
+
+        assert response.status_code == 200
+        points = response.json()["points"]
+        assert len(points) == 7
+        assert [p["xp"] for p in points[:-1]] == [0] * 6
+        assert points[-1]["cumulative_xp"] == points[-1]["xp"] == 60
+
+    def test_rejects_ranges_longer_than_a_year(self, db_session):
+        learner = signup_and_login(LEARNER_PAYLOAD)
+
+        response = client.get(
+            "/api/student/activity/heatmap",
+            params={"start_date": (date.today() - timedelta(days=400)).isoformat()},
+            headers=auth_headers(learner),
+        )
+
+        assert response.status_code == 400
+
+    def test_reads_a_year_in_one_query(self, db_session):
+        learner = signup_and_login(LEARNER_PAYLOAD)
+
+        with count_queries() as statements:
+            client.get("/api/student/activity/xp-history", params={"granularity": "week"}, headers=auth_headers(learner))
+
+        activity_reads = [s for s in statements if "user_daily_activity" in s]
+        assert len(activity_reads) == 1
+
+# ─── GET /api/student/daily-quests ────────────────────────────────────────────
+
+class TestQuests:
+    def test_lists_every_registered_quest_with_its_period(self, db_session):
+        learner = signup_and_login(LEARNER_PAYLOAD)
+
+        with count_queries() as statements:
+            response = client.get("/api/student/daily-quests", headers=auth_headers(learner))
+
+        assert response.status_code == 200
+        quests = {q["key"]: q for q in response.json()["quests"]}
+        assert set(quests) == set(QUEST_REGISTRY)
+        assert {q["period"] for q in quests.values()} == {"daily", "weekly", "monthly"}
+        progress_reads = [s for s in statements if "user_daily_quest_progress" in s]
+        assert len(progress_reads) == 1
+
+    def test_completion_advances_daily_weekly_and_monthly_quests(self, db_session):
+        tutor = signup_and_login(TUTOR_PAYLOAD)
+        learner = signup_and_login(LEARNER_PAYLOAD)
+        course_id, lesson_ids = create_published_course(tutor, "Questing", lesson_count=2)
+        client.post("/api/student/enroll", json={"course_id": course_id}, headers=auth_headers(learner))
+        for lesson_id in lesson_ids:
+            client.post(
+                "/api/student/complete-lesson",
+                json={"course_id": course_id, "lesson_id": lesson_id},
+                headers=auth_headers(learner),
+            )
+        drain_outbox(db_session)
+
+        quests = {
+            q["key"]: q
+            for q in client.get("/api/student/daily-quests", headers=auth_headers(learner)).json()["quests"]
+        }
+
+        assert quests["streak_today"]["completed"] is True
+        assert quests["complete_3_lessons"]["progress"] == 2
+        assert quests["weekly_15_lessons"]["progress"] == 2
+        assert quests["weekly_5_days"]["progress"] == 1
+        assert quests["monthly_50_lessons"]["progress"] == 2
+
+
+# ─── POST /api/student/sync ───────────────────────────────────────────────────
+
+class TestSync:
+    def _enroll(self, lesson_count=3):
+        tutor = signup_and_login(TUTOR_PAYLOAD)
+        learner = signup_and_login(LEARNER_PAYLOAD)
+        course_id, lesson_ids = create_published_course(tutor, "Offline", lesson_count=lesson_count)
+        client.post("/api/student/enroll", json={"course_id": course_id}, headers=auth_headers(learner))
+        return learner, course_id, lesson_ids
+
+    def _completion(self, course_id, lesson_id, day=None):
+        timestamp = datetime.combine(day or date.today(), datetime.min.time()).replace(hour=12).astimezone()
+        return {
+            "type": "complete_lesson", "client_timestamp": timestamp.isoformat(),
+            "course_id": course_id, "lesson_id": lesson_id,
+        }
+
+    def _sync(self, learner, actions):
+        return client.post("/api/student/sync", json={"actions": actions}, headers=auth_headers(learner))
+
+    def test_batch_is_applied_in_one_write_with_rewards_computed_once(self, db_session):
+        learner, course_id, lesson_ids = self._enroll()
+        question_id = db_session.query(Question.id).filter(Question.lesson_id == lesson_ids[0]).scalar()
+        actions = [
+            {"type": "answer", "client_timestamp": datetime.now().isoformat(), "question_id": question_id, "answer": "A"},
+            self._completion(course_id, lesson_ids[0]),
+            self._completion(course_id, lesson_ids[1]),
+            self._completion(course_id, lesson_ids[0]),
+        ]
+
+        with count_queries() as statements:
+            response = self._sync(learner, actions)
+
+        assert response.status_code == 200
+        data = response.json()
+        assert [r["result"] for r in data["results"]] == ["ok"] * 4
+        assert data["results"][0]["is_correct"] is True
+        assert data["results"][2]["next_lesson_id"] == lesson_ids[2]
+        assert len([s for s in statements if s.lstrip().upper().startswith(("INSERT", "UPDATE", "WITH"))]) == 1
+        user_id = user_id_of(learner)
+        assert db_session.query(LessonCompletion).filter(LessonCompletion.user_id == user_id).count() == 2
+        events = db_session.query(OutboxEvent).filter(
+            OutboxEvent.user_id == user_id, OutboxEvent.event_type == "lessons_synced"
+        ).all()
+        assert [e.id for e in events] == [data["reward_event_id"]]
+
+        drain_outbox(db_session)
+        rewards = client.get(f"/api/student/rewards/{data['reward_event_id']}", headers=auth_headers(learner)).json()
+        # 30 per new lesson, 30 for the streak quest
+        assert rewards["xp_earned"] == 90
+        assert rewards["daily_streak"] == 1
+
+    def test_offline_days_count_towards_the_streak(self, db_session):
+        learner, course_id, lesson_ids = self._enroll()
+        yesterday = date.today() - timedelta(days=1)
+
+        data = self._sync(learner, [
+            self._completion(course_id, lesson_ids[0], yesterday),
+            self._completion(course_id, lesson_ids[1]),
+        ]).json()
+        drain_outbox(db_session)
+
+        rewards = client.get(f"/api/student/rewards/{data['reward_event_id']}", headers=auth_headers(learner)).json()
+        assert rewards["daily_streak"] == 2
+        heatmap = client.get("/api/student/activity/heatmap", headers=auth_headers(learner)).json()
+        assert {d["date"]: d["lessons"] for d in heatmap["days"]}[yesterday.isoformat()] == 1
+
+    def test_failed_actions_do_not_stop_the_batch(self, db_session):
+        learner, course_id, lesson_ids = self._enroll()
+
+        data = self._sync(learner, [
+            self._completion("not-a-course", lesson_ids[0]),
+            {"type": "answer", "client_timestamp": datetime.now().isoformat(), "question_id": "missing", "answer": "a"},
+            self._completion(course_id, lesson_ids[0]),
+        ]).json()
+
+        assert [r["result"] for r in data["results"]] == ["error", "error", "ok"]
+        assert data["results"][0]["message"] == "Not enrolled in this course"
+        assert db_session.query(LessonCompletion).filter(LessonCompletion.user_id == user_id_of(learner)).count() == 1
+
+    def test_rejects_oversized_batches(self, db_session):
+        learner, course_id, lesson_ids = self._enroll(lesson_count=1)
+
+        response = self._sync(learner, [self._completion(course_id, lesson_ids[0])] * 101)
+
+        assert response.status_code == 400
+
+
+# ─── Leaderboard membership pointers ──────────────────────────────────────────
+
+class TestLeaderboardMembership:
+    def _enroll(self, lesson_count=2):
+        tutor = signup_and_login(TUTOR_PAYLOAD)
+        learner = signup_and_login(LEARNER_PAYLOAD)
+        course_id, lesson_ids = create_published_course(tutor, "Ranked", lesson_count=lesson_count)
+        client.post("/api/student/enroll", json={"course_id": course_id}, headers=auth_headers(learner))
+        return learner, course_id, lesson_ids
+
+    def _complete(self, learner, course_id, lesson_id):
+        client.post(
+            "/api/student/complete-lesson",
+            json={"course_id": course_id, "lesson_id": lesson_id},
+            headers=auth_headers(learner),
+        )
+
+    def test_xp_goes_to_the_cached_entry_by_primary_key(self, db_session):
+        learner, course_id, lesson_ids = self._enroll()
+        # Joining the leaderboard records the pointer
+        leaderboard = client.get("/api/student/leaderboard", headers=auth_headers(learner)).json()
+        user_id = user_id_of(learner)
+        membership = get_leaderboard_membership(user_id, get_current_week_bounds()[0])
+        assert membership.leaderboard_id == leaderboard["leaderboard_id"]
+
+        # Only the completion's event is left for the measured drain
+        while drain_outbox(db_session):
+            pass
+        self._complete(learner, course_id, lesson_ids[0])
+        with count_queries() as statements:
+            drain_outbox(db_session)
+
+        assert not any("FROM leaderboard_entries" in s for s in statements)
+        assert any("UPDATE leaderboard_entries" in s for s in statements)
+        entry = db_session.query(LeaderboardEntry).filter(LeaderboardEntry.user_id == user_id).one()
+        assert entry.id == membership.entry_id
+        assert entry.xp_earned == 60
+
+    def test_worker_finds_and_caches_the_entry_without_a_pointer(self, db_session):
+        learner, course_id, lesson_ids = self._enroll()
+        user_id = user_id_of(learner)
+
+        self._complete(learner, course_id, lesson_ids[0])
+        drain_outbox(db_session)
+        # First event placed the learner; the second reads the committed entry and caches it
+        forget_leaderboard_membership(user_id)
+        self._complete(learner, course_id, lesson_ids[1])
+        drain_outbox(db_session)
+
+        entry = db_session.query(LeaderboardEntry).filter(LeaderboardEntry.user_id == user_id).one()
+        assert get_leaderboard_membership(user_id, get_current_week_bounds()[0]).entry_id == entry.id
+        # 30 + 30 for the lessons, 30 for the streak quest
+        assert entry.xp_earned == 90
+
+    def _report_last_week(self, db, user_id):
+        """Move the learner's pending event to last week, as if processed after the week rolled over."""
+        last_week = get_current_week_bounds()[0] - timedelta(days=7)
+        event = db.query(OutboxEvent).filter(OutboxEvent.user_id == user_id, OutboxEvent.status == "pending").one()
+        event.payload = {**event.payload, "week_start": last_week.isoformat()}
+        db.flush()
+        return last_week
+
+    def test_late_event_goes_to_the_week_it_was_reported_in(self, db_session):
+        learner, course_id, lesson_ids = self._enroll()
+        user_id = user_id_of(learner)
+        while drain_outbox(db_session):
+            pass
+        self._complete(learner, course_id, lesson_ids[0])
+        last_week = self._report_last_week(db_session, user_id)
+        # The reset has closed last week's leaderboard already
+        leaderboard = Leaderboard(
+            id=str(uuid.uuid4()), rank="unranked", status="closed", week_start=last_week,
+            week_end=last_week + timedelta(days=7), member_count=1,
+        )
+        db_session.add(leaderboard)
+        db_session.add(LeaderboardEntry(id=str(uuid.uuid4()), leaderboard_id=leaderboard.id, user_id=user_id))
+        db_session.flush()
+
+        drain_outbox(db_session)
+
+        entries = db_session.query(LeaderboardEntry).filter(LeaderboardEntry.user_id == user_id).all()
+        assert [(entry.leaderboard_id, entry.xp_earned) for entry in entries] == [(leaderboard.id, 60)]
+        weekly = db_session.query(UserWeeklyXp).filter(UserWeeklyXp.user_id == user_id).all()
+        assert [(row.week_start, row.xp) for row in weekly] == [(last_week.date(), 60)]
+
+    def test_late_event_does_not_take_a_seat_in_a_past_week(self, db_session):
+        learner, course_id, lesson_ids = self._enroll()
+        user_id = user_id_of(learner)
+        while drain_outbox(db_session):
+            pass
+        self._complete(learner, course_id, lesson_ids[0])
+        self._report_last_week(db_session, user_id)
+
+        drain_outbox(db_session)
+
+        assert db_session.query(LeaderboardEntry).filter(LeaderboardEntry.user_id == user_id).count() == 0
+        inventory = db_session.query(UserInventory).filter(UserInventory.user_id == user_id).one()
+        assert inventory.experience_points == 60
+
+
+class TestLeaderboardRanking:
+    def test_repeat_view_only_checks_the_ranking_version(self, db_session):
+        learner = signup_and_login(LEARNER_PAYLOAD)
+        first = client.get("/api/student/leaderboard", headers=auth_headers(learner)).json()
+
+        with count_queries() as statements:
+            second = client.get("/api/student/leaderboard", headers=auth_headers(learner))
+
+        assert second.status_code == 200
+        assert len(statements) == 1 and "ranking_version" in statements[0]
+        assert second.json() == first
+        me = next(m for m in second.json()["members"] if m["user_id"] == user_id_of(learner))
+        assert me["full_name"] == LEARNER_PAYLOAD["full_name"]
+
+    def test_xp_changes_update_the_cached_ranking_after_commit(self, db_session):
+        tutor = signup_and_login(TUTOR_PAYLOAD)
+        learner = signup_and_login(LEARNER_PAYLOAD)
+        course_id, lesson_ids = create_published_course(tutor, "Ranked", lesson_count=1)
+        client.post("/api/student/enroll", json={"course_id": course_id}, headers=auth_headers(learner))
+        leaderboard_id = client.get("/api/student/leaderboard", headers=auth_headers(learner)).json()["leaderboard_id"]
+        while drain_outbox(db_session):
+            pass
+
+        client.post(
+            "/api/student/complete-lesson",
+            json={"course_id": course_id, "lesson_id": lesson_ids[0]},
+            headers=auth_headers(learner),
+        )
+        drain_outbox(db_session)
+
+        entry = db_session.query(LeaderboardEntry).filter(LeaderboardEntry.user_id == user_id_of(learner)).one()
+        ranking = get_ranked_leaderboard(leaderboard_id, db_session)
+        assert ranking.members[ranking.position_of(entry.user_id) - 1].xp_earned == entry.xp_earned > 0
+        with count_queries() as statements:
+            view = client.get("/api/student/leaderboard", headers=auth_headers(learner)).json()
+        assert len(statements) == 1
+        assert view["my_xp"] == entry.xp_earned
+
+    def test_xp_applied_by_another_process_is_not_hidden_by_the_cache(self, db_session, monkeypatch):
+        # Another API worker, or a separate outbox worker, applies XP without updating this
+        # process's store
+        monkeypatch.setattr(leaderboard_ranking_utils.ranking_store, "add_xp", lambda *change: None)
+        tutor = signup_and_login(TUTOR_PAYLOAD)
+        learner = signup_and_login(LEARNER_PAYLOAD)
+        course_id, lesson_ids = create_published_course(tutor, "Ranked", lesson_count=1)
+        client.post("/api/student/enroll", json={"course_id": course_id}, headers=auth_headers(learner))
+        before = client.get("/api/student/leaderboard", headers=auth_headers(learner)).json()["my_xp"]
+        while drain_outbox(db_session):
+            pass
+
+        client.post(
+            "/api/student/complete-lesson",
+            json={"course_id": course_id, "lesson_id": lesson_ids[0]},
+            headers=auth_headers(learner),
+        )
+        drain_outbox(db_session)
+
+        entry = db_session.query(LeaderboardEntry).filter(LeaderboardEntry.user_id == user_id_of(learner)).one()
+        view = client.get("/api/student/leaderboard", headers=auth_headers(learner)).json()
+        assert view["my_xp"] == entry.xp_earned > before
+
+    def test_rename_shows_on_the_cached_ranking(self, db_session):
+        learner = signup_and_login(LEARNER_PAYLOAD)
+        client.get("/api/student/leaderboard", headers=auth_headers(learner))
+
+        client.put("/api/user/profile", json={"full_name": "Renamed Learner"}, headers=auth_headers(learner))
+
+        view = client.get("/api/student/leaderboard", headers=auth_headers(learner)).json()
+        assert view["members"][view["my_position"] - 1]["full_name"] == "Renamed Learner"
+
+
+class TestFriendsLeaderboard:
+    def _learner(self, name):
+        return signup_and_login({
+            **LEARNER_PAYLOAD, "email": f"{name}@example.com", "username": name, "full_name": name.title(),
+        })
+
+    def test_ranks_the_learner_and_the_people_they_follow(self, db_session):
+        tutor = signup_and_login(TUTOR_PAYLOAD)
+        learner, busy, idle, stranger = (self._learner(name) for name in ("me", "busy", "idle", "stranger"))
+        course_id, lesson_ids = create_published_course(tutor, "Friends", lesson_count=2)
+        for token in (learner, busy, stranger):
+            client.post("/api/student/enroll", json={"course_id": course_id}, headers=auth_headers(token))
+        for friend in (busy, idle):
+            client.post(f"/api/user/follow/{user_id_of(friend)}", headers=auth_headers(learner))
+
+        # busy completes two lessons, the learner one, the stranger (not followed) two
+        for token, lessons in ((busy, lesson_ids), (learner, lesson_ids[:1]), (stranger, lesson_ids)):
+            for lesson_id in lessons:
+                client.post(
+                    "/api/student/complete-lesson",
+                    json={"course_id": course_id, "lesson_id": lesson_id},
+                    headers=auth_headers(token),
+                )
+        while drain_outbox(db_session):
+            pass
+
+        with count_queries() as statements:
+            response = client.get("/api/student/leaderboard/friends", headers=auth_headers(learner))
+
+        assert response.status_code == 200
+        assert len(statements) == 1
+        data = response.json()
+        assert [m["full_name"] for m in data["members"]] == ["Busy", "Me", "Idle"]
+        assert [m["xp_earned"] for m in data["members"]] == [90, 60, 0]
+        assert data["my_position"] == 2
+        assert data["my_xp"] == 60
+        assert data["total_members"] == 3
+
+    def test_learner_following_nobody_sees_only_themselves(self, db_session):
+        learner = self._learner("loner")
+
+        data = client.get("/api/student/leaderboard/friends", headers=auth_headers(learner)).json()
+
+        assert [m["user_id"] for m in data["members"]] == [user_id_of(learner)]
+        assert data["my_position"] == 1
+        assert data["my_xp"] == 0
+
+    def test_self_follow_lists_the_learner_once(self, db_session):
+        learner = self._learner("narcissus")
+        user_id = user_id_of(learner)
+        # The follow endpoint refuses this, but rows written before that check may exist
+        db_session.add(Following(following_id=str(uuid.uuid4()), follower_user_id=user_id, following_user_id=user_id))
+        db_session.flush()
+
+        data = client.get("/api/student/leaderboard/friends", headers=auth_headers(learner)).json()
+
+        assert [m["user_id"] for m in data["members"]] == [user_id]
+        assert data["total_members"] == 1
+
+    def test_missing_user_row_returns_404(self, db_session):
+        learner = self._learner("ghost")
+        db_session.execute(delete(User).where(User.user_id == user_id_of(learner)))
+
+        response = client.get("/api/student/leaderboard/friends", headers=auth_headers(learner))
+
+        assert response.status_code == 404
+
+
+class TestLeaderboardReset:
+    def _closed_week_leaderboard(self, db, members):
+        """A leaderboard of last week with one learner per (current_rank, xp_earned) pair."""
+        week_start = get_current_week_bounds()[0] - timedelta(days=7)
+        leaderboard = Leaderboard(
+            id=str(uuid.uuid4()), rank="gold", status="open", week_start=week_start,
+            week_end=week_start + timedelta(days=7), member_count=len(members),
+        )
+        db.add(leaderboard)
+        user_ids = []
+        for current_rank, xp in members:
+            user_id = str(uuid.uuid4())
+            db.add(User(user_id=user_id, full_name="Reset Test", email=f"{user_id}@example.com",
+                        password="x", role="learner", gender="other"))
+            db.add(UserInventory(id=str(uuid.uuid4()), user_id=user_id, current_rank=current_rank))
+            db.add(LeaderboardEntry(
+                id=str(uuid.uuid4()), leaderboard_id=leaderboard.id, user_id=user_id, xp_earned=xp
+            ))
+            user_ids.append(user_id)
+        db.flush()
+        return leaderboard, user_ids
+
+    def _ranks(self, db, user_ids):
+        db.expire_all()
+        inventories = db.query(UserInventory).filter(UserInventory.user_id.in_(user_ids)).all()
+        by_user = {inventory.user_id: inventory.current_rank for inventory in inventories}
+        return [by_user[user_id] for user_id in user_ids]
+
+    def test_top_three_promoted_and_bottom_two_relegated(self, db_session):
+        leaderboard, user_ids = self._closed_week_leaderboard(db_session, [
+            ("champions", 90), ("gold", 80), ("unranked", 70), ("gold", 60), ("silver", 50), ("bronze", 40),
+        ])
+        process_leaderboard_resets(db_session)
+
+        assert self._ranks(db_session, user_ids) == ["champions", "platinum", "silver", "gold", "bronze", "bronze"]
+        assert db_session.get(Leaderboard, leaderboard.id).status == "closed"
+
+    def test_no_promotion_without_xp_and_no_relegation_on_small_leaderboards(self, db_session):
+        _, user_ids = self._closed_week_leaderboard(db_session, [("gold", 10), ("gold", 0), ("gold", 0)])
+        process_leaderboard_resets(db_session)
+
+        assert self._ranks(db_session, user_ids) == ["platinum", "gold", "gold"]
+
+    def test_chunks_take_two_statements_each(self, db_session):
+        process_leaderboard_resets(db_session)
+        user_ids = []
+        for _ in range(3):
+            user_ids += self._closed_week_leaderboard(db_session, [("silver", 10)] * 6)[1]
+
+        with count_queries() as statements:
+            closed = process_leaderboard_resets(db_session, chunk_size=2)
+
+        assert closed == 3
+        # Two chunks, plus the query finding nothing left
+        assert len([s for s in statements if not s.startswith(("BEGIN", "COMMIT"))]) == 5
+        assert self._ranks(db_session, user_ids).count("gold") == 9
+        assert self._ranks(db_session, user_ids).count("bronze") == 6
+
+
+class TestLeaderboardResetWatermark:
+    def _expired_leaderboard(self, db):
+        week_start = get_current_week_bounds()[0] - timedelta(days=7)
+        leaderboard = Leaderboard(
+            id=str(uuid.uuid4()), rank="bronze", status="open", week_start=week_start,
+            week_end=week_start + timedelta(days=7),
+        )
+        db.add(leaderboard)
+        # The week's reset has not run yet
+        db.query(LeaderboardResetState).delete()
+        db.flush()
+        return leaderboard
+
+    def test_leaderboard_view_runs_a_due_reset_once(self, db_session):
+        leaderboard = self._expired_leaderboard(db_session)
+        learner = signup_and_login(LEARNER_PAYLOAD)
+
+        client.get("/api/student/leaderboard", headers=auth_headers(learner))
+        assert db_session.get(Leaderboard, leaderboard.id).status == "closed"
+        state = db_session.get(LeaderboardResetState, 1)
+        assert state.last_reset_week_start.replace(tzinfo=None) == get_current_week_bounds()[0]
+
+        with count_queries() as statements:
+            client.get("/api/student/leaderboard", headers=auth_headers(learner))
+        assert not any("leaderboard_reset_state" in s for s in statements)
+        assert not any("UPDATE leaderboards" in s for s in statements)
+
+    def test_watermark_in_the_database_skips_the_reset(self, db_session):
+        reset_leaderboards_if_due(db_session)
+        forget_leaderboard_reset()
+
+        with count_queries() as statements:
+            assert reset_leaderboards_if_due(db_session) is False
+        assert len(statements) == 1
+
+    def test_reset_skipped_while_another_caller_holds_the_lock(self, db_session):
+        leaderboard = self._expired_leaderboard(db_session)
+
+        with engine.connect() as other:
+            other.execute(select(func.pg_advisory_lock(func.hashtext("leaderboard_reset"))))
+            try:
+                assert reset_leaderboards_if_due(db_session) is False
+            finally:
+                other.execute(select(func.pg_advisory_unlock(func.hashtext("leaderboard_reset"))))
+        assert db_session.get(Leaderboard, leaderboard.id).status == "open"
+
+        assert reset_leaderboards_if_due(db_session) is True
+        db_session.refresh(leaderboard)
+        assert leaderboard.status == "closed"
+
+
+# ─── Idempotency-Key ──────────────────────────────────────────────────────────
+
+class TestIdempotencyKeys:
+    def _headers(self, token, key):
+        return {**auth_headers(token), IDEMPOTENCY_KEY_HEADER: key}
+
+    def test_complete_lesson_retry_replays_the_response_after_one_lookup(self, db_session):
+        tutor = signup_and_login(TUTOR_PAYLOAD)
+        learner = signup_and_login(LEARNER_PAYLOAD)
+        course_id, lesson_ids = create_published_course(tutor, "Retried", lesson_count=2)
+        client.post("/api/student/enroll", json={"course_id": course_id}, headers=auth_headers(learner))
+        body = {"course_id": course_id, "lesson_id": lesson_ids[0]}
+
+        first = client.post("/api/student/complete-lesson", json=body, headers=self._headers(learner, "retry-1"))
+        # A retry reaching another worker process finds the stored response in the database
+        idempotency_cache.clear()
+        with count_queries() as statements:
+            retry = client.post("/api/student/complete-lesson", json=body, headers=self._headers(learner, "retry-1"))
+
+        assert retry.status_code == 200
+        assert retry.json() == first.json()
+        assert retry.headers[IDEMPOTENT_REPLAYED_HEADER] == "true"
+        assert len(statements) == 1
+        events = db_session.query(OutboxEvent).filter(
+            OutboxEvent.user_id == user_id_of(learner), OutboxEvent.event_type == "lesson_completed"
+        ).count()
+        assert events == 1
+
+    def test_key_reused_for_a_different_request_is_rejected(self, db_session):
+        tutor = signup_and_login(TUTOR_PAYLOAD)
+        learner = signup_and_login(LEARNER_PAYLOAD)
+        course_id, lesson_ids = create_published_course(tutor, "Reused", lesson_count=2)
+        client.post("/api/student/enroll", json={"course_id": course_id}, headers=auth_headers(learner))
+        headers = self._headers(learner, "reused-key")
+
+        client.post("/api/student/complete-lesson", json={"course_id": course_id, "lesson_id": lesson_ids[0]}, headers=headers)
+        response = client.post(
+            "/api/student/complete-lesson", json={"course_id": course_id, "lesson_id": lesson_ids[1]}, headers=headers
+        )
+
+        assert response.status_code == 422
+
+    def test_enroll_retry_does_not_charge_twice(self, db_session):
+        tutor = signup_and_login(TUTOR_PAYLOAD)
+        learner = signup_and_login(LEARNER_PAYLOAD)
+        course_id, _ = create_published_course(tutor, "Paid Retry", price_gems=40)
+        client.get("/api/student/streak", headers=auth_headers(learner))
+        inventory = db_session.query(UserInventory).filter(UserInventory.user_id == user_id_of(learner)).one()
+        inventory.gems = 100
+        db_session.commit()
+        headers = self._headers(learner, "enroll-1")
+
+        first = client.post("/api/student/enroll", json={"course_id": course_id}, headers=headers)
+        retry = client.post("/api/student/enroll", json={"course_id": course_id}, headers=headers)
+
+        assert first.status_code == 200
+        assert retry.status_code == 200
+        assert retry.json()["enrollment_id"] == first.json()["enrollment_id"]
+        db_session.refresh(inventory)
+        assert inventory.gems == 60
+
+
+# ─── Concurrent balance updates ───────────────────────────────────────────────
+
+class TestConcurrentBalances:
+    """
+    Fires parallel requests for one learner through the real session factory, so every request
+    commits on its own connection. Everything created is deleted again at the end.
+    """
+
+    COURSE_PRICE = 10
+    AFFORDABLE_COURSES = 150
+    PAID_COURSES = 200
+    LESSONS = 20
+
+    @pytest.fixture
+    def accounts(self):
+        suffix = uuid.uuid4().hex[:8]
+        payloads = [
+            {**payload, "email": f"{suffix}.{payload['email']}", "username": f"{payload['username']}_{suffix}"}
+            for payload in (TUTOR_PAYLOAD, LEARNER_PAYLOAD)
+        ]
+        tutor, learner = (signup_and_login(payload) for payload in payloads)
+        yield tutor, learner
+        user_ids = [user_id_of(tutor), user_id_of(learner)]
+        with SessionLocal() as db:
+            leaderboard_ids = db.execute(
+                select(LeaderboardEntry.leaderboard_id).where(LeaderboardEntry.user_id.in_(user_ids))
+            ).scalars().all()
+            # Course content is removed through the ORM cascades, like delete_course does
+            for course in db.query(Course).filter(Course.created_by.in_(user_ids)):
+                db.delete(course)
+            db.flush()
+            db.execute(delete(User).where(User.user_id.in_(user_ids)))
+            db.execute(delete(Leaderboard).where(Leaderboard.id.in_(leaderboard_ids), ~Leaderboard.entries.any()))
+            db.commit()
+
+    def _add_paid_courses(self, tutor_id):
+        course_ids = [str(uuid.uuid4()) for _ in range(self.PAID_COURSES)]
+        with SessionLocal() as db:
+            db.add_all(
+                Course(id=course_id, name=f"Stress {i}", description="desc", created_by=tutor_id,
+                       status="published", price_gems=self.COURSE_PRICE)
+                for i, course_id in enumerate(course_ids)
+            )
+            db.commit()
+        return course_ids
+
+    def _drain_in_parallel(self, workers=4):
+        def drain():
+            with SessionLocal() as db:
+                while drain_outbox(db):
+                    pass
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for future in [pool.submit(drain) for _ in range(workers)]:
+                future.result()
+
+    def test_parallel_enrollments_and_completions_keep_exact_balances(self, accounts):
+        tutor, learner = accounts
+        tutor_id, learner_id = user_id_of(tutor), user_id_of(learner)
+        with SessionLocal() as db:
+            db.query(UserInventory).filter(UserInventory.user_id == learner_id).update(
+                {"gems": self.COURSE_PRICE * self.AFFORDABLE_COURSES}
+            )
+            db.commit()
+        paid_course_ids = self._add_paid_courses(tutor_id)
+        free_course_id, lesson_ids = create_published_course(tutor, "Stress Free", lesson_count=self.LESSONS)
+        client.post("/api/student/enroll", json={"course_id": free_course_id}, headers=auth_headers(learner))
+
+        def enroll(course_id):
+            return client.post("/api/student/enroll", json={"course_id": course_id}, headers=auth_headers(learner))
+
+        def complete(lesson_id):
+            return client.post(
+                "/api/student/complete-lesson",
+                json={"course_id": free_course_id, "lesson_id": lesson_id},
+                headers=auth_headers(learner),
+            )
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            enrollments = list(pool.map(enroll, paid_course_ids))
+            # Every lesson is completed twice at the same time
+            completions = list(pool.map(complete, lesson_ids * 2))
+        self._drain_in_parallel()
+
+        assert sorted(r.status_code for r in enrollments).count(200) == self.AFFORDABLE_COURSES
+        assert all(r.status_code in (200, 400) for r in enrollments)
+        assert all(r.status_code == 200 for r in completions)
+        with SessionLocal() as db:
+            learner_inventory = db.query(UserInventory).filter(UserInventory.user_id == learner_id).one()
+            tutor_inventory = db.query(UserInventory).filter(UserInventory.user_id == tutor_id).one()
+            completed = db.query(LessonCompletion).filter(LessonCompletion.user_id == learner_id).count()
+            stats = db.get(UserStats, learner_id)
+        quest_xp = sum(q.xp for q in QUEST_REGISTRY.values() if q.period == "daily" and q.goal <= self.LESSONS)
+        quest_gems = sum(
+            q.gems for q in QUEST_REGISTRY.values()
+            if q.quest_type in ("lessons_today", "lessons_week", "lessons_month") and q.goal <= self.LESSONS
+        )
+        assert completed == self.LESSONS
+        assert stats.lessons_completed == self.LESSONS
+        assert learner_inventory.experience_points == 30 * self.LESSONS + quest_xp
+        # All affordable courses were paid for; what is left is the quest rewards
+        assert learner_inventory.gems == quest_gems
+        assert tutor_inventory.gems == int(self.COURSE_PRICE * 0.9) * self.AFFORDABLE_COURSES
+
+
+class TestConcurrentSnapshots:
+    """Overlapping publishes of one course through the real session factory."""
+
+    @pytest.fixture
+    def course_id(self):
+        tutor_id, course_id = str(uuid.uuid4()), str(uuid.uuid4())
+        with SessionLocal() as db:
+            db.add(User(user_id=tutor_id, full_name="Snapshot Tutor", email=f"{tutor_id}@example.com",
+                        password="x", role="tutor", gender="other"))
+            db.add(Course(id=course_id, name=f"Snapshot {course_id}", description="desc",
+                          created_by=tutor_id, status="published"))
+            db.commit()
+        yield course_id
+        with SessionLocal() as db:
+            db.delete(db.get(Course, course_id))
+            db.flush()
+            db.execute(delete(User).where(User.user_id == tutor_id))
+            db.commit()
+
+    def test_overlapping_publishes_take_distinct_versions(self, course_id):
+        with SessionLocal() as first, SessionLocal() as second:
+            # Both read the course before either publish commits
+            first_course, second_course = first.get(Course, course_id), second.get(Course, course_id)
+            publish_course_snapshot(first_course, first)
+
+            def publish_second():
+                # Waits on the course row until the first publish commits
+                publish_course_snapshot(second_course, second)
+                second.commit()
+
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                pending = pool.submit(publish_second)
+                time.sleep(0.2)
+                first.commit()
+                pending.result()
+
+        with SessionLocal() as db:
+            versions = db.execute(
+                select(CourseSnapshot.version).where(CourseSnapshot.course_id == course_id)
+            ).scalars().all()
+            assert sorted(versions) == [1, 2]
+            assert db.get(Course, course_id).snapshot_version == 2
+
+
+class TestLeaderboardSeats:
+    """Concurrent joins through the real session factory, on a rank no other test uses."""
+
+    LEARNERS = 40
+
+    @pytest.fixture
+    def learners(self):
+        rank = f"Test {uuid.uuid4().hex[:8]}"
+        user_ids = [str(uuid.uuid4()) for _ in range(self.LEARNERS)]
+        with SessionLocal() as db:
+            db.add_all(
+                User(user_id=user_id, full_name="Seat Test", email=f"{user_id}@example.com",
+                     password="x", role="learner", gender="other")
+                for user_id in user_ids
+            )
+            db.commit()
+        yield rank, user_ids
+        with SessionLocal() as db:
+            db.execute(delete(User).where(User.user_id.in_(user_ids)))
+            db.execute(delete(Leaderboard).where(Leaderboard.rank == rank))
+            db.commit()
+
+    def test_parallel_joins_never_overfill_a_cohort(self, learners):
+        rank, user_ids = learners
+
+        def join(user_id):
+            with SessionLocal() as db:
+                leaderboard_id, entry_id = claim_leaderboard_seat(user_id, rank, db)
+                if entry_id is None:
+                    db.add(LeaderboardEntry(
+                        id=str(uuid.uuid4()), leaderboard_id=leaderboard_id, user_id=user_id, xp_earned=0
+                    ))
+                db.commit()
+
+        # Every learner joins twice at the same time
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            list(pool.map(join, user_ids * 2))
+
+        with SessionLocal() as db:
+            cohorts = db.query(Leaderboard).filter(Leaderboard.rank == rank).all()
+            entries = db.query(LeaderboardEntry).filter(LeaderboardEntry.user_id.in_(user_ids)).count()
+            assert entries == self.LEARNERS
+            assert all(len(lb.entries) == lb.member_count <= LEADERBOARD_MAX_SIZE for lb in cohorts)
+            assert len(cohorts) == -(-self.LEARNERS // LEADERBOARD_MAX_SIZE)
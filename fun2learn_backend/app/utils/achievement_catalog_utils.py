@@ -0,0 +1,91 @@
+import bisect
+import threading
+from typing import NamedTuple, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import select
+from app.models.db_models import Achievement
+from app.utils.cache_utils import get_cache_version, bump_cache_version
+
+# The catalog only changes when achievements are seeded or edited. Those paths bump its version
+# in cache_versions, and every process reloads its copy when it sees a new one.
+ACHIEVEMENT_CATALOG_CACHE = "achievement_catalog"
+
+
+class CatalogAchievement(NamedTuple):
+    id: str
+    name: str
+    description: str
+    achievement_type: str
+    goal: int
+    image_url: Optional[str]
+
+
+class AchievementCatalog:
+    """
+    All achievements, grouped by type with goals in ascending order, so the thresholds
+    a learner's value has reached are found by bisection.
+    """
+
+    def __init__(self, achievements: list[CatalogAchievement]):
+        self.achievements = sorted(achievements, key=lambda a: (a.achievement_type, a.goal, a.name))
+        self._by_type: dict[str, list[CatalogAchievement]] = {}
+        self._goals: dict[str, list[int]] = {}
+        for achievement in self.achievements:
+            self._by_type.setdefault(achievement.achievement_type, []).append(achievement)
+            self._goals.setdefault(achievement.achievement_type, []).append(achievement.goal)
+
+    def reached(self, achievement_type: str, value: int) -> list[CatalogAchievement]:
+        """Achievements of the type with goal <= value, lowest goal first."""
+        goals = self._goals.get(achievement_type)
+        if not goals:
+            return []
+        return self._by_type[achievement_type][:bisect.bisect_right(goals, value)]
+
+
+_catalog: Optional[AchievementCatalog] = None
+_catalog_version = 0
+_catalog_lock = threading.Lock()
+
+
+def _load_catalog(db: Session, version: int) -> AchievementCatalog:
+    global _catalog, _catalog_version
+    rows = db.execute(
+        select(
+            Achievement.id, Achievement.name, Achievement.description,
+            Achievement.achievement_type, Achievement.goal, Achievement.image_url,
+        )
+    ).all()
+    catalog = AchievementCatalog([CatalogAchievement(*row) for row in rows])
+    with _catalog_lock:
+        _catalog = catalog
+        _catalog_version = version
+    return catalog
+
+
+def refresh_achievement_catalog(db: Session) -> AchievementCatalog:
+    """Reload this process's catalog from the achievements table."""
+    return _load_catalog(db, get_cache_version(ACHIEVEMENT_CATALOG_CACHE, db))
+
+
+def bump_achievement_catalog_version(db: Session) -> None:
+    """Make every process reload the catalog. Run in the transaction that changes achievements."""
+    bump_cache_version(ACHIEVEMENT_CATALOG_CACHE, db)
+
+
+def get_achievement_catalog(db: Session) -> AchievementCatalog:
+    """Return the process-wide catalog, loading it on first use and whenever its version changed."""
+    # Read before the achievements, so a change committed in between only causes another reload
+    version = get_cache_version(ACHIEVEMENT_CATALOG_CACHE, db)
+    with _catalog_lock:
+        catalog = _catalog
+        fresh = catalog is not None and _catalog_version == version
+    if fresh:
+        return catalog
+    return _load_catalog(db, version)
+
+
+def invalidate_achievement_catalog() -> None:
+    """Drop the loaded catalog; the next reader reloads it."""
+    global _catalog
+    with _catalog_lock:
+        _catalog = None
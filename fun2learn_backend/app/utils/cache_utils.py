@@ -0,0 +1,103 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from app.models.db_models import CacheVersion
+
+CATALOG_CACHE_TTL_SECONDS = float(os.getenv("CATALOG_CACHE_TTL_SECONDS", "60"))
+CATALOG_CACHE_MAX_ENTRIES = int(os.getenv("CATALOG_CACHE_MAX_ENTRIES", "512"))
+SNAPSHOT_CACHE_TTL_SECONDS = float(os.getenv("SNAPSHOT_CACHE_TTL_SECONDS", "3600"))
+SNAPSHOT_CACHE_MAX_ENTRIES = int(os.getenv("SNAPSHOT_CACHE_MAX_ENTRIES", "256"))
+
+
+class TTLCache:
+    """
+    Small thread-safe in-process cache with per-entry expiry and LRU eviction.
+    The TTL is a safety net: entries are normally invalidated explicitly, but other
+    worker processes only see a change once their own copy expires.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# ─── Shared versions ──────────────────────────────────────────────────────────
+
+def get_cache_version(name: str, db: Session) -> int:
+    """The version of a cached data set in the cache_versions table, 0 until first bumped."""
+    version = db.execute(select(CacheVersion.version).where(CacheVersion.name == name)).scalar_one_or_none()
+    return version or 0
+
+
+def bump_cache_version(name: str, db: Session) -> None:
+    """
+    Mark every process's copy of a cached data set stale. Run it in the transaction that
+    changes the data, so the new version is visible exactly when the change is.
+    """
+    stmt = pg_insert(CacheVersion).values(name=name, version=1)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[CacheVersion.name], set_={"version": CacheVersion.version + 1}
+    ))
+
+
+# ─── Course snapshots ─────────────────────────────────────────────────────────
+
+# Keyed by (course_id, version). Snapshots never change, so entries need no invalidation.
+snapshot_cache = TTLCache(SNAPSHOT_CACHE_TTL_SECONDS, SNAPSHOT_CACHE_MAX_ENTRIES)
+
+
+# ─── Public course catalog ────────────────────────────────────────────────────
+
+# Browse pages and public course details, keyed by the catalog version in cache_versions.
+# Enrollments deliberately do not bump it: they are the most frequent change by far, and bumping
+# would both empty the cache and serialize every enrollment on the version row. Enrollment counts,
+# and so the "popular" order, can lag by up to CATALOG_CACHE_TTL_SECONDS.
+catalog_cache = TTLCache(CATALOG_CACHE_TTL_SECONDS, CATALOG_CACHE_MAX_ENTRIES)
+COURSE_CATALOG_CACHE = "course_catalog"
+
+
+def get_catalog_version(db: Session) -> int:
+    return get_cache_version(COURSE_CATALOG_CACHE, db)
+
+
+def bump_catalog_version(db: Session) -> None:
+    """
+    Invalidate every process's cached catalog responses. Call in the transaction of a change
+    that is visible in the catalog (publish, edits, pricing, tags, badges, reviews).
+    Readers put the version they read before the catalog into their cache key, so a response
+    built from pre-commit data can never be served under the new version.
+    """
+    bump_cache_version(COURSE_CATALOG_CACHE, db)
+    catalog_cache.clear()
@@ -0,0 +1,190 @@
+import json
+import uuid
+from typing import Iterator
+from sqlalchemy.orm import Session
+from sqlalchemy import select, insert
+from app.models.db_models import Course, CourseStats, Unit, Chapter, Lesson, Question, MCQOption, TextAnswer, Tag, CourseTag
+from app.models.request_models import ImportCourseRequest
+from app.utils.course_tree_utils import load_course_tree
+
+# A course document is a whole course tree (units → chapters → lessons → questions, plus tags)
+# in the ImportCourseRequest format. Exports are written in the same format so they can be re-imported.
+
+
+def _find_duplicate(names: list[str]) -> str | None:
+    seen = set()
+    for name in names:
+        key = name.strip().lower()
+        if key in seen:
+            return name
+        seen.add(key)
+    return None
+
+
+def validate_course_document(document: ImportCourseRequest, db: Session) -> None:
+    """
+    Apply the same rules as the one-at-a-time authoring endpoints to a whole document.
+    Raises ValueError with a user-facing message for the first problem found.
+    """
+    duplicate = _find_duplicate([unit.name for unit in document.units])
+    if duplicate:
+        raise ValueError(f"Unit '{duplicate}' appears more than once")
+
+    for unit in document.units:
+        duplicate = _find_duplicate([chapter.name for chapter in unit.chapters])
+        if duplicate:
+            raise ValueError(f"Chapter '{duplicate}' appears more than once in unit '{unit.name}'")
+        for chapter in unit.chapters:
+            duplicate = _find_duplicate([lesson.name for lesson in chapter.lessons])
+            if duplicate:
+                raise ValueError(f"Lesson '{duplicate}' appears more than once in chapter '{chapter.name}'")
+            for lesson in chapter.lessons:
+                for question in lesson.questions:
+                    if question.question_type == "mcq" and not any(opt.is_correct for opt in question.options):
+                        raise ValueError(f"A question in lesson '{lesson.name}' has no correct option")
+                    if question.question_type == "text" and not question.correct_answer:
+                        raise ValueError(f"A text question in lesson '{lesson.name}' has no correct answer")
+
+    tag_ids = set(document.tag_ids)
+    if tag_ids:
+        found = set(db.execute(select(Tag.id).where(Tag.id.in_(tag_ids))).scalars().all())
+        missing = sorted(tag_ids - found)
+        if missing:
+            raise ValueError(f"Tag with id '{missing[0]}' not found")
+
+
+def insert_course_document(document: ImportCourseRequest, created_by: str, db: Session) -> str:
+    """
+    Create a draft course from a validated document and return its id.
+    Rows are written with one batched INSERT per table, whatever the size of the document.
+    The caller refreshes the derived structure (lesson sequence, counters) and commits.
+    """
+    course_id = str(uuid.uuid4())
+    unit_rows, chapter_rows, lesson_rows = [], [], []
+    question_rows, option_rows, answer_rows = [], [], []
+
+    for unit_index, unit in enumerate(document.units, start=1):
+        unit_id = str(uuid.uuid4())
+        unit_rows.append({
+            "id": unit_id, "name": unit.name, "description": unit.description,
+            "unit_index": unit_index, "course_id": course_id,
+        })
+        for chapter_index, chapter in enumerate(unit.chapters, start=1):
+            chapter_id = str(uuid.uuid4())
+            chapter_rows.append({
+                "id": chapter_id, "name": chapter.name, "chapter_index": chapter_index, "unit_id": unit_id,
+            })
+            for lesson_index, lesson in enumerate(chapter.lessons, start=1):
+                lesson_id = str(uuid.uuid4())
+                lesson_rows.append({
+                    "id": lesson_id, "name": lesson.name, "lesson_index": lesson_index, "chapter_id": chapter_id,
+                })
+                # Rows of one import share created_at, so questions and options keep explicit positions
+                for question_index, question in enumerate(lesson.questions, start=1):
+                    question_id = str(uuid.uuid4())
+                    question_rows.append({
+                        "id": question_id, "question_text": question.question_text,
+                        "question_type": question.question_type, "question_index": question_index,
+                        "lesson_id": lesson_id,
+                    })
+                    if question.question_type == "mcq":
+                        option_rows.extend(
+                            {
+                                "id": str(uuid.uuid4()), "option_text": option.option_text,
+                                "is_correct": option.is_correct, "option_index": option_index,
+                                "question_id": question_id,
+                            }
+                            for option_index, option in enumerate(question.options, start=1)
+                        )
+                    else:
+                        answer_rows.append({
+                            "id": str(uuid.uuid4()), "correct_answer": question.correct_answer,
+                            "casing_matters": question.casing_matters, "question_id": question_id,
+                        })
+
+    tag_rows = [
+        {"id": str(uuid.uuid4()), "course_id": course_id, "tag_id": tag_id}
+        for tag_id in dict.fromkeys(document.tag_ids)
+    ]
+
+    db.execute(insert(Course), [{
+        "id": course_id, "name": document.name.strip(), "description": document.description,
+        "created_by": created_by, "status": "draft",
+    }])
+    db.execute(insert(CourseStats), [{"course_id": course_id}])
+    # Parents before children; each list goes out as multi-row INSERTs
+    for model, rows in (
+        (Unit, unit_rows), (Chapter, chapter_rows), (Lesson, lesson_rows),
+        (Question, question_rows), (MCQOption, option_rows), (TextAnswer, answer_rows),
+        (CourseTag, tag_rows),
+    ):
+        if rows:
+            db.execute(insert(model), rows)
+
+    return course_id
+
+
+def export_course_document(course: Course, db: Session) -> Iterator[str]:
+    """
+    Serialize a course as a document and return it as an iterator of JSON text chunks, one per lesson.
+    Everything is loaded up front in a fixed number of queries, so the iterator does not touch the session.
+    """
+    tree = load_course_tree(course.id, db)
+
+    question_rows = db.execute(
+        select(Question.id, Question.lesson_id, Question.question_text, Question.question_type)
+        .join(Lesson, Question.lesson_id == Lesson.id)
+        .join(Chapter, Lesson.chapter_id == Chapter.id)
+        .join(Unit, Chapter.unit_id == Unit.id)
+        .where(Unit.course_id == course.id)
+        .order_by(Question.question_index.nulls_last(), Question.created_at, Question.id)
+    ).all()
+    question_ids = [row.id for row in question_rows]
+
+    options_by_question: dict[str, list[dict]] = {}
+    answer_by_question: dict[str, dict] = {}
+    if question_ids:
+        for row in db.execute(
+            select(MCQOption.question_id, MCQOption.option_text, MCQOption.is_correct)
+            .where(MCQOption.question_id.in_(question_ids))
+            .order_by(MCQOption.question_id, MCQOption.option_index.nulls_last(), MCQOption.id)
+        ).all():
+            options_by_question.setdefault(row.question_id, []).append(
+                {"option_text": row.option_text, "is_correct": row.is_correct}
+            )
+        for row in db.execute(
+            select(TextAnswer.question_id, TextAnswer.correct_answer, TextAnswer.casing_matters)
+            .where(TextAnswer.question_id.in_(question_ids))
+        ).all():
+            answer_by_question.setdefault(
+                row.question_id, {"correct_answer": row.correct_answer, "casing_matters": row.casing_matters}
+            )
+
+    questions_by_lesson: dict[str, list[dict]] = {}
+    for row in question_rows:
+        question = {"question_text": row.question_text, "question_type": row.question_type}
+        if row.question_type == "mcq":
+            question["options"] = options_by_question.get(row.id, [])
+        else:
+            question.update(answer_by_question.get(row.id, {"correct_answer": None, "casing_matters": False}))
+        questions_by_lesson.setdefault(row.lesson_id, []).append(question)
+
+    tag_ids = db.execute(select(CourseTag.tag_id).where(CourseTag.course_id == course.id)).scalars().all()
+    header = {"name": course.name, "description": course.description, "tag_ids": list(tag_ids)}
+
+    def generate() -> Iterator[str]:
+        yield json.dumps(header)[:-1] + ', "units": ['
+        for unit_position, unit in enumerate(tree.units):
+            unit_head = json.dumps({"name": unit.name, "description": unit.description})[:-1]
+            yield ("," if unit_position else "") + unit_head + ', "chapters": ['
+            for chapter_position, chapter in enumerate(unit.chapters):
+                chapter_head = json.dumps({"name": chapter.name})[:-1]
+                yield ("," if chapter_position else "") + chapter_head + ', "lessons": ['
+                for lesson_position, lesson in enumerate(chapter.lessons):
+                    lesson_doc = {"name": lesson.name, "questions": questions_by_lesson.get(lesson.id, [])}
+                    yield ("," if lesson_position else "") + json.dumps(lesson_doc)
+                yield "]}"
+            yield "]}"
+        yield "]}"
+
+    return generate()
@@ -0,0 +1,113 @@
+from typing import Optional
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy import select, update, delete, func
+from app.models.db_models import Course, CourseSnapshot, Badge, Tag, CourseTag
+from app.utils.course_tree_utils import CourseTree, load_course_tree
+from app.utils.cache_utils import snapshot_cache
+
+# Older versions are kept briefly so in-flight readers of the previous version still resolve
+SNAPSHOT_VERSIONS_KEPT = 3
+
+
+def build_course_snapshot(course: Course, tree: CourseTree, db: Session) -> dict:
+    """Render the learner-facing content of a course as a JSON-serializable dict."""
+    badge = db.execute(select(Badge).where(Badge.course_id == course.id)).scalar_one_or_none()
+    tags = db.execute(
+        select(Tag.id, Tag.name)
+        .join(CourseTag, CourseTag.tag_id == Tag.id)
+        .where(CourseTag.course_id == course.id)
+        .order_by(Tag.name)
+    ).all()
+
+    return {
+        "id": course.id,
+        "name": course.name,
+        "description": course.description,
+        "tutor_id": course.created_by,
+        "tutor_name": course.user.full_name,
+        "unit_count": tree.unit_count,
+        "chapter_count": tree.chapter_count,
+        "lesson_count": tree.lesson_count,
+        "question_count": tree.question_count,
+        # Lessons appear in sequence position order, so completed-lesson bitmaps of this
+        # sequence version can be read against the snapshot directly
+        "sequence_version": course.sequence_version,
+        "badge": {
+            "id": badge.id, "name": badge.name, "badge_type": badge.badge_type,
+            "icon_name": badge.icon_name, "image_url": badge.image_url, "course_id": badge.course_id,
+        } if badge else None,
+        "tags": [{"id": tag.id, "name": tag.name} for tag in tags],
+        "units": [
+            {
+                "id": unit.id, "name": unit.name, "description": unit.description, "unit_index": unit.unit_index,
+                "chapters": [
+                    {
+                        "id": chapter.id, "name": chapter.name, "chapter_index": chapter.chapter_index,
+                        "lessons": [
+                            {
+                                "id": lesson.id, "name": lesson.name, "lesson_index": lesson.lesson_index,
+                                "question_count": lesson.question_count,
+                            }
+                            for lesson in chapter.lessons
+                        ],
+                    }
+                    for chapter in unit.chapters
+                ],
+            }
+            for unit in tree.units
+        ],
+    }
+
+
+def publish_course_snapshot(course: Course, db: Session, tree: Optional[CourseTree] = None) -> dict:
+    """
+    Write a new snapshot version for the course and make it the live one.
+    Pass the tree if the caller already loaded it. Call after flushing the content change.
+    """
+    loaded_version = course.snapshot_version
+    # Taking the version in SQL locks the course row, so concurrent publishes get distinct versions
+    version = db.execute(
+        update(Course)
+        .where(Course.id == course.id)
+        .values(snapshot_version=func.coalesce(Course.snapshot_version, 0) + 1)
+        .returning(Course.snapshot_version)
+        .execution_options(synchronize_session=False)
+    ).scalar_one()
+    set_committed_value(course, "snapshot_version", version)
+    # Another transaction published since the course was read: its changes may be missing from the tree
+    if tree is None or version != (loaded_version or 0) + 1:
+        tree = load_course_tree(course.id, db)
+
+    payload = build_course_snapshot(course, tree, db)
+    db.add(CourseSnapshot(course_id=course.id, version=version, payload=payload))
+
+    db.execute(
+        delete(CourseSnapshot)
+        .where(CourseSnapshot.course_id == course.id, CourseSnapshot.version <= version - SNAPSHOT_VERSIONS_KEPT)
+        .execution_options(synchronize_session=False)
+    )
+    return payload
+
+
+def get_course_snapshot(course: Course, db: Session) -> tuple[dict, bool]:
+    """
+    Return (payload, created) for the live snapshot of a published course.
+    Courses published before snapshots existed get one on first read, in which case
+    created is True and the caller must commit.
+    """
+    if course.snapshot_version is None:
+        return publish_course_snapshot(course, db), True
+
+    key = (course.id, course.snapshot_version)
+    payload = snapshot_cache.get(key)
+    if payload is None:
+        payload = db.execute(
+            select(CourseSnapshot.payload)
+            .where(CourseSnapshot.course_id == course.id, CourseSnapshot.version == course.snapshot_version)
+        ).scalar_one_or_none()
+        if payload is None:
+            return publish_course_snapshot(course, db), True
+        # Only committed snapshots are cached, a version written by a rolled back transaction could be reused
+        snapshot_cache.set(key, payload)
+    return payload, False
@@ -0,0 +1,123 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select, update, func, cast, Float
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.models.db_models import Course, CourseStats, Enrollment, Feedback
+from app.utils.course_tree_utils import CourseTree, load_course_trees
+
+CONTENT_COUNTERS = ("unit_count", "chapter_count", "lesson_count", "question_count")
+RATING_COUNTERS = ("rating_sum", "review_count")
+
+
+def _content_counts(tree: CourseTree) -> dict[str, int]:
+    return {
+        "unit_count": tree.unit_count,
+        "chapter_count": tree.chapter_count,
+        "lesson_count": tree.lesson_count,
+        "question_count": tree.question_count,
+    }
+
+
+def refresh_course_stats(course_ids: list[str], db: Session) -> None:
+    """
+    Recompute the stats rows of the given courses from the underlying tables.
+    Used to backfill courses created before course_stats existed.
+    """
+    if not course_ids:
+        return
+
+    trees = load_course_trees(course_ids, db)
+    enrollment_counts = dict(db.execute(
+        select(Enrollment.course_id, func.count())
+        .where(Enrollment.course_id.in_(course_ids))
+        .group_by(Enrollment.course_id)
+    ).all())
+
+    rating_rows = {row.course_id: row for row in db.execute(
+        select(
+            Feedback.course_id,
+            func.sum(Feedback.rating).label("rating_sum"),
+            func.count(Feedback.id).label("review_count")
+        )
+        .where(Feedback.course_id.in_(course_ids))
+        .group_by(Feedback.course_id)
+    ).all()}
+
+    rows = []
+    for cid in course_ids:
+        ratings = rating_rows.get(cid)
+        rating_sum = int(ratings.rating_sum) if ratings else 0
+        review_count = ratings.review_count if ratings else 0
+        rows.append({
+            "course_id": cid,
+            **_content_counts(trees[cid]),
+            "enrollment_count": enrollment_counts.get(cid, 0),
+            "rating_sum": rating_sum,
+            "review_count": review_count,
+            "avg_rating": rating_sum / review_count if review_count else 0,
+        })
+    stmt = pg_insert(CourseStats).values(rows)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[CourseStats.course_id],
+        set_={col: stmt.excluded[col] for col in (*CONTENT_COUNTERS, *RATING_COUNTERS, "enrollment_count", "avg_rating")},
+    ))
+
+
+def backfill_course_stats(db: Session) -> None:
+    """Create stats rows for every course that does not have one yet."""
+    missing = db.execute(
+        select(Course.id).outerjoin(CourseStats, CourseStats.course_id == Course.id)
+        .where(CourseStats.course_id.is_(None))
+    ).scalars().all()
+    refresh_course_stats(list(missing), db)
+
+
+def set_course_content_counts(tree: CourseTree, db: Session) -> None:
+    """Store the unit/chapter/lesson/question counts of an already loaded course tree."""
+    result = db.execute(
+        update(CourseStats)
+        .where(CourseStats.course_id == tree.course_id)
+        .values(**_content_counts(tree))
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        refresh_course_stats([tree.course_id], db)
+
+
+def adjust_course_stats(course_id: str, db: Session, **deltas: int) -> None:
+    """
+    Atomically add deltas to counters, e.g. adjust_course_stats(cid, db, enrollment_count=1).
+    The change being counted must already be flushed: if the course has no stats row yet,
+    it is computed from scratch instead.
+    """
+    values = {getattr(CourseStats, col): getattr(CourseStats, col) + delta for col, delta in deltas.items()}
+    if any(col in deltas for col in RATING_COUNTERS):
+        # SET expressions see the pre-update row, so apply the deltas here as well
+        new_sum = CourseStats.rating_sum + deltas.get("rating_sum", 0)
+        new_count = CourseStats.review_count + deltas.get("review_count", 0)
+        values[CourseStats.avg_rating] = func.coalesce(cast(new_sum, Float) / func.nullif(new_count, 0), 0)
+
+    result = db.execute(
+        update(CourseStats)
+        .where(CourseStats.course_id == course_id)
+        .values(values)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        refresh_course_stats([course_id], db)
+
+
+def get_course_stats(course_ids: list[str], db: Session) -> dict[str, CourseStats]:
+    """Return stats rows keyed by course id, backfilling any course that has none yet."""
+    if not course_ids:
+        return {}
+
+    stmt = select(CourseStats).where(CourseStats.course_id.in_(course_ids))
+    stats = {row.course_id: row for row in db.execute(stmt).scalars().all()}
+
+    missing = [cid for cid in course_ids if cid not in stats]
+    if missing:
+        refresh_course_stats(missing, db)
+        stmt = select(CourseStats).where(CourseStats.course_id.in_(missing))
+        stats.update({row.course_id: row for row in db.execute(stmt).scalars().all()})
+
+    return stats
@@ -0,0 +1,140 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Iterator, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import select, func
+from app.models.db_models import Unit, Chapter, Lesson, Question
+
+
+@dataclass
+class LessonNode:
+    id: str
+    name: str
+    lesson_index: int
+    created_at: datetime
+    question_count: int
+
+
+@dataclass
+class ChapterNode:
+    id: str
+    name: str
+    chapter_index: int
+    created_at: datetime
+    lessons: list[LessonNode] = field(default_factory=list)
+
+
+@dataclass
+class UnitNode:
+    id: str
+    name: str
+    description: Optional[str]
+    unit_index: int
+    created_at: datetime
+    chapters: list[ChapterNode] = field(default_factory=list)
+
+
+@dataclass
+class CourseTree:
+    """Ordered units → chapters → lessons of one course, with per-lesson question counts."""
+    course_id: str
+    units: list[UnitNode] = field(default_factory=list)
+
+    @property
+    def unit_count(self) -> int:
+        return len(self.units)
+
+    @property
+    def chapter_count(self) -> int:
+        return sum(len(u.chapters) for u in self.units)
+
+    @property
+    def lesson_count(self) -> int:
+        return sum(len(c.lessons) for u in self.units for c in u.chapters)
+
+    @property
+    def question_count(self) -> int:
+        return sum(l.question_count for _, _, l in self.iter_lessons())
+
+    def iter_lessons(self) -> Iterator[tuple[UnitNode, ChapterNode, LessonNode]]:
+        """Yield (unit, chapter, lesson) for every lesson in course order."""
+        for unit in self.units:
+            for chapter in unit.chapters:
+                for lesson in chapter.lessons:
+                    yield unit, chapter, lesson
+
+    def first_lesson(self) -> tuple[Optional[UnitNode], Optional[ChapterNode], Optional[LessonNode]]:
+        """Get the first unit, chapter, and lesson of the course (by index order)."""
+        return next(self.iter_lessons(), (None, None, None))
+
+
+def load_course_trees(course_ids: list[str], db: Session) -> dict[str, CourseTree]:
+    """
+    Load the ordered content tree for several courses at once.
+    Runs at most three queries (units, chapters, lessons with question counts), regardless of
+    how many courses or how much content is involved; fewer when there are no units or chapters.
+    Every requested course id is present in the result, even if it has no units.
+    """
+    trees = {course_id: CourseTree(course_id=course_id) for course_id in course_ids}
+    if not trees:
+        return trees
+
+    unit_rows = db.execute(
+        select(Unit.id, Unit.course_id, Unit.name, Unit.description, Unit.unit_index, Unit.created_at)
+        .where(Unit.course_id.in_(trees.keys()))
+        .order_by(Unit.course_id, Unit.unit_index)
+    ).all()
+    units_by_id: dict[str, UnitNode] = {}
+    for row in unit_rows:
+        unit = UnitNode(
+            id=row.id, name=row.name, description=row.description,
+            unit_index=row.unit_index, created_at=row.created_at
+        )
+        units_by_id[row.id] = unit
+        trees[row.course_id].units.append(unit)
+
+    if not units_by_id:
+        return trees
+
+    chapter_rows = db.execute(
+        select(Chapter.id, Chapter.unit_id, Chapter.name, Chapter.chapter_index, Chapter.created_at)
+        .join(Unit, Chapter.unit_id == Unit.id)
+        .where(Unit.course_id.in_(trees.keys()))
+        .order_by(Chapter.unit_id, Chapter.chapter_index)
+    ).all()
+    chapters_by_id: dict[str, ChapterNode] = {}
+    for row in chapter_rows:
+        chapter = ChapterNode(
+            id=row.id, name=row.name,
+            chapter_index=row.chapter_index, created_at=row.created_at
+        )
+        chapters_by_id[row.id] = chapter
+        units_by_id[row.unit_id].chapters.append(chapter)
+
+    if not chapters_by_id:
+        return trees
+
+    lesson_rows = db.execute(
+        select(
+            Lesson.id, Lesson.chapter_id, Lesson.name, Lesson.lesson_index, Lesson.created_at,
+            func.count(Question.id).label("question_count")
+        )
+        .join(Chapter, Lesson.chapter_id == Chapter.id)
+        .join(Unit, Chapter.unit_id == Unit.id)
+        .outerjoin(Question, Question.lesson_id == Lesson.id)
+        .where(Unit.course_id.in_(trees.keys()))
+        .group_by(Lesson.id)
+        .order_by(Lesson.chapter_id, Lesson.lesson_index)
+    ).all()
+    for row in lesson_rows:
+        chapters_by_id[row.chapter_id].lessons.append(LessonNode(
+            id=row.id, name=row.name, lesson_index=row.lesson_index,
+            created_at=row.created_at, question_count=row.question_count
+        ))
+
+    return trees
+
+
+def load_course_tree(course_id: str, db: Session) -> CourseTree:
+    """Load the ordered content tree for a single course."""
+    return load_course_trees([course_id], db)[course_id]
@@ -0,0 +1,95 @@
+from datetime import date, timedelta
+from typing import Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import select, func, exists
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.models.db_models import UserDailyActivity, LessonCompletion
+
+ACTIVITY_COUNTERS = ("lessons", "xp", "gems")
+# Longest range the activity endpoints serve in one call
+MAX_ACTIVITY_DAYS = 366
+XP_HISTORY_GRANULARITIES = ("day", "week", "month")
+
+
+def daily_activity_upsert(user_id: str, day: date, **deltas: int):
+    """
+    Build an upsert adding deltas to the user's row for the day, e.g.
+    daily_activity_upsert(uid, today, lessons=1), for use with execute_writes.
+    """
+    stmt = pg_insert(UserDailyActivity).values(
+        user_id=user_id, date=day, **{col: deltas.get(col, 0) for col in ACTIVITY_COUNTERS}
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[UserDailyActivity.user_id, UserDailyActivity.date],
+        set_={col: getattr(UserDailyActivity, col) + stmt.excluded[col] for col in deltas},
+    )
+
+
+def backfill_daily_activity(db: Session) -> None:
+    """
+    Build lesson counts from the completion history the first time the table is used.
+    XP and gems were never recorded per day, so older days only have lessons.
+    """
+    if db.execute(select(exists().select_from(UserDailyActivity))).scalar_one():
+        return
+    day = func.date(LessonCompletion.completed_at)
+    history = (
+        select(LessonCompletion.user_id, day, func.count())
+        .group_by(LessonCompletion.user_id, day)
+    )
+    db.execute(
+        pg_insert(UserDailyActivity)
+        .from_select(["user_id", "date", "lessons"], history)
+        .on_conflict_do_nothing()
+    )
+
+
+def parse_activity_range(start_date: Optional[date], end_date: Optional[date]) -> tuple[date, date]:
+    """
+    Resolve an inclusive date range for the activity endpoints. Defaults to the year up to today.
+    Raises ValueError for an empty range or one longer than MAX_ACTIVITY_DAYS.
+    """
+    end_date = end_date or date.today()
+    start_date = start_date or end_date - timedelta(days=364)
+    if start_date > end_date:
+        raise ValueError("start_date must not be after end_date")
+    if (end_date - start_date).days + 1 > MAX_ACTIVITY_DAYS:
+        raise ValueError(f"Date range cannot be longer than {MAX_ACTIVITY_DAYS} days")
+    return start_date, end_date
+
+
+def get_daily_activity(user_id: str, start_date: date, end_date: date, db: Session) -> list[UserDailyActivity]:
+    """The user's activity rows between two dates (inclusive), oldest first."""
+    return db.execute(
+        select(UserDailyActivity)
+        .where(
+            UserDailyActivity.user_id == user_id,
+            UserDailyActivity.date >= start_date,
+            UserDailyActivity.date <= end_date,
+        )
+        .order_by(UserDailyActivity.date)
+    ).scalars().all()
+
+
+def period_start(day: date, granularity: str) -> date:
+    """First day of the day/week (Monday)/month containing the given day."""
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def iter_periods(start_date: date, end_date: date, granularity: str) -> list[date]:
+    """Start dates of every period overlapping the range, so charts get a point for empty periods too."""
+    periods = []
+    current = period_start(start_date, granularity)
+    while current <= end_date:
+        periods.append(current)
+        if granularity == "week":
+            current += timedelta(days=7)
+        elif granularity == "month":
+            current = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
+        else:
+            current += timedelta(days=1)
+    return periods
@@ -1,9 +1,14 @@
 from app.connection.postgres_connection import SessionLocal
-from typing import Generator
-from sqlalchemy import inspect
+from typing import Generator, Sequence
+from sqlalchemy import inspect, text, Executable
 from app.connection.postgres_connection import engine, Base
 import app.models.db_models
-from sqlalchemy.orm import configure_mappers
+from sqlalchemy.orm import configure_mappers, Session
+from app.utils.course_stats_utils import backfill_course_stats
+from app.utils.user_stats_utils import backfill_user_stats
+from app.utils.daily_activity_utils import backfill_daily_activity
+from app.utils.leaderboard_utils import backfill_leaderboard_member_counts
+from app.utils.weekly_xp_utils import backfill_weekly_xp
 import logging
 
 logger = logging.getLogger(__name__)
@@ -19,6 +24,18 @@ def get_db() -> Generator:
     finally:
         db.close()
 
+def execute_writes(statements: Sequence[Executable], db: Session):
+    """
+    Execute several INSERT/UPDATE/DELETE statements in a single round trip by attaching all
+    but the last one to it as data-modifying CTEs. Returns the result of the last statement.
+    All parts run against the same snapshot, so they must not depend on each other's effects
+    or touch the same rows.
+    """
+    *leading, last = statements
+    for position, statement in enumerate(leading):
+        last = last.add_cte(statement.cte(f"write_{position}"))
+    return db.execute(last)
+
 def ensure_create_all():
     configure_mappers()
 
@@ -29,6 +46,33 @@ def ensure_create_all():
 
     Base.metadata.create_all(bind=engine)
 
+    # create_all skips tables that already exist, so add columns and indexes introduced since
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing_columns = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                default = ""
+                if column.server_default is not None:
+                    arg = column.server_default.arg
+                    default = f" DEFAULT '{arg}'" if isinstance(arg, str) else f" DEFAULT {arg}"
+                not_null = " NOT NULL" if not column.nullable and default else ""
+                logger.info(f"Adding column {table.name}.{column.name}")
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN IF NOT EXISTS "{column.name}" {column_type}{default}{not_null}'))
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+
+    with SessionLocal() as db:
+        backfill_course_stats(db)
+        backfill_user_stats(db)
+        backfill_daily_activity(db)
+        backfill_leaderboard_member_counts(db)
+        backfill_weekly_xp(db)
+        db.commit()
+
     inspector = inspect(engine)
     logger.info(f"DB TABLES AFTER = {inspector.get_table_names()}")
 
@@ -0,0 +1,381 @@
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import select, update, func, true
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.models.db_models import (
+    User, UserInventory, UserStats, StreakEntry, UserAchievement, Leaderboard, LeaderboardEntry
+)
+from app.models.response_models import NewlyUnlockedAchievement
+from app.utils.leaderboard_utils import RANKS, get_current_week_bounds, get_week_bounds, claim_leaderboard_seat
+from app.utils.db_utils import execute_writes
+from app.utils.achievement_catalog_utils import get_achievement_catalog
+from app.utils.user_stats_utils import get_user_stats, user_stats_update
+from app.utils.daily_activity_utils import daily_activity_upsert
+from app.utils.weekly_xp_utils import weekly_xp_upsert
+from app.utils.quest_utils import QUEST_COUNTERS, quest_counters_subquery, plan_quests, quest_progress_upsert
+from app.utils.leaderboard_membership_utils import get_leaderboard_membership, remember_leaderboard_membership
+from app.utils.leaderboard_ranking_utils import record_leaderboard_xp, ranking_version_bump
+
+# XP for each newly completed lesson
+LESSON_XP = 30
+
+# Streaks, daily quests, achievements and leaderboard XP. These are side effects of learner
+# activity and are applied by the outbox worker (see outbox_utils), not in the request.
+
+
+def advance_streak(
+    last_streak_recorded: Optional[date], daily_streak: int, longest_streak: int, today: date
+) -> Optional[tuple[int, int]]:
+    """
+    Work out the streak after activity on the given day. Returns (daily_streak, longest_streak),
+    or None if that day was already counted.
+    Logic:
+    - If last_streak_recorded is today: already counted, no update
+    - If last_streak_recorded is yesterday: increment streak
+    - Otherwise: reset streak to 1
+    The caller records the new values and a StreakEntry for calendar tracking.
+    """
+    if last_streak_recorded == today:
+        return None
+
+    if last_streak_recorded == today - timedelta(days=1):
+        daily_streak += 1
+    else:
+        daily_streak = 1
+
+    return daily_streak, max(longest_streak, daily_streak)
+
+
+def achieved_ids_subquery(user_id: str):
+    """Scalar subquery: array of the achievement ids the user has unlocked, NULL if none."""
+    return (
+        select(func.array_agg(UserAchievement.achievement_id))
+        .where(UserAchievement.user_id == user_id, UserAchievement.achieved == True)
+        .scalar_subquery()
+    )
+
+
+def plan_achievement_unlocks(
+    user_id: str, values_by_type: dict[str, int], achieved_ids: Optional[list[str]], db: Session
+) -> tuple[list[dict], list[NewlyUnlockedAchievement]]:
+    """
+    Work out which achievements the learner's current values unlock, using the in-memory catalog.
+    Only goals the value has reached and that are not in achieved_ids produce a row, so nothing
+    is written for achievements whose state does not change.
+    Progress towards locked achievements is not stored: it is read from the live values (see get_achievement_values).
+    Returns (rows for achievement_upsert, newly unlocked achievements).
+    """
+    catalog = get_achievement_catalog(db)
+    already_achieved = set(achieved_ids or ())
+    now = datetime.now(timezone.utc)
+    rows = []
+    newly_unlocked = []
+
+    for achievement_type, current_value in values_by_type.items():
+        for ach in catalog.reached(achievement_type, current_value):
+            if ach.id in already_achieved:
+                continue
+            rows.append({
+                "id": str(uuid.uuid4()),
+                "user_id": user_id,
+                "achievement_id": ach.id,
+                "progress": current_value,
+                "achieved": True,
+                "achieved_at": now,
+            })
+            newly_unlocked.append(NewlyUnlockedAchievement(
+                name=ach.name,
+                description=ach.description,
+                achievement_type=ach.achievement_type
+            ))
+
+    return rows, newly_unlocked
+
+
+def achievement_upsert(rows: list[dict]):
+    stmt = pg_insert(UserAchievement).values(rows)
+    return stmt.on_conflict_do_update(
+        constraint="uq_user_achievement",
+        set_={
+            "progress": stmt.excluded.progress,
+            "achieved": UserAchievement.achieved | stmt.excluded.achieved,
+            "achieved_at": func.coalesce(UserAchievement.achieved_at, stmt.excluded.achieved_at),
+        },
+    )
+
+
+def update_achievement_progress(
+    user_id: str, achievement_type: str, current_value: int, achieved_ids: Optional[list[str]], db: Session
+) -> list[NewlyUnlockedAchievement]:
+    """
+    Record the achievements of a given type unlocked by the current value.
+    Returns a list of newly unlocked achievements (those that just crossed their goal).
+    """
+    rows, newly_unlocked = plan_achievement_unlocks(user_id, {achievement_type: current_value}, achieved_ids, db)
+    if rows:
+        execute_writes([achievement_upsert(rows), user_stats_update(user_id, achievements_unlocked=len(rows))], db)
+    return newly_unlocked
+
+
+def get_achievement_values(user_id: str, db: Session) -> dict[str, int]:
+    """The learner's current value for every achievement type, read from the activity counters."""
+    stats = get_user_stats([user_id], db)[user_id]
+    longest_streak = db.execute(
+        select(UserInventory.longest_streak).where(UserInventory.user_id == user_id)
+    ).scalar_one_or_none()
+    return {
+        "lessons_completed": stats.lessons_completed,
+        "streak_days": longest_streak or 0,
+        "courses_completed": stats.courses_completed,
+        "courses_enrolled": stats.courses_enrolled,
+    }
+
+
+def _event_week_start(payload: dict, activity_dates: list[date]) -> datetime:
+    if "week_start" in payload:
+        return datetime.fromisoformat(payload["week_start"])
+    # Queued before the week was recorded: the week of the latest activity
+    return get_week_bounds(datetime.combine(max(activity_dates), datetime.min.time()))[0]
+
+
+def apply_lesson_completed(user_id: str, payload: dict, db: Session) -> dict:
+    """
+    Apply the rewards of a complete-lesson call. The LessonCompletion row (if any) is already committed.
+    payload: course_id, new_completion (False for repeat calls), course_completed, activity_date,
+    week_start (of the week the call was made in).
+    Returns the rewards as a CompleteLessonRewards-shaped dict.
+    """
+    activity_dates = [date.fromisoformat(payload["activity_date"])]
+    return apply_lesson_rewards(
+        user_id,
+        activity_dates,
+        _event_week_start(payload, activity_dates),
+        int(payload["new_completion"]),
+        payload["course_completed"],
+        db,
+    )
+
+
+def apply_lessons_synced(user_id: str, payload: dict, db: Session) -> dict:
+    """
+    Apply the rewards of a /student/sync batch at once. The LessonCompletion rows are already committed.
+    payload: activity_dates (of every completion), new_completions, course_completed (any course),
+    week_start (of the week the batch was synced in).
+    Returns the rewards as a CompleteLessonRewards-shaped dict.
+    """
+    activity_dates = [date.fromisoformat(day) for day in payload["activity_dates"]]
+    return apply_lesson_rewards(
+        user_id,
+        activity_dates,
+        _event_week_start(payload, activity_dates),
+        payload["new_completions"],
+        payload["course_completed"],
+        db,
+    )
+
+
+def apply_lesson_rewards(
+    user_id: str,
+    activity_dates: list[date],
+    week_start: datetime,
+    new_completions: int,
+    course_completed: bool,
+    db: Session,
+) -> dict:
+    """
+    Apply streak, lesson and quest XP, gems, leaderboard XP and achievement progress for lesson
+    activity on the given days, of which new_completions were first completions.
+    Quests are evaluated once, for the periods containing the latest day. Leaderboard and weekly
+    XP go to the week starting at week_start, the one the activity was reported in, even if the
+    event is processed after that week ended.
+    """
+    activity_date = max(activity_dates)
+    week_start, week_end = get_week_bounds(week_start)
+
+    # Inventory, activity counters (overall and for the quest periods), this week's leaderboard
+    # entry (unless its pointer is cached) and unlocked achievements, in one query
+    quest_counters = quest_counters_subquery(user_id, activity_date)
+    membership = get_leaderboard_membership(user_id, week_start)
+    if membership is None:
+        # Not only open ones: the weekly reset may have closed the event's week already
+        week_leaderboards = select(Leaderboard.id).where(
+            Leaderboard.week_start >= week_start,
+            Leaderboard.week_start < week_end,
+        )
+        current_entry = (
+            select(LeaderboardEntry.id, LeaderboardEntry.leaderboard_id)
+            .where(LeaderboardEntry.user_id == user_id, LeaderboardEntry.leaderboard_id.in_(week_leaderboards))
+            .limit(1)
+            .subquery("current_entry")
+        )
+        entry_columns = [current_entry.c.id.label("entry_id"), current_entry.c.leaderboard_id]
+    else:
+        entry_columns = []
+    query = (
+        select(
+            User.full_name,
+            UserInventory.experience_points,
+            UserInventory.gems,
+            UserInventory.current_rank,
+            UserInventory.daily_streak,
+            UserInventory.longest_streak,
+            UserInventory.last_streak_recorded,
+            UserStats.user_id.label("stats_user_id"),
+            UserStats.lessons_completed,
+            UserStats.courses_completed,
+            *entry_columns,
+            achieved_ids_subquery(user_id).label("achieved_ids"),
+            *quest_counters.c,
+        )
+        .select_from(User)
+        .outerjoin(UserInventory, UserInventory.user_id == User.user_id)
+        .outerjoin(UserStats, UserStats.user_id == User.user_id)
+        .join(quest_counters, true())
+        .where(User.user_id == user_id)
+    )
+    if membership is None:
+        query = query.outerjoin(current_entry, true())
+    context = db.execute(query).one()
+    stats = context if context.stats_user_id is not None else get_user_stats([user_id], db)[user_id]
+
+    # Update streak
+    has_inventory = context.experience_points is not None
+    daily_streak = context.daily_streak if has_inventory else 0
+    longest_streak = context.longest_streak if has_inventory else 0
+    last_streak_recorded = context.last_streak_recorded
+    streak_dates = []
+    for day in sorted(set(activity_dates)):
+        # Days before the last counted one arrive late and cannot change the streak any more
+        if last_streak_recorded is not None and day < last_streak_recorded:
+            continue
+        streak = advance_streak(last_streak_recorded, daily_streak, longest_streak, day)
+        if streak is not None:
+            daily_streak, longest_streak = streak
+            last_streak_recorded = day
+            streak_dates.append(day)
+    streak_updated = bool(streak_dates)
+
+    # Leaderboard seat (needed for both lesson XP and quest XP)
+    if membership is not None:
+        leaderboard_id, entry_id = membership.leaderboard_id, membership.entry_id
+    elif context.entry_id is not None:
+        leaderboard_id, entry_id = context.leaderboard_id, context.entry_id
+        # The entry is committed, so later events can go straight to it
+        remember_leaderboard_membership(user_id, week_start, leaderboard_id, entry_id)
+    elif week_start == get_current_week_bounds()[0]:
+        user_rank = context.current_rank if context.current_rank in RANKS else RANKS[0]
+        leaderboard_id, entry_id = claim_leaderboard_seat(user_id, user_rank, db, week_start)
+    else:
+        # The week is over and the learner had no seat in it; its leaderboards may be closed
+        leaderboard_id = entry_id = None
+
+    xp_earned = LESSON_XP * new_completions
+
+    quest_rows, newly_completed_quests, gems_earned, quest_progress, quest_xp = plan_quests(
+        user_id, activity_date, {name: context._mapping[name] for name in QUEST_COUNTERS}, db
+    )
+    xp_earned += quest_xp
+
+    # Track achievement unlocks (only on new completions)
+    achievement_rows: list[dict] = []
+    newly_unlocked: list[NewlyUnlockedAchievement] = []
+    if new_completions:
+        # lessons_completed: total lessons ever completed by this user
+        achievement_values = {"lessons_completed": stats.lessons_completed}
+        # courses_completed: count of enrollments now marked completed
+        if course_completed:
+            achievement_values["courses_completed"] = stats.courses_completed
+        # streak_days: longest streak ever achieved
+        if streak_updated:
+            achievement_values["streak_days"] = longest_streak
+        achievement_rows, newly_unlocked = plan_achievement_unlocks(
+            user_id, achievement_values, context.achieved_ids, db
+        )
+
+    # Writes, sent to the database as a single statement
+    writes = []
+    if streak_updated:
+        # Record streak entries for calendar
+        writes.append(
+            pg_insert(StreakEntry)
+            .values([{"id": str(uuid.uuid4()), "user_id": user_id, "date": day} for day in streak_dates])
+            .on_conflict_do_nothing(constraint="uq_streak_entry_user_date")
+        )
+
+    inventory_upsert = pg_insert(UserInventory).values(
+        id=str(uuid.uuid4()),
+        user_id=user_id,
+        experience_points=xp_earned,
+        gems=gems_earned,
+        daily_streak=daily_streak,
+        longest_streak=longest_streak,
+        last_streak_recorded=last_streak_recorded,
+    )
+    inventory_changes = {
+        "experience_points": UserInventory.experience_points + inventory_upsert.excluded.experience_points,
+        "gems": UserInventory.gems + inventory_upsert.excluded.gems,
+    }
+    if streak_updated:
+        inventory_changes.update(
+            daily_streak=inventory_upsert.excluded.daily_streak,
+            longest_streak=inventory_upsert.excluded.longest_streak,
+            last_streak_recorded=inventory_upsert.excluded.last_streak_recorded,
+        )
+    writes.append(inventory_upsert.on_conflict_do_update(
+        index_elements=[UserInventory.user_id], set_=inventory_changes
+    ))
+
+    if entry_id is not None:
+        # Known entry: a primary-key update
+        writes.append(
+            update(LeaderboardEntry)
+            .where(LeaderboardEntry.id == entry_id)
+            .values(xp_earned=LeaderboardEntry.xp_earned + xp_earned)
+        )
+    elif leaderboard_id is not None:
+        entry_upsert = pg_insert(LeaderboardEntry).values(
+            id=str(uuid.uuid4()), leaderboard_id=leaderboard_id, user_id=user_id, xp_earned=xp_earned
+        )
+        writes.append(entry_upsert.on_conflict_do_update(
+            constraint="uq_leaderboard_entry_user",
+            set_={"xp_earned": LeaderboardEntry.xp_earned + entry_upsert.excluded.xp_earned},
+        ))
+
+    if leaderboard_id is not None and (xp_earned or entry_id is None):
+        # Cached rankings follow once the event commits
+        record_leaderboard_xp(db, leaderboard_id, user_id, context.full_name, xp_earned)
+        writes.append(ranking_version_bump(leaderboard_id))
+
+    writes.append(quest_progress_upsert(quest_rows))
+    if xp_earned:
+        writes.append(weekly_xp_upsert(user_id, week_start.date(), xp_earned))
+    if xp_earned or gems_earned:
+        writes.append(daily_activity_upsert(user_id, activity_date, xp=xp_earned, gems=gems_earned))
+    if achievement_rows:
+        writes.append(achievement_upsert(achievement_rows))
+        writes.append(user_stats_update(user_id, achievements_unlocked=len(achievement_rows)))
+    execute_writes(writes, db)
+
+    return {
+        "streak_updated": streak_updated,
+        "daily_streak": daily_streak,
+        "newly_unlocked_achievements": [a.model_dump() for a in newly_unlocked],
+        "newly_completed_quests": [q.model_dump() for q in newly_completed_quests],
+        "gems_earned": gems_earned,
+        "total_gems": (context.gems if has_inventory else 0) + gems_earned,
+        "daily_quest_progress": [q.model_dump() for q in quest_progress if q.period == "daily"],
+        "xp_earned": xp_earned,
+        "total_xp": (context.experience_points if has_inventory else 0) + xp_earned,
+    }
+
+
+def apply_course_enrolled(user_id: str, payload: dict, db: Session) -> dict:
+    """Track courses_enrolled achievement unlocks after an enrollment. payload: course_id."""
+    achieved_ids = db.execute(select(achieved_ids_subquery(user_id))).scalar_one()
+    stats = get_user_stats([user_id], db)[user_id]
+    newly_unlocked = update_achievement_progress(
+        user_id, "courses_enrolled", stats.courses_enrolled, achieved_ids, db
+    )
+    return {"newly_unlocked_achievements": [a.model_dump() for a in newly_unlocked]}
@@ -0,0 +1,145 @@
+import os
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Sequence
+from fastapi import HTTPException, Request, status
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+from sqlalchemy import select, delete, Executable
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.models.db_models import IdempotencyRecord
+from app.utils.cache_utils import TTLCache
+from app.utils.db_utils import execute_writes
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+# Set on responses replayed from a stored record
+IDEMPOTENT_REPLAYED_HEADER = "Idempotent-Replayed"
+# How long a key is remembered; a retry after the window runs the request again
+IDEMPOTENCY_WINDOW_SECONDS = int(os.getenv("IDEMPOTENCY_WINDOW_SECONDS", str(24 * 60 * 60)))
+IDEMPOTENCY_CACHE_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_CACHE_MAX_ENTRIES", "4096"))
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+# Keyed by (user_id, endpoint, key) -> (request_hash, response_body), so retries reaching the
+# process that served the original request skip the database entirely
+idempotency_cache = TTLCache(IDEMPOTENCY_WINDOW_SECONDS, IDEMPOTENCY_CACHE_MAX_ENTRIES)
+
+
+def _request_hash(body: BaseModel) -> str:
+    return hashlib.sha256(body.model_dump_json().encode()).hexdigest()
+
+
+def _replay(request_hash: str, stored_hash: str, response_body: dict) -> JSONResponse:
+    if stored_hash != request_hash:
+        raise HTTPException(
+            status_code=422,
+            detail=f"{IDEMPOTENCY_KEY_HEADER} was already used for a different request",
+        )
+    return JSONResponse(content=response_body, headers={IDEMPOTENT_REPLAYED_HEADER: "true"})
+
+
+class IdempotentRequest:
+    """
+    A mutating request, optionally carrying an Idempotency-Key. Routes return .replay when it
+    is set, and otherwise finish with .commit() so the response is stored with their writes.
+    """
+
+    def __init__(self, user_id: str, endpoint: str, key: Optional[str], request_hash: str):
+        self.user_id = user_id
+        self.endpoint = endpoint
+        self.key = key
+        self.request_hash = request_hash
+        self.replay: Optional[JSONResponse] = None
+
+    @property
+    def _cache_key(self) -> tuple:
+        return (self.user_id, self.endpoint, self.key)
+
+    def _record_filter(self):
+        return (
+            IdempotencyRecord.user_id == self.user_id,
+            IdempotencyRecord.endpoint == self.endpoint,
+            IdempotencyRecord.idempotency_key == self.key,
+        )
+
+    def commit(self, response: BaseModel, db: Session, writes: Sequence[Executable] = ()) -> Optional[JSONResponse]:
+        """
+        Execute the writes together with the record of the response (in one round trip) and commit.
+        If a concurrent request with the same key committed first, everything is rolled back and
+        that request's response is returned for the route to replay instead.
+        """
+        statements = list(writes)
+        if self.key is None:
+            if statements:
+                execute_writes(statements, db)
+            db.commit()
+            return None
+
+        response_body = response.model_dump(mode="json")
+        statements.append(
+            pg_insert(IdempotencyRecord)
+            .values(
+                user_id=self.user_id,
+                endpoint=self.endpoint,
+                idempotency_key=self.key,
+                request_hash=self.request_hash,
+                response_body=response_body,
+            )
+            .on_conflict_do_nothing()
+            .returning(IdempotencyRecord.idempotency_key)
+        )
+        if execute_writes(statements, db).first() is None:
+            db.rollback()
+            record = db.execute(select(IdempotencyRecord).where(*self._record_filter())).scalar_one_or_none()
+            if record is None:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="A request with this Idempotency-Key is already in progress",
+                )
+            return _replay(self.request_hash, record.request_hash, record.response_body)
+        db.commit()
+        idempotency_cache.set(self._cache_key, (self.request_hash, response_body))
+        return None
+
+
+def begin_idempotent_request(
+    http_request: Request, endpoint: str, user_id: str, body: BaseModel, db: Session
+) -> IdempotentRequest:
+    """
+    Read the Idempotency-Key header and look up a stored response for it: from the cache,
+    otherwise with one query. A hit within the window is set as .replay; reusing the key
+    for a different request body is rejected with 422.
+    """
+    key = http_request.headers.get(IDEMPOTENCY_KEY_HEADER)
+    request = IdempotentRequest(user_id, endpoint, key or None, _request_hash(body))
+    if not key:
+        return request
+    if len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{IDEMPOTENCY_KEY_HEADER} cannot be longer than {MAX_IDEMPOTENCY_KEY_LENGTH} characters",
+        )
+
+    cached = idempotency_cache.get(request._cache_key)
+    if cached is not None:
+        request.replay = _replay(request.request_hash, *cached)
+        return request
+
+    record = db.execute(select(IdempotencyRecord).where(*request._record_filter())).scalar_one_or_none()
+    if record is None:
+        return request
+    if record.created_at < datetime.now(timezone.utc) - timedelta(seconds=IDEMPOTENCY_WINDOW_SECONDS):
+        # Expired but not purged yet: the key is free again, the new record replaces it on commit
+        db.execute(delete(IdempotencyRecord).where(*request._record_filter()))
+        return request
+    request.replay = _replay(request.request_hash, record.request_hash, record.response_body)
+    idempotency_cache.set(request._cache_key, (record.request_hash, record.response_body))
+    return request
+
+
+def purge_idempotency_records(db: Session, window_seconds: int = IDEMPOTENCY_WINDOW_SECONDS) -> int:
+    """Delete records older than the idempotency window. Commits."""
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=window_seconds)
+    deleted = db.execute(delete(IdempotencyRecord).where(IdempotencyRecord.created_at < cutoff)).rowcount
+    db.commit()
+    return deleted
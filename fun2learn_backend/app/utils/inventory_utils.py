@@ -0,0 +1,68 @@
+import uuid
+from typing import Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.sql.dml import Insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.models.db_models import UserInventory
+
+# Balances that change by increments. Every change goes through the database as
+# "balance = balance + delta", never as a value computed in Python from an earlier read,
+# so concurrent requests for the same user cannot overwrite each other's changes.
+INVENTORY_BALANCES = ("gems", "experience_points")
+
+
+def inventory_credit_upsert(user_id: str, **deltas: int) -> Insert:
+    """
+    Build an upsert adding deltas to balances, e.g. inventory_credit_upsert(uid, gems=10),
+    creating the inventory if the user has none. Usable with execute_writes.
+    """
+    stmt = pg_insert(UserInventory).values(
+        id=str(uuid.uuid4()), user_id=user_id, **{col: deltas.get(col, 0) for col in INVENTORY_BALANCES}
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[UserInventory.user_id],
+        set_={col: getattr(UserInventory, col) + stmt.excluded[col] for col in deltas},
+    )
+
+
+def credit_inventory(user_id: str, db: Session, **deltas: int) -> None:
+    """Atomically add deltas to balances, e.g. credit_inventory(uid, db, gems=10)."""
+    db.execute(inventory_credit_upsert(user_id, **deltas))
+
+
+def debit_gems(user_id: str, amount: int, db: Session) -> Optional[int]:
+    """
+    Atomically take gems from the user if the balance covers them.
+    Returns the new balance, or None (and changes nothing) if the balance is too low.
+    """
+    return db.execute(
+        update(UserInventory)
+        .where(UserInventory.user_id == user_id, UserInventory.gems >= amount)
+        .values(gems=UserInventory.gems - amount)
+        .returning(UserInventory.gems)
+        .execution_options(synchronize_session=False)
+    ).scalar_one_or_none()
+
+
+def get_gem_balance(user_id: str, db: Session) -> int:
+    return db.execute(
+        select(UserInventory.gems).where(UserInventory.user_id == user_id)
+    ).scalar_one_or_none() or 0
+
+
+def get_or_create_inventory(user_id: str, db: Session) -> UserInventory:
+    """Get the user's inventory, creating an empty one if needed. Safe against concurrent creation."""
+    inventory = db.execute(
+        select(UserInventory).where(UserInventory.user_id == user_id)
+    ).scalar_one_or_none()
+    if inventory is None:
+        db.execute(
+            pg_insert(UserInventory)
+            .values(id=str(uuid.uuid4()), user_id=user_id)
+            .on_conflict_do_nothing(index_elements=[UserInventory.user_id])
+        )
+        inventory = db.execute(
+            select(UserInventory).where(UserInventory.user_id == user_id)
+        ).scalar_one()
+    return inventory
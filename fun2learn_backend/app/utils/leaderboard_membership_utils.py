@@ -0,0 +1,90 @@
+import os
+import json
+from datetime import datetime
+from typing import NamedTuple, Optional
+from app.utils.cache_utils import TTLCache
+
+# Pointers are only valid for the week they were recorded in, so at most a week old
+LEADERBOARD_MEMBERSHIP_TTL_SECONDS = float(os.getenv("LEADERBOARD_MEMBERSHIP_TTL_SECONDS", str(7 * 24 * 60 * 60)))
+LEADERBOARD_MEMBERSHIP_MAX_ENTRIES = int(os.getenv("LEADERBOARD_MEMBERSHIP_MAX_ENTRIES", "100000"))
+# Set to share pointers between worker processes through Redis
+LEADERBOARD_MEMBERSHIP_REDIS_URL = os.getenv("LEADERBOARD_MEMBERSHIP_REDIS_URL")
+_REDIS_KEY_PREFIX = "leaderboard_membership:"
+
+
+class LeaderboardMembership(NamedTuple):
+    # week_start of the leaderboard, as an ISO string
+    week: str
+    leaderboard_id: str
+    entry_id: str
+
+
+class LocalMembershipStore:
+    """Pointers held in this process only."""
+
+    def __init__(self):
+        self._cache = TTLCache(LEADERBOARD_MEMBERSHIP_TTL_SECONDS, LEADERBOARD_MEMBERSHIP_MAX_ENTRIES)
+
+    def get(self, user_id: str) -> Optional[LeaderboardMembership]:
+        return self._cache.get(user_id)
+
+    def set(self, user_id: str, membership: LeaderboardMembership) -> None:
+        self._cache.set(user_id, membership)
+
+    def delete(self, user_id: str) -> None:
+        self._cache.set(user_id, None)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+
+class RedisMembershipStore:
+    """Pointers shared by every process using the same Redis."""
+
+    def __init__(self, url: str):
+        import redis
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, user_id: str) -> Optional[LeaderboardMembership]:
+        value = self._client.get(_REDIS_KEY_PREFIX + user_id)
+        return LeaderboardMembership(*json.loads(value)) if value else None
+
+    def set(self, user_id: str, membership: LeaderboardMembership) -> None:
+        self._client.set(
+            _REDIS_KEY_PREFIX + user_id, json.dumps(membership), ex=int(LEADERBOARD_MEMBERSHIP_TTL_SECONDS)
+        )
+
+    def delete(self, user_id: str) -> None:
+        self._client.delete(_REDIS_KEY_PREFIX + user_id)
+
+    def clear(self) -> None:
+        for key in self._client.scan_iter(match=_REDIS_KEY_PREFIX + "*", count=1000):
+            self._client.delete(key)
+
+
+membership_store = (
+    RedisMembershipStore(LEADERBOARD_MEMBERSHIP_REDIS_URL) if LEADERBOARD_MEMBERSHIP_REDIS_URL
+    else LocalMembershipStore()
+)
+
+
+def get_leaderboard_membership(user_id: str, week_start: datetime) -> Optional[LeaderboardMembership]:
+    """The user's cached entry on an open leaderboard of the week starting at week_start, if known."""
+    membership = membership_store.get(user_id)
+    if membership is None or membership.week != week_start.isoformat():
+        return None
+    return membership
+
+
+def remember_leaderboard_membership(user_id: str, week_start: datetime, leaderboard_id: str, entry_id: str) -> None:
+    """Record the user's entry for the week. Only pass entries that are already committed."""
+    membership_store.set(user_id, LeaderboardMembership(week_start.isoformat(), leaderboard_id, entry_id))
+
+
+def forget_leaderboard_membership(user_id: str) -> None:
+    membership_store.delete(user_id)
+
+
+def invalidate_leaderboard_memberships() -> None:
+    """Drop every pointer. Called when leaderboards are closed by the weekly reset."""
+    membership_store.clear()
@@ -0,0 +1,255 @@
+import os
+import threading
+from datetime import datetime
+from typing import NamedTuple, Optional
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+from app.models.db_models import Leaderboard, LeaderboardEntry, User
+from app.utils.cache_utils import TTLCache
+
+# Rankings are kept up to date by the XP write path; the TTL bounds how long unused ones are kept
+LEADERBOARD_RANKING_TTL_SECONDS = float(os.getenv("LEADERBOARD_RANKING_TTL_SECONDS", "300"))
+LEADERBOARD_RANKING_MAX_ENTRIES = int(os.getenv("LEADERBOARD_RANKING_MAX_ENTRIES", "20000"))
+# Set to share rankings between worker processes through Redis
+LEADERBOARD_RANKING_REDIS_URL = os.getenv("LEADERBOARD_RANKING_REDIS_URL")
+_REDIS_KEY_PREFIX = "leaderboard_ranking:"
+# Session.info key of the XP changes applied once the session commits
+_PENDING_KEY = "leaderboard_ranking_pending"
+
+
+class RankedMember(NamedTuple):
+    user_id: str
+    full_name: str
+    xp_earned: int
+
+
+class RankedLeaderboard(NamedTuple):
+    leaderboard_id: str
+    rank: str
+    week_start: datetime
+    week_end: datetime
+    # Highest XP first
+    members: tuple[RankedMember, ...]
+    # The leaderboard's ranking_version this ranking reflects
+    version: int = 0
+
+    def position_of(self, user_id: str) -> Optional[int]:
+        for position, member in enumerate(self.members, start=1):
+            if member.user_id == user_id:
+                return position
+        return None
+
+    def with_xp(self, user_id: str, full_name: str, xp: int) -> "RankedLeaderboard":
+        """A copy with xp added to the member, who is added if new."""
+        members = {member.user_id: member for member in self.members}
+        current = members.get(user_id)
+        members[user_id] = RankedMember(user_id, full_name, (current.xp_earned if current else 0) + xp)
+        return self._replace(members=_sorted(members.values()), version=self.version + 1)
+
+
+def _sorted(members) -> tuple[RankedMember, ...]:
+    return tuple(sorted(members, key=lambda member: member.xp_earned, reverse=True))
+
+
+class LocalRankingStore:
+    """
+    Rankings held in this process only. XP applied by other processes (API workers or a separate
+    outbox worker) does not reach it, so a ranking is only served while its version matches the
+    leaderboard's ranking_version.
+    """
+
+    shared = False
+
+    def __init__(self):
+        self._cache = TTLCache(LEADERBOARD_RANKING_TTL_SECONDS, LEADERBOARD_RANKING_MAX_ENTRIES)
+        # leaderboard_id -> number of XP changes seen, so a ranking loaded before one is not stored
+        self._versions = TTLCache(LEADERBOARD_RANKING_TTL_SECONDS, LEADERBOARD_RANKING_MAX_ENTRIES)
+        self._lock = threading.Lock()
+
+    def get(self, leaderboard_id: str) -> Optional[RankedLeaderboard]:
+        return self._cache.get(leaderboard_id)
+
+    def version(self, leaderboard_id: str) -> int:
+        return self._versions.get(leaderboard_id) or 0
+
+    def put(self, board: RankedLeaderboard, version: int) -> None:
+        with self._lock:
+            if self.version(board.leaderboard_id) == version:
+                self._cache.set(board.leaderboard_id, board)
+
+    def add_xp(self, leaderboard_id: str, user_id: str, full_name: str, xp: int) -> None:
+        with self._lock:
+            self._versions.set(leaderboard_id, self.version(leaderboard_id) + 1)
+            board = self._cache.get(leaderboard_id)
+            if board is not None:
+                self._cache.set(leaderboard_id, board.with_xp(user_id, full_name, xp))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self._versions.clear()
+
+
+class RedisRankingStore:
+    """
+    Rankings shared by every process using the same Redis: per leaderboard, a hash with its
+    details, a hash of member names and a sorted set of XP, updated with ZINCRBY.
+    """
+
+    shared = True
+
+    def __init__(self, url: str):
+        import redis
+        self._client = redis.Redis.from_url(url, decode_responses=True)
+        self._watch_error = redis.WatchError
+
+    def _keys(self, leaderboard_id: str) -> tuple[str, str, str, str]:
+        prefix = _REDIS_KEY_PREFIX + leaderboard_id
+        return prefix + ":info", prefix + ":names", prefix + ":xp", prefix + ":version"
+
+    def get(self, leaderboard_id: str) -> Optional[RankedLeaderboard]:
+        info_key, names_key, xp_key, _ = self._keys(leaderboard_id)
+        pipe = self._client.pipeline()
+        pipe.hgetall(info_key)
+        pipe.hgetall(names_key)
+        pipe.zrevrange(xp_key, 0, -1, withscores=True)
+        info, names, scores = pipe.execute()
+        if not info:
+            return None
+        return RankedLeaderboard(
+            leaderboard_id,
+            info["rank"],
+            datetime.fromisoformat(info["week_start"]),
+            datetime.fromisoformat(info["week_end"]),
+            tuple(RankedMember(user_id, names.get(user_id, ""), int(xp)) for user_id, xp in scores),
+            int(info.get("version", 0)),
+        )
+
+    def version(self, leaderboard_id: str) -> int:
+        return int(self._client.get(self._keys(leaderboard_id)[3]) or 0)
+
+    def put(self, board: RankedLeaderboard, version: int) -> None:
+        info_key, names_key, xp_key, version_key = self._keys(board.leaderboard_id)
+        ttl = int(LEADERBOARD_RANKING_TTL_SECONDS)
+        with self._client.pipeline() as pipe:
+            try:
+                # Stored only if no XP change arrived since the ranking was loaded
+                pipe.watch(version_key)
+                if int(pipe.get(version_key) or 0) != version:
+                    return
+                pipe.multi()
+                pipe.delete(info_key, names_key, xp_key)
+                pipe.hset(info_key, mapping={
+                    "rank": board.rank,
+                    "week_start": board.week_start.isoformat(),
+                    "week_end": board.week_end.isoformat(),
+                    "version": board.version,
+                })
+                if board.members:
+                    pipe.hset(names_key, mapping={member.user_id: member.full_name for member in board.members})
+                    pipe.zadd(xp_key, {member.user_id: member.xp_earned for member in board.members})
+                for key in (info_key, names_key, xp_key):
+                    pipe.expire(key, ttl)
+                pipe.execute()
+            except self._watch_error:
+                pass
+
+    def add_xp(self, leaderboard_id: str, user_id: str, full_name: str, xp: int) -> None:
+        info_key, names_key, xp_key, version_key = self._keys(leaderboard_id)
+        pipe = self._client.pipeline()
+        pipe.incr(version_key)
+        pipe.expire(version_key, int(LEADERBOARD_RANKING_TTL_SECONDS))
+        pipe.exists(info_key)
+        if not pipe.execute()[2]:
+            return
+        pipe = self._client.pipeline()
+        pipe.hset(names_key, user_id, full_name)
+        pipe.zincrby(xp_key, xp, user_id)
+        pipe.hincrby(info_key, "version", 1)
+        pipe.execute()
+
+    def clear(self) -> None:
+        for key in self._client.scan_iter(match=_REDIS_KEY_PREFIX + "*", count=1000):
+            self._client.delete(key)
+
+
+def _create_ranking_store():
+    if LEADERBOARD_RANKING_REDIS_URL:
+        return RedisRankingStore(LEADERBOARD_RANKING_REDIS_URL)
+    return LocalRankingStore()
+
+
+ranking_store = _create_ranking_store()
+
+
+def load_ranked_leaderboard(leaderboard: Leaderboard, db: Session) -> RankedLeaderboard:
+    """
+    Read the leaderboard's members with their names in one query and cache the ranking.
+    Returns the ranking even if a concurrent XP change kept it out of the cache.
+    """
+    version = ranking_store.version(leaderboard.id)
+    # The ranking version is read with the members, so both come from the same snapshot
+    rows = db.execute(
+        select(LeaderboardEntry.user_id, User.full_name, LeaderboardEntry.xp_earned, Leaderboard.ranking_version)
+        .join(User, User.user_id == LeaderboardEntry.user_id)
+        .join(Leaderboard, Leaderboard.id == LeaderboardEntry.leaderboard_id)
+        .where(LeaderboardEntry.leaderboard_id == leaderboard.id)
+    ).all()
+    board = RankedLeaderboard(
+        leaderboard.id,
+        leaderboard.rank,
+        leaderboard.week_start,
+        leaderboard.week_end,
+        _sorted(RankedMember(row.user_id, row.full_name, row.xp_earned) for row in rows),
+        rows[0].ranking_version if rows else leaderboard.ranking_version,
+    )
+    ranking_store.put(board, version)
+    return board
+
+
+def get_ranked_leaderboard(leaderboard_id: str, db: Session) -> Optional[RankedLeaderboard]:
+    """
+    The cached ranking, if any. One cached by this process only is first checked against the
+    leaderboard's ranking_version, a primary-key lookup.
+    """
+    board = ranking_store.get(leaderboard_id)
+    if board is None or ranking_store.shared:
+        return board
+    version = db.execute(
+        select(Leaderboard.ranking_version).where(Leaderboard.id == leaderboard_id)
+    ).scalar_one_or_none()
+    return board if board.version == version else None
+
+
+def ranking_version_bump(leaderboard_id: str):
+    """
+    Build an update of the leaderboard's ranking_version, for use with execute_writes. Every
+    record_leaderboard_xp goes with one in the same transaction.
+    """
+    return update(Leaderboard).where(Leaderboard.id == leaderboard_id).values(
+        ranking_version=Leaderboard.ranking_version + 1
+    )
+
+
+def record_leaderboard_xp(db: Session, leaderboard_id: str, user_id: str, full_name: str, xp: int) -> None:
+    """
+    Add xp to the member's cached ranking once db commits, adding the member if new; also
+    updates the member's name, so xp=0 records a rename. Nothing is applied on rollback.
+    """
+    db.info.setdefault(_PENDING_KEY, []).append((leaderboard_id, user_id, full_name, xp))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending_xp(session: Session) -> None:
+    for change in session.info.pop(_PENDING_KEY, []):
+        ranking_store.add_xp(*change)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_xp(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
+
+
+def invalidate_leaderboard_rankings() -> None:
+    """Drop every cached ranking. Called when leaderboards are closed by the weekly reset."""
+    ranking_store.clear()
@@ -1,6 +1,15 @@
+import os
+import uuid
 from datetime import datetime, timedelta
+from typing import Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import select
+from sqlalchemy import select, insert, update, func, case, and_, or_, exists
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.connection.postgres_connection import engine
+from app.models.db_models import Leaderboard, LeaderboardEntry, UserInventory, LeaderboardResetState
+from app.utils.leaderboard_membership_utils import invalidate_leaderboard_memberships
+from app.utils.leaderboard_ranking_utils import invalidate_leaderboard_rankings
 import logging
 
 logger = logging.getLogger(__name__)
@@ -9,55 +18,276 @@ RANKS = ["bronze", "silver", "gold", "platinum", "ruby", "pearl", "diamond", "ch
 LEADERBOARD_MAX_SIZE = 12
 PROMOTION_COUNT = 3
 RELEGATION_COUNT = 2
+# Expired leaderboards closed per transaction by the weekly reset
+LEADERBOARD_RESET_CHUNK_SIZE = int(os.getenv("LEADERBOARD_RESET_CHUNK_SIZE", "500"))
+_RESET_STATE_ID = 1
 
+# Week start of the last reset this process knows is complete, so callers skip the check in memory
+_reset_watermark: Optional[datetime] = None
 
-def get_current_week_bounds() -> tuple[datetime, datetime]:
-    """Returns (week_start, week_end) for the current Sunday-to-Sunday week (local time)."""
-    now = datetime.now()
-    days_since_sunday = (now.weekday() + 1) % 7  # Mon=1, Tue=2, ..., Sat=6, Sun=0
-    week_start = (now - timedelta(days=days_since_sunday)).replace(
+
+def get_week_bounds(moment: datetime) -> tuple[datetime, datetime]:
+    """Returns (week_start, week_end) for the Sunday-to-Sunday week containing moment (local time)."""
+    days_since_sunday = (moment.weekday() + 1) % 7  # Mon=1, Tue=2, ..., Sat=6, Sun=0
+    week_start = (moment - timedelta(days=days_since_sunday)).replace(
         hour=0, minute=0, second=0, microsecond=0
     )
     week_end = week_start + timedelta(days=7)
     return week_start, week_end
 
 
-def process_leaderboard_resets(db: Session) -> None:
-    """Close all expired open leaderboards and update user ranks accordingly."""
-    from app.models.db_models import Leaderboard, UserInventory
+def get_current_week_bounds() -> tuple[datetime, datetime]:
+    """Returns (week_start, week_end) for the current Sunday-to-Sunday week (local time)."""
+    return get_week_bounds(datetime.now())
+
 
-    now = datetime.now()
-    expired = db.execute(
-        select(Leaderboard).where(
+def claim_leaderboard_seat(
+    user_id: str, user_rank: str, db: Session, week_start: Optional[datetime] = None
+) -> tuple[str, Optional[str]]:
+    """
+    Take a seat for the user on an open leaderboard of their rank for the week starting at
+    week_start (this week by default), creating a new cohort only when every one is full.
+    Returns (leaderboard_id, entry_id): entry_id is set if the user turned out to have an entry
+    already, otherwise the caller adds it in the same transaction.
+
+    A seat is a conditional increment of member_count, so concurrent joiners can never overfill
+    a cohort. Creating cohorts is serialized per rank and week, so they do not multiply either.
+    """
+    week_start, week_end = get_week_bounds(week_start or datetime.now())
+
+    # Joins of one user are made one at a time, so nobody ends up on two leaderboards
+    db.execute(select(func.pg_advisory_xact_lock(func.hashtext(f"leaderboard:{user_id}"))))
+    existing = db.execute(
+        select(LeaderboardEntry.leaderboard_id, LeaderboardEntry.id)
+        .join(Leaderboard, Leaderboard.id == LeaderboardEntry.leaderboard_id)
+        .where(
+            LeaderboardEntry.user_id == user_id,
             Leaderboard.status == "open",
-            Leaderboard.week_end <= now
+            Leaderboard.week_start >= week_start,
+            Leaderboard.week_start < week_end,
         )
+    ).first()
+    if existing is not None:
+        return existing.leaderboard_id, existing.id
+
+    open_with_room = (
+        Leaderboard.rank == user_rank,
+        Leaderboard.status == "open",
+        Leaderboard.week_start >= week_start,
+        Leaderboard.week_start < week_end,
+        Leaderboard.member_count < LEADERBOARD_MAX_SIZE,
+    )
+
+    def take_seat(leaderboard_id) -> Optional[str]:
+        return db.execute(
+            update(Leaderboard)
+            .where(Leaderboard.id == leaderboard_id, Leaderboard.member_count < LEADERBOARD_MAX_SIZE)
+            .values(member_count=Leaderboard.member_count + 1, ranking_version=Leaderboard.ranking_version + 1)
+            .returning(Leaderboard.id)
+            .execution_options(synchronize_session=False)
+        ).scalar_one_or_none()
+
+    # Fast path: the fullest cohort with room that nobody else is joining right now
+    leaderboard_id = take_seat(
+        select(Leaderboard.id)
+        .where(*open_with_room)
+        .order_by(Leaderboard.member_count.desc())
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    if leaderboard_id is not None:
+        return leaderboard_id, None
+
+    # Every cohort is full or busy. Joiners of the rank queue up here, wait for the busy
+    # cohorts and only open a new one if none has a seat left after all.
+    db.execute(select(func.pg_advisory_xact_lock(func.hashtext(f"leaderboard:{user_rank}:{week_start.isoformat()}"))))
+    candidate_ids = db.execute(
+        select(Leaderboard.id).where(*open_with_room).order_by(Leaderboard.member_count.desc())
     ).scalars().all()
+    for candidate_id in candidate_ids:
+        leaderboard_id = take_seat(candidate_id)
+        if leaderboard_id is not None:
+            return leaderboard_id, None
 
-    for lb in expired:
-        entries = sorted(lb.entries, key=lambda e: e.xp_earned, reverse=True)
-        n = len(entries)
+    leaderboard_id = str(uuid.uuid4())
+    db.execute(insert(Leaderboard).values(
+        id=leaderboard_id,
+        rank=user_rank,
+        status="open",
+        week_start=week_start,
+        week_end=week_end,
+        member_count=1,
+    ))
+    return leaderboard_id, None
 
-        for i, entry in enumerate(entries):
-            inventory = db.execute(
-                select(UserInventory).where(UserInventory.user_id == entry.user_id)
-            ).scalar_one_or_none()
-            if not inventory:
-                continue
 
-            current_rank = inventory.current_rank if inventory.current_rank in RANKS else RANKS[0]
-            current_idx = RANKS.index(current_rank)
+def backfill_leaderboard_member_counts(db: Session) -> None:
+    """Set member_count of open leaderboards from their entries, for leaderboards that predate it."""
+    counts = (
+        select(LeaderboardEntry.leaderboard_id, func.count().label("members"))
+        .group_by(LeaderboardEntry.leaderboard_id)
+        .subquery()
+    )
+    db.execute(
+        update(Leaderboard)
+        .where(
+            Leaderboard.id == counts.c.leaderboard_id,
+            Leaderboard.status == "open",
+            Leaderboard.member_count != counts.c.members,
+        )
+        .values(member_count=counts.c.members)
+        .execution_options(synchronize_session=False)
+    )
 
-            if i < PROMOTION_COUNT and entry.xp_earned > 0:
-                # Top 3 → promote (champions stay at top)
-                inventory.current_rank = RANKS[min(current_idx + 1, len(RANKS) - 1)]
-            elif n >= (PROMOTION_COUNT + RELEGATION_COUNT) and i >= n - RELEGATION_COUNT:
-                # Bottom 2 → relegate (only if enough members, bronze stays at bottom)
-                inventory.current_rank = RANKS[max(current_idx - 1, 0)]
 
-        lb.status = "closed"
-        logger.info(f"Processed leaderboard {lb.id}: rank={lb.rank}, entries={n}")
+def leaderboard_rank_update(leaderboard_ids: list[str]):
+    """
+    Build one UPDATE applying promotions and relegations for the members of the given closed
+    leaderboards. Members are ranked by ROW_NUMBER() over their leaderboard by XP:
+      - the top PROMOTION_COUNT with any XP move up a rank (champions stay at the top)
+      - the bottom RELEGATION_COUNT move down a rank (bronze stays at the bottom), but only on
+        leaderboards with at least PROMOTION_COUNT + RELEGATION_COUNT members
+    Ranks are moved from the learner's current rank; an unknown rank counts as the lowest one.
+    The leaderboards must not share members, i.e. be from the same week.
+    """
+    ranked = (
+        select(
+            LeaderboardEntry.user_id,
+            LeaderboardEntry.xp_earned,
+            func.row_number().over(
+                partition_by=LeaderboardEntry.leaderboard_id,
+                order_by=(LeaderboardEntry.xp_earned.desc(), LeaderboardEntry.id),
+            ).label("position"),
+            func.count().over(partition_by=LeaderboardEntry.leaderboard_id).label("members"),
+        )
+        .where(LeaderboardEntry.leaderboard_id.in_(leaderboard_ids))
+        .subquery("ranked")
+    )
+    ranks = postgresql.array(RANKS)
+    # 1-based position of the current rank in RANKS
+    rank_index = func.coalesce(func.array_position(ranks, UserInventory.current_rank), 1)
+    promoted = and_(ranked.c.position <= PROMOTION_COUNT, ranked.c.xp_earned > 0)
+    relegated = and_(
+        ranked.c.members >= PROMOTION_COUNT + RELEGATION_COUNT,
+        ranked.c.position > ranked.c.members - RELEGATION_COUNT,
+    )
+    return (
+        update(UserInventory)
+        .where(UserInventory.user_id == ranked.c.user_id, or_(promoted, relegated))
+        .values(current_rank=case(
+            (promoted, ranks[func.least(rank_index + 1, len(RANKS))]),
+            else_=ranks[func.greatest(rank_index - 1, 1)],
+        ))
+        .execution_options(synchronize_session=False)
+    )
 
-    if expired:
+
+def process_leaderboard_resets(db: Session, chunk_size: int = LEADERBOARD_RESET_CHUNK_SIZE) -> int:
+    """
+    Close all expired open leaderboards and update user ranks accordingly.
+    Works through them chunk_size leaderboards at a time, oldest week first, committing after
+    each chunk: two statements per chunk however many members it has.
+    Returns the number of leaderboards closed.
+    """
+    now = datetime.now()
+    closed = 0
+    while True:
+        expired = (
+            select(Leaderboard.week_start)
+            .where(Leaderboard.status == "open", Leaderboard.week_end <= now)
+            .order_by(Leaderboard.week_start)
+            .limit(1)
+            .scalar_subquery()
+        )
+        # A learner has one entry per week, so a chunk from a single week updates each inventory once
+        chunk = (
+            select(Leaderboard.id)
+            .where(Leaderboard.status == "open", Leaderboard.week_end <= now, Leaderboard.week_start == expired)
+            .limit(chunk_size)
+            .with_for_update(skip_locked=True)
+            # A CTE is evaluated once; as an IN subquery it would be re-run per row and skip past the limit
+            .cte("expired_chunk")
+        )
+        leaderboard_ids = db.execute(
+            update(Leaderboard)
+            .where(Leaderboard.id.in_(select(chunk.c.id)))
+            .values(status="closed")
+            .returning(Leaderboard.id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+        if not leaderboard_ids:
+            break
+        promoted_or_relegated = db.execute(leaderboard_rank_update(leaderboard_ids)).rowcount
         db.commit()
-        logger.info(f"Closed {len(expired)} expired leaderboards")
+        closed += len(leaderboard_ids)
+        logger.info(
+            f"Closed {len(leaderboard_ids)} expired leaderboards, {promoted_or_relegated} learners changed rank"
+        )
+
+    if closed:
+        # Cached pointers and rankings may refer to the closed leaderboards
+        invalidate_leaderboard_memberships()
+        invalidate_leaderboard_rankings()
+        logger.info(f"Closed {closed} expired leaderboards")
+    return closed
+
+
+def forget_leaderboard_reset() -> None:
+    """Drop the in-process watermark, so the next call checks the database again."""
+    global _reset_watermark
+    _reset_watermark = None
+
+
+def reset_leaderboards_if_due(db: Session) -> bool:
+    """
+    Run the weekly reset unless it already ran this week. Cheap to call on every request: once a
+    reset is known to be complete this is an in-memory check, and otherwise one indexed lookup
+    of the watermark in leaderboard_reset_state.
+    Exactly one caller across all processes performs a due reset, under a session-level
+    advisory lock; everyone else returns straight away instead of waiting or resetting again.
+    Returns whether this call performed the reset.
+    """
+    global _reset_watermark
+    week_start, _ = get_current_week_bounds()
+    if _reset_watermark == week_start:
+        return False
+
+    def is_done() -> bool:
+        return db.execute(select(exists().where(
+            LeaderboardResetState.id == _RESET_STATE_ID,
+            LeaderboardResetState.last_reset_week_start >= week_start,
+        ))).scalar_one()
+
+    if is_done():
+        _reset_watermark = week_start
+        return False
+
+    # The reset commits chunk by chunk, so the lock lives on a connection of its own
+    with engine.connect() as lock_connection:
+        lock_key = func.hashtext("leaderboard_reset")
+        if not lock_connection.execute(select(func.pg_try_advisory_lock(lock_key))).scalar_one():
+            return False
+        try:
+            # Another caller may have finished between the check above and taking the lock
+            if is_done():
+                _reset_watermark = week_start
+                return False
+            process_leaderboard_resets(db)
+            watermark = pg_insert(LeaderboardResetState).values(
+                id=_RESET_STATE_ID, last_reset_week_start=week_start
+            )
+            db.execute(watermark.on_conflict_do_update(
+                index_elements=[LeaderboardResetState.id],
+                set_={
+                    "last_reset_week_start": func.greatest(
+                        LeaderboardResetState.last_reset_week_start, watermark.excluded.last_reset_week_start
+                    ),
+                    "updated_at": func.now(),
+                },
+            ))
+            db.commit()
+            _reset_watermark = week_start
+            return True
+        finally:
+            lock_connection.execute(select(func.pg_advisory_unlock(lock_key)))
@@ -0,0 +1,131 @@
+from typing import Optional
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.models.db_models import Course, CourseLessonSequence
+from app.utils.course_tree_utils import CourseTree, load_course_tree
+
+
+def _bump_sequence_version(course_id: str, db: Session) -> None:
+    # Completed-lesson bitmaps are keyed by position, appending lessons keeps them valid
+    course = db.get(Course, course_id)
+    course.sequence_version = (course.sequence_version or 0) + 1
+
+
+def sync_lesson_sequence(
+    course_id: str, db: Session, tree: Optional[CourseTree] = None, lessons_removed: bool = False
+) -> None:
+    """
+    Bring the persisted lesson sequence of a course in line with its current structure.
+    Only rows whose position, successor or parent ids changed are written, so appending
+    a lesson touches two rows and adding an empty unit/chapter writes nothing.
+    Pass lessons_removed after deleting lessons: their rows are already gone (ON DELETE CASCADE),
+    and a lesson later appended at a freed position must not inherit its completions.
+    Call after flushing a structural change and before committing.
+    """
+    if tree is None:
+        tree = load_course_tree(course_id, db)
+
+    ordered = list(tree.iter_lessons())
+    if not ordered:
+        # Sequence rows go with their lessons, so there is nothing to write
+        if lessons_removed:
+            _bump_sequence_version(course_id, db)
+        return
+    desired: dict[str, dict] = {}
+    for position, (unit, chapter, lesson) in enumerate(ordered):
+        desired[lesson.id] = {
+            "lesson_id": lesson.id,
+            "course_id": course_id,
+            "unit_id": unit.id,
+            "chapter_id": chapter.id,
+            "position": position,
+            "next_lesson_id": ordered[position + 1][2].id if position + 1 < len(ordered) else None,
+        }
+
+    existing = db.execute(
+        select(CourseLessonSequence).where(CourseLessonSequence.course_id == course_id)
+    ).scalars().all()
+
+    stale_ids = []
+    positions_changed = lessons_removed
+    for row in existing:
+        wanted = desired.get(row.lesson_id)
+        if wanted is None:
+            stale_ids.append(row.lesson_id)
+            positions_changed = True
+            continue
+        if row.position != wanted["position"]:
+            positions_changed = True
+        if (row.unit_id, row.chapter_id, row.position, row.next_lesson_id) == (
+            wanted["unit_id"], wanted["chapter_id"], wanted["position"], wanted["next_lesson_id"]
+        ):
+            del desired[row.lesson_id]
+
+    if stale_ids:
+        db.execute(
+            delete(CourseLessonSequence)
+            .where(CourseLessonSequence.lesson_id.in_(stale_ids))
+            .execution_options(synchronize_session=False)
+        )
+
+    if desired:
+        stmt = pg_insert(CourseLessonSequence).values(list(desired.values()))
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[CourseLessonSequence.lesson_id],
+                set_={
+                    "course_id": stmt.excluded.course_id,
+                    "unit_id": stmt.excluded.unit_id,
+                    "chapter_id": stmt.excluded.chapter_id,
+                    "position": stmt.excluded.position,
+                    "next_lesson_id": stmt.excluded.next_lesson_id,
+                },
+            )
+        )
+
+    # Rows loaded above may now be out of date
+    for row in existing:
+        db.expire(row)
+
+    if positions_changed:
+        _bump_sequence_version(course_id, db)
+
+
+def get_first_lesson_entry(course_id: str, db: Session) -> Optional[CourseLessonSequence]:
+    """Return the sequence entry of the first lesson of a course, or None if it has no lessons."""
+    stmt = select(CourseLessonSequence).where(
+        CourseLessonSequence.course_id == course_id,
+        CourseLessonSequence.position == 0,
+    )
+    entry = db.execute(stmt).scalar_one_or_none()
+    if entry is None:
+        # Courses created before the sequence existed are backfilled on first use
+        sync_lesson_sequence(course_id, db)
+        entry = db.execute(stmt).scalar_one_or_none()
+    return entry
+
+
+def get_lesson_entry_with_next(
+    course_id: str, lesson_id: str, db: Session
+) -> tuple[Optional[CourseLessonSequence], Optional[CourseLessonSequence]]:
+    """
+    Return (entry, next_entry) for a lesson in a single query.
+    entry is None if the lesson does not belong to the course; next_entry is None for the last lesson.
+    """
+    next_entry = aliased(CourseLessonSequence)
+    stmt = (
+        select(CourseLessonSequence, next_entry)
+        .outerjoin(next_entry, next_entry.lesson_id == CourseLessonSequence.next_lesson_id)
+        .where(
+            CourseLessonSequence.lesson_id == lesson_id,
+            CourseLessonSequence.course_id == course_id,
+        )
+    )
+    row = db.execute(stmt).first()
+    if row is None:
+        sync_lesson_sequence(course_id, db)
+        row = db.execute(stmt).first()
+    if row is None:
+        return None, None
+    return row[0], row[1]
@@ -0,0 +1,119 @@
+import os
+import uuid
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+from sqlalchemy.orm import Session
+from sqlalchemy import select, insert, update, delete, func, or_, case
+from sqlalchemy.sql.dml import Insert
+from app.models.db_models import OutboxEvent
+from app.utils.gamification_utils import apply_lesson_completed, apply_lessons_synced, apply_course_enrolled
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+# A claimed event whose worker has not finished within the lease is handed out again
+OUTBOX_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", "60"))
+OUTBOX_RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", "7"))
+
+# event_type -> handler(user_id, payload, db) returning the rewards to store on the event
+EVENT_HANDLERS: dict[str, Callable[[str, dict, Session], dict]] = {
+    "lesson_completed": apply_lesson_completed,
+    "lessons_synced": apply_lessons_synced,
+    "course_enrolled": apply_course_enrolled,
+}
+
+
+def outbox_event_insert(event_type: str, user_id: str, payload: dict) -> tuple[str, Insert]:
+    """
+    Build the INSERT for a new outbox event and return (event_id, statement).
+    Execute it in the same transaction as the activity it describes.
+    """
+    event_id = str(uuid.uuid4())
+    stmt = insert(OutboxEvent).values(
+        id=event_id, event_type=event_type, user_id=user_id, payload=payload, status="pending"
+    )
+    return event_id, stmt
+
+
+def claim_outbox_events(db: Session, limit: int = OUTBOX_BATCH_SIZE) -> list[str]:
+    """
+    Mark up to `limit` pending (or abandoned) events as processing and return their ids, oldest first.
+    Rows claimed by other workers are skipped rather than waited on. Commits.
+    """
+    lease_expired = datetime.now(timezone.utc) - timedelta(seconds=OUTBOX_LEASE_SECONDS)
+    claimable = (
+        select(OutboxEvent.id)
+        .where(or_(
+            OutboxEvent.status == "pending",
+            (OutboxEvent.status == "processing") & (OutboxEvent.claimed_at < lease_expired),
+        ))
+        .order_by(OutboxEvent.created_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    rows = db.execute(
+        update(OutboxEvent)
+        .where(OutboxEvent.id.in_(claimable.scalar_subquery()))
+        .values(status="processing", claimed_at=func.now())
+        .returning(OutboxEvent.id, OutboxEvent.created_at)
+    ).all()
+    db.commit()
+    return [row.id for row in sorted(rows, key=lambda row: row.created_at)]
+
+
+def process_outbox_event(event_id: str, db: Session) -> bool:
+    """
+    Apply one claimed event in its own transaction. Returns True if it was applied.
+    Failures are recorded on the event, which is retried until OUTBOX_MAX_ATTEMPTS.
+    """
+    event = db.execute(
+        select(OutboxEvent)
+        .where(OutboxEvent.id == event_id, OutboxEvent.status == "processing")
+        .with_for_update(skip_locked=True)
+    ).scalar_one_or_none()
+    if event is None:
+        return False
+
+    try:
+        handler = EVENT_HANDLERS[event.event_type]
+        # Events of one learner are applied one at a time, whichever worker holds them
+        db.execute(select(func.pg_advisory_xact_lock(func.hashtext(event.user_id))))
+        event.result = handler(event.user_id, event.payload, db)
+        event.status = "processed"
+        event.processed_at = datetime.now(timezone.utc)
+        db.commit()
+        return True
+    except Exception as e:
+        db.rollback()
+        logger.exception(f"Error processing outbox event {event_id}: {str(e)}")
+        db.execute(
+            update(OutboxEvent)
+            .where(OutboxEvent.id == event_id)
+            .values(
+                attempts=OutboxEvent.attempts + 1,
+                last_error=str(e)[:2000],
+                status=case((OutboxEvent.attempts + 1 >= OUTBOX_MAX_ATTEMPTS, "failed"), else_="pending"),
+            )
+        )
+        db.commit()
+        return False
+
+
+def drain_outbox(db: Session, limit: int = OUTBOX_BATCH_SIZE) -> int:
+    """Claim and apply one batch of events. Returns the number of events claimed."""
+    event_ids = claim_outbox_events(db, limit)
+    for event_id in event_ids:
+        process_outbox_event(event_id, db)
+    return len(event_ids)
+
+
+def purge_outbox_events(db: Session, retention_days: int = OUTBOX_RETENTION_DAYS) -> int:
+    """Delete processed events older than the retention period. Commits."""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    deleted = db.execute(
+        delete(OutboxEvent).where(OutboxEvent.status == "processed", OutboxEvent.created_at < cutoff)
+    ).rowcount
+    db.commit()
+    return deleted
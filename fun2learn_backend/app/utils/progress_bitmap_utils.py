@@ -0,0 +1,63 @@
+from typing import Iterable, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import select
+from app.models.db_models import CourseProgress, CourseLessonSequence, LessonCompletion
+from app.utils.lesson_sequence_utils import sync_lesson_sequence
+
+# Completed lessons are stored on CourseProgress as a bitset over the course's lesson
+# sequence positions: bit (position % 8) of byte (position // 8).
+
+
+def has_bit(bitmap: Optional[bytes], position: int) -> bool:
+    if not bitmap or position // 8 >= len(bitmap):
+        return False
+    return bool(bitmap[position // 8] & (1 << (position % 8)))
+
+
+def set_bit(bitmap: Optional[bytes], position: int) -> bytes:
+    data = bytearray(bitmap or b"")
+    if position // 8 >= len(data):
+        data.extend(b"\x00" * (position // 8 + 1 - len(data)))
+    data[position // 8] |= 1 << (position % 8)
+    return bytes(data)
+
+
+def count_bits(bitmap: Optional[bytes]) -> int:
+    return int.from_bytes(bitmap, "little").bit_count() if bitmap else 0
+
+
+def bitmap_from_positions(positions: Iterable[int]) -> bytes:
+    bitmap = b""
+    for position in positions:
+        bitmap = set_bit(bitmap, position)
+    return bitmap
+
+
+def ensure_progress_bitmap(progress: CourseProgress, sequence_version: int, db: Session) -> tuple[bytes, bool]:
+    """
+    Return (bitmap, rebuilt) for the learner's completed lessons. The bitmap is rebuilt from
+    LessonCompletion if it is missing or was built against an older lesson ordering of the
+    course; rebuilt is then True and the caller must commit to keep it.
+    """
+    if progress.completed_bitmap is not None and progress.bitmap_version == sequence_version:
+        return progress.completed_bitmap, False
+
+    stmt = (
+        select(CourseLessonSequence.position)
+        .join(LessonCompletion, LessonCompletion.lesson_id == CourseLessonSequence.lesson_id)
+        .where(
+            CourseLessonSequence.course_id == progress.course_id,
+            LessonCompletion.user_id == progress.user_id,
+        )
+    )
+    positions = db.execute(stmt).scalars().all()
+    if not positions and not db.execute(
+        select(CourseLessonSequence.lesson_id).where(CourseLessonSequence.course_id == progress.course_id).limit(1)
+    ).first():
+        # Courses created before the sequence existed are backfilled on first use
+        sync_lesson_sequence(progress.course_id, db)
+        positions = db.execute(stmt).scalars().all()
+
+    progress.completed_bitmap = bitmap_from_positions(positions)
+    progress.bitmap_version = sequence_version
+    return progress.completed_bitmap, True
@@ -0,0 +1,202 @@
+import uuid
+from datetime import date
+from typing import Mapping, NamedTuple
+from sqlalchemy.orm import Session
+from sqlalchemy import select, func, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.models.db_models import UserDailyActivity, UserDailyQuestProgress
+from app.models.response_models import CompletedQuestInfo, DailyQuestDetail
+from app.utils.daily_activity_utils import period_start
+
+# Quest period -> granularity of the activity rollup it is counted over
+QUEST_PERIODS = {"daily": "day", "weekly": "week", "monthly": "month"}
+
+# Counters quests can track: quest_type -> (metric, period). Every counter is aggregated from
+# user_daily_activity in the same query, so new quest types do not add queries.
+#   lessons:     new lessons completed in the period
+#   active_days: days in the period with any lesson activity (today only, for daily counters)
+QUEST_COUNTERS = {
+    "streak_today": ("active_days", "daily"),
+    "lessons_today": ("lessons", "daily"),
+    "lessons_week": ("lessons", "weekly"),
+    "active_days_week": ("active_days", "weekly"),
+    "lessons_month": ("lessons", "monthly"),
+    "active_days_month": ("active_days", "monthly"),
+}
+
+
+class QuestDefinition(NamedTuple):
+    key: str
+    title: str
+    description: str
+    icon: str
+    quest_type: str
+    goal: int
+    gems: int = 0
+    xp: int = 0
+
+    @property
+    def period(self) -> str:
+        return QUEST_COUNTERS[self.quest_type][1]
+
+    def period_start(self, day: date) -> date:
+        """The date progress for the period containing the day is stored under."""
+        return period_start(day, QUEST_PERIODS[self.period])
+
+
+QUEST_REGISTRY: dict[str, QuestDefinition] = {}
+
+
+def register_quest(quest: QuestDefinition) -> QuestDefinition:
+    if quest.quest_type not in QUEST_COUNTERS:
+        raise ValueError(f"Unknown quest type '{quest.quest_type}'")
+    QUEST_REGISTRY[quest.key] = quest
+    return quest
+
+
+# ── Daily ──────────────────────────────────────────────────
+register_quest(QuestDefinition(
+    key="streak_today", title="Flame Keeper", description="Keep your streak alive today",
+    icon="flame", quest_type="streak_today", goal=1, xp=30,
+))
+register_quest(QuestDefinition(
+    key="complete_3_lessons", title="On a Roll", description="Complete 3 new lessons today",
+    icon="zap", quest_type="lessons_today", goal=3, xp=50,
+))
+register_quest(QuestDefinition(
+    key="complete_5_lessons", title="Knowledge Seeker", description="Complete 5 new lessons today",
+    icon="book-open", quest_type="lessons_today", goal=5, gems=5,
+))
+
+# ── Weekly challenges ──────────────────────────────────────
+register_quest(QuestDefinition(
+    key="weekly_15_lessons", title="Weekly Scholar", description="Complete 15 new lessons this week",
+    icon="book-open", quest_type="lessons_week", goal=15, gems=10,
+))
+register_quest(QuestDefinition(
+    key="weekly_5_days", title="Habit Builder", description="Learn on 5 different days this week",
+    icon="calendar", quest_type="active_days_week", goal=5, xp=100,
+))
+
+# ── Monthly challenges ─────────────────────────────────────
+register_quest(QuestDefinition(
+    key="monthly_50_lessons", title="Marathon Learner", description="Complete 50 new lessons this month",
+    icon="trophy", quest_type="lessons_month", goal=50, gems=25,
+))
+register_quest(QuestDefinition(
+    key="monthly_20_days", title="Dedicated", description="Learn on 20 different days this month",
+    icon="calendar", quest_type="active_days_month", goal=20, gems=30,
+))
+
+
+def quest_counters_subquery(user_id: str, day: date):
+    """
+    One-row subquery with a column per QUEST_COUNTERS entry, for the periods containing the day.
+    Reads the user's activity rollup from the start of the longest period up to the day.
+    """
+    starts = {period: period_start(day, granularity) for period, granularity in QUEST_PERIODS.items()}
+    metrics = {"lessons": func.sum(UserDailyActivity.lessons), "active_days": func.count()}
+    columns = [
+        func.coalesce(metrics[metric].filter(UserDailyActivity.date >= starts[period]), 0).label(name)
+        for name, (metric, period) in QUEST_COUNTERS.items()
+    ]
+    return (
+        select(*columns)
+        .where(
+            UserDailyActivity.user_id == user_id,
+            UserDailyActivity.date >= min(starts.values()),
+            UserDailyActivity.date <= day,
+        )
+        .subquery("quest_counters")
+    )
+
+
+def load_quest_progress(user_id: str, day: date, db: Session) -> dict[str, UserDailyQuestProgress]:
+    """Stored progress of every registered quest for the periods containing the day, in one query."""
+    keys = [(quest.key, quest.period_start(day)) for quest in QUEST_REGISTRY.values()]
+    rows = db.execute(
+        select(UserDailyQuestProgress).where(
+            UserDailyQuestProgress.user_id == user_id,
+            tuple_(UserDailyQuestProgress.quest_key, UserDailyQuestProgress.date).in_(keys),
+        )
+    ).scalars().all()
+    return {row.quest_key: row for row in rows}
+
+
+def quest_detail(quest: QuestDefinition, progress: int, completed: bool) -> DailyQuestDetail:
+    return DailyQuestDetail(
+        key=quest.key,
+        title=quest.title,
+        description=quest.description,
+        icon=quest.icon,
+        quest_type=quest.quest_type,
+        period=quest.period,
+        goal=quest.goal,
+        gems=quest.gems,
+        xp=quest.xp,
+        progress=progress,
+        completed=completed,
+    )
+
+
+def plan_quests(
+    user_id: str, day: date, counters: Mapping[str, int], db: Session
+) -> tuple[list[dict], list[CompletedQuestInfo], int, list[DailyQuestDetail], int]:
+    """
+    Work out progress of every registered quest from the counters (see quest_counters_subquery).
+    Reads the current progress in one query and writes nothing; pass the returned rows
+    to quest_progress_upsert.
+    Returns (quest_rows, newly_completed_quests, gems_earned, all_quest_details, xp_earned).
+    """
+    existing = load_quest_progress(user_id, day, db)
+
+    quest_rows: list[dict] = []
+    newly_completed: list[CompletedQuestInfo] = []
+    gems_earned = 0
+    xp_earned = 0
+    all_details: list[DailyQuestDetail] = []
+
+    for quest in QUEST_REGISTRY.values():
+        current = existing.get(quest.key)
+        was_completed = current.completed if current else False
+        gems_claimed = current.gems_claimed if current else False
+        progress = max(min(counters[quest.quest_type], quest.goal), current.progress if current else 0)
+        completed = was_completed or progress >= quest.goal
+
+        # Award gems and XP for newly completed quests
+        if completed and not gems_claimed:
+            gems_claimed = True
+            gems_earned += quest.gems
+            xp_earned += quest.xp
+            if not was_completed:
+                newly_completed.append(CompletedQuestInfo(
+                    key=quest.key,
+                    title=quest.title,
+                    gems=quest.gems,
+                    xp=quest.xp,
+                ))
+
+        quest_rows.append({
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "quest_key": quest.key,
+            "date": quest.period_start(day),
+            "progress": progress,
+            "completed": completed,
+            "gems_claimed": gems_claimed,
+        })
+        all_details.append(quest_detail(quest, progress, completed))
+
+    return quest_rows, newly_completed, gems_earned, all_details, xp_earned
+
+
+def quest_progress_upsert(quest_rows: list[dict]):
+    stmt = pg_insert(UserDailyQuestProgress).values(quest_rows)
+    return stmt.on_conflict_do_update(
+        constraint="uq_user_quest_date",
+        set_={
+            "progress": stmt.excluded.progress,
+            "completed": stmt.excluded.completed,
+            "gems_claimed": stmt.excluded.gems_claimed,
+        },
+    )
@@ -0,0 +1,40 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Response header carrying the number of SQL statements a request executed
+STATEMENT_COUNT_HEADER = "X-DB-Statement-Count"
+
+
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+
+
+# The counter object is shared (not copied) with the threadpool workers and tasks a request spawns
+_current_counter: ContextVar[Optional[StatementCounter]] = ContextVar("statement_counter", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    counter = _current_counter.get()
+    if counter is not None:
+        counter.count += 1
+
+
+def install_statement_counter(engine: Engine) -> None:
+    """Count the statements executed on the engine against the counter of the current request."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+
+
+@contextmanager
+def track_statements() -> Iterator[StatementCounter]:
+    """Count the statements executed while the block (and anything it calls) runs."""
+    counter = StatementCounter()
+    token = _current_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _current_counter.reset(token)
@@ -0,0 +1,105 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select, update, func
+from sqlalchemy.sql.dml import Update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.models.db_models import User, UserStats, LessonCompletion, Enrollment, UserAchievement
+
+USER_COUNTERS = ("lessons_completed", "courses_completed", "courses_enrolled", "achievements_unlocked")
+
+
+def refresh_user_stats(user_ids: list[str], db: Session) -> None:
+    """
+    Recompute the stats rows of the given users from the underlying tables.
+    Used to backfill users created before user_stats existed.
+    """
+    if not user_ids:
+        return
+
+    lesson_rows = {row.user_id: row for row in db.execute(
+        select(LessonCompletion.user_id, func.count().label("lessons_completed"))
+        .where(LessonCompletion.user_id.in_(user_ids))
+        .group_by(LessonCompletion.user_id)
+    ).all()}
+    enrollment_rows = {row.user_id: row for row in db.execute(
+        select(
+            Enrollment.user_id,
+            func.count().label("courses_enrolled"),
+            func.count().filter(Enrollment.status == "completed").label("courses_completed"),
+        )
+        .where(Enrollment.user_id.in_(user_ids))
+        .group_by(Enrollment.user_id)
+    ).all()}
+    achievement_counts = dict(db.execute(
+        select(UserAchievement.user_id, func.count())
+        .where(UserAchievement.user_id.in_(user_ids), UserAchievement.achieved == True)
+        .group_by(UserAchievement.user_id)
+    ).all())
+
+    rows = []
+    for uid in user_ids:
+        lessons = lesson_rows.get(uid)
+        enrollments = enrollment_rows.get(uid)
+        rows.append({
+            "user_id": uid,
+            "lessons_completed": lessons.lessons_completed if lessons else 0,
+            "courses_completed": enrollments.courses_completed if enrollments else 0,
+            "courses_enrolled": enrollments.courses_enrolled if enrollments else 0,
+            "achievements_unlocked": achievement_counts.get(uid, 0),
+        })
+    stmt = pg_insert(UserStats).values(rows)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[UserStats.user_id],
+        set_={col: stmt.excluded[col] for col in USER_COUNTERS},
+    ))
+
+
+def backfill_user_stats(db: Session) -> None:
+    """Create stats rows for every user that does not have one yet."""
+    missing = db.execute(
+        select(User.user_id).outerjoin(UserStats, UserStats.user_id == User.user_id)
+        .where(UserStats.user_id.is_(None))
+    ).scalars().all()
+    refresh_user_stats(list(missing), db)
+
+
+def user_stats_update(user_id: str, **deltas: int) -> Update:
+    """
+    Build an UPDATE adding deltas to counters, e.g. user_stats_update(uid, courses_enrolled=1),
+    for use with execute_writes. A user without a stats row is left alone; the row is computed
+    from scratch when it is next read (see get_user_stats).
+    """
+    values = {getattr(UserStats, col): getattr(UserStats, col) + delta for col, delta in deltas.items()}
+    return (
+        update(UserStats)
+        .where(UserStats.user_id == user_id)
+        .values(values)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def adjust_user_stats(user_id: str, db: Session, **deltas: int) -> None:
+    """
+    Atomically add deltas to counters, e.g. adjust_user_stats(uid, db, courses_enrolled=1).
+    The change being counted must already be flushed: if the user has no stats row yet,
+    it is computed from scratch instead.
+    """
+    result = db.execute(user_stats_update(user_id, **deltas))
+    if result.rowcount == 0:
+        refresh_user_stats([user_id], db)
+
+
+def get_user_stats(user_ids: list[str], db: Session) -> dict[str, UserStats]:
+    """Return stats rows keyed by user id, backfilling any user that has none yet."""
+    if not user_ids:
+        return {}
+
+    stmt = select(UserStats).where(UserStats.user_id.in_(user_ids))
+    stats = {row.user_id: row for row in db.execute(stmt).scalars().all()}
+
+    missing = [uid for uid in user_ids if uid not in stats]
+    if missing:
+        refresh_user_stats(missing, db)
+        stmt = select(UserStats).where(UserStats.user_id.in_(missing))
+        stats.update({row.user_id: row for row in db.execute(stmt).scalars().all()})
+
+    return stats
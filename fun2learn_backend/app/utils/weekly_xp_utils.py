@@ -0,0 +1,54 @@
+from datetime import date
+from sqlalchemy.orm import Session
+from sqlalchemy import String, select, func, exists, literal, union_all
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.models.db_models import UserWeeklyXp, LeaderboardEntry, Leaderboard, Following, User
+
+
+def weekly_xp_upsert(user_id: str, week_start: date, xp: int):
+    """Build an upsert adding xp to the user's total for the week, for use with execute_writes."""
+    stmt = pg_insert(UserWeeklyXp).values(user_id=user_id, week_start=week_start, xp=xp)
+    return stmt.on_conflict_do_update(
+        index_elements=[UserWeeklyXp.user_id, UserWeeklyXp.week_start],
+        set_={"xp": UserWeeklyXp.xp + stmt.excluded.xp},
+    )
+
+
+def backfill_weekly_xp(db: Session) -> None:
+    """Build weekly totals from leaderboard entries the first time the table is used."""
+    if db.execute(select(exists().select_from(UserWeeklyXp))).scalar_one():
+        return
+    week = func.date(Leaderboard.week_start)
+    history = (
+        select(LeaderboardEntry.user_id, week, func.sum(LeaderboardEntry.xp_earned))
+        .join(Leaderboard, Leaderboard.id == LeaderboardEntry.leaderboard_id)
+        .group_by(LeaderboardEntry.user_id, week)
+    )
+    db.execute(
+        pg_insert(UserWeeklyXp)
+        .from_select(["user_id", "week_start", "xp"], history)
+        .on_conflict_do_nothing()
+    )
+
+
+def get_friends_weekly_xp(user_id: str, week_start: date, db: Session) -> list:
+    """
+    The user and everyone they follow with their XP for the week (0 if none), highest first,
+    as (user_id, full_name, xp) rows. One query: the followed ids come from the uq_following
+    index and the XP from the covering index on user_weekly_xp.
+    """
+    members = union_all(
+        select(literal(user_id, String).label("user_id")),
+        # A self-follow would list the user twice
+        select(Following.following_user_id).where(
+            Following.follower_user_id == user_id, Following.following_user_id != user_id
+        ),
+    ).subquery("members")
+    xp = func.coalesce(UserWeeklyXp.xp, 0)
+    return db.execute(
+        select(User.user_id, User.full_name, xp.label("xp"))
+        .select_from(members)
+        .join(User, User.user_id == members.c.user_id)
+        .outerjoin(UserWeeklyXp, (UserWeeklyXp.user_id == User.user_id) & (UserWeeklyXp.week_start == week_start))
+        .order_by(xp.desc(), User.full_name)
+    ).all()
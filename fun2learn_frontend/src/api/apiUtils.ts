@@ -36,4 +36,29 @@ export function getHeadersRaw (contentType: string = "application/json") {
     }
 
     return headers;
-}
\ No newline at end of file
+}
+
+/**
+ * POST a mutating request with an Idempotency-Key, retrying network failures with the same key
+ * so the server replays the first response instead of repeating the action
+ * @param url endpoint to call
+ * @param body request body, sent as JSON
+ * @param retries how many times a network failure is retried
+ * @returns the response of the first attempt that reached the server
+ */
+export async function postIdempotent(url: string, body: unknown, retries: number = 2): Promise<Response> {
+    const headers = getHeaders();
+    headers.set("Idempotency-Key", crypto.randomUUID());
+
+    for (let attempt = 0; ; attempt++) {
+        try {
+            return await fetch(url, { method: "POST", headers, body: JSON.stringify(body) });
+        } catch (e) {
+            // fetch only rejects when the request did not complete, e.g. the connection dropped
+            if (attempt >= retries) {
+                throw e;
+            }
+            await new Promise((resolve) => setTimeout(resolve, 500 * (attempt + 1)));
+        }
+    }
+}
@@ -1,20 +1,23 @@
 import config from "@/config";
-import { getHeaders } from "./apiUtils";
+import { getHeaders, postIdempotent } from "./apiUtils";
 import type {
     GetBrowseCoursesResponse, EnrollCourseResponse,
     GetMyCoursesResponse, GetStudentCourseDetailResponse,
-    GetStudentLessonResponse, SubmitAnswerResponse, CompleteLessonResponse,
+    GetStudentLessonResponse, SubmitAnswerResponse, CompleteLessonResponse, SyncResponse, GetRewardsResponse,
     GetStreakResponse, GetAchievementsResponse, GetDailyQuestsResponse,
-    GetLeaderboardResponse, InitiatePaymentResponse,
+    GetActivityHeatmapResponse, GetXpHistoryResponse,
+    GetLeaderboardResponse, GetFriendsLeaderboardResponse, InitiatePaymentResponse,
     GetCoursePublicDetailResponse, GetCourseFeedbackResponse,
     SubmitFeedbackResponse, MyFeedbackResponse
 } from "@/models/responseModels";
+import type { SyncAction } from "@/models/requestModels";
 
 const API_URL = config.API_URL;
 
-export const getBrowseCourses = async () => {
+export const getBrowseCourses = async (cursor?: string) => {
     try {
-        const response = await fetch(`${API_URL}/student/browse`, {
+        const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : "";
+        const response = await fetch(`${API_URL}/student/browse${query}`, {
             method: "GET",
             headers: getHeaders(),
         });
@@ -26,7 +29,7 @@ export const getBrowseCourses = async () => {
 
         const data = await response.json() as GetBrowseCoursesResponse;
         if (data.status === "success") {
-            return { success: true, courses: data.courses };
+            return { success: true, courses: data.courses, nextCursor: data.next_cursor ?? null };
         }
         return { success: false, errorMessage: data.message };
     } catch (e) {
@@ -36,11 +39,7 @@ export const getBrowseCourses = async () => {
 
 export const enrollInCourse = async (courseId: string) => {
     try {
-        const response = await fetch(`${API_URL}/student/enroll`, {
-            method: "POST",
-            headers: getHeaders(),
-            body: JSON.stringify({ course_id: courseId })
-        });
+        const response = await postIdempotent(`${API_URL}/student/enroll`, { course_id: courseId });
 
         if (!response.ok) {
             const error = await response.json();
@@ -145,11 +144,7 @@ export const submitAnswer = async (questionId: string, answer: string) => {
 
 export const completeLesson = async (lessonId: string, courseId: string) => {
     try {
-        const response = await fetch(`${API_URL}/student/complete-lesson`, {
-            method: "POST",
-            headers: getHeaders(),
-            body: JSON.stringify({ lesson_id: lessonId, course_id: courseId })
-        });
+        const response = await postIdempotent(`${API_URL}/student/complete-lesson`, { lesson_id: lessonId, course_id: courseId });
 
         if (!response.ok) {
             const error = await response.json();
@@ -162,6 +157,52 @@ export const completeLesson = async (lessonId: string, courseId: string) => {
                 success: true,
                 nextLessonId: data.next_lesson_id,
                 courseCompleted: data.course_completed,
+                rewardEventId: data.reward_event_id,
+            };
+        }
+        return { success: false, errorMessage: data.message };
+    } catch (e) {
+        return { success: false, errorMessage: e instanceof Error ? e.message : "Failed to complete lesson" };
+    }
+};
+
+// Replays answers and completions made offline, in the order they were made
+export const syncProgress = async (actions: SyncAction[]) => {
+    try {
+        const response = await postIdempotent(`${API_URL}/student/sync`, { actions });
+
+        if (!response.ok) {
+            const error = await response.json();
+            throw new Error(error?.message || error?.detail || "Failed to sync progress");
+        }
+
+        const data = await response.json() as SyncResponse;
+        if (data.status === "success") {
+            return { success: true, results: data.results, rewardEventId: data.reward_event_id };
+        }
+        return { success: false, errorMessage: data.message };
+    } catch (e) {
+        return { success: false, errorMessage: e instanceof Error ? e.message : "Failed to sync progress" };
+    }
+};
+
+export const getRewards = async (eventId: string) => {
+    try {
+        const response = await fetch(`${API_URL}/student/rewards/${eventId}`, {
+            method: "GET",
+            headers: getHeaders(),
+        });
+
+        if (!response.ok) {
+            const error = await response.json();
+            throw new Error(error?.message || error?.detail || "Failed to fetch rewards");
+        }
+
+        const data = await response.json() as GetRewardsResponse;
+        if (data.status === "success") {
+            return {
+                success: true,
+                eventStatus: data.event_status,
                 streakUpdated: data.streak_updated,
                 dailyStreak: data.daily_streak,
                 newlyUnlockedAchievements: data.newly_unlocked_achievements ?? [],
@@ -175,10 +216,22 @@ export const completeLesson = async (lessonId: string, courseId: string) => {
         }
         return { success: false, errorMessage: data.message };
     } catch (e) {
-        return { success: false, errorMessage: e instanceof Error ? e.message : "Failed to complete lesson" };
+        return { success: false, errorMessage: e instanceof Error ? e.message : "Failed to fetch rewards" };
     }
 };
 
+// Rewards are applied in the background, usually within a second of completing the lesson
+export const waitForRewards = async (eventId: string, attempts = 10, intervalMs = 500) => {
+    for (let i = 0; i < attempts; i++) {
+        const result = await getRewards(eventId);
+        if (!result.success || result.eventStatus !== "pending") {
+            return result;
+        }
+        await new Promise(resolve => setTimeout(resolve, intervalMs));
+    }
+    return { success: false, errorMessage: "Rewards are still being processed" };
+};
+
 export const getAchievements = async () => {
     try {
         const response = await fetch(`${API_URL}/student/achievements`, {
@@ -252,14 +305,69 @@ export const getDailyQuests = async () => {
     }
 };
 
-export const initiatePayment = async (packageId: string) => {
+export const getActivityHeatmap = async (startDate?: string, endDate?: string) => {
     try {
-        const response = await fetch(`${API_URL}/payment/initiate`, {
-            method: "POST",
+        const params = new URLSearchParams();
+        if (startDate) params.set("start_date", startDate);
+        if (endDate) params.set("end_date", endDate);
+        const query = params.toString() ? `?${params.toString()}` : "";
+        const response = await fetch(`${API_URL}/student/activity/heatmap${query}`, {
+            method: "GET",
+            headers: getHeaders(),
+        });
+
+        if (!response.ok) {
+            const error = await response.json();
+            throw new Error(error?.message || error?.detail || "Failed to fetch activity");
+        }
+
+        const data = await response.json() as GetActivityHeatmapResponse;
+        if (data.status === "success") {
+            return {
+                success: true,
+                startDate: data.start_date,
+                endDate: data.end_date,
+                days: data.days,
+                activeDays: data.active_days,
+                totalLessons: data.total_lessons,
+                totalXp: data.total_xp,
+            };
+        }
+        return { success: false, errorMessage: data.message };
+    } catch (e) {
+        return { success: false, errorMessage: e instanceof Error ? e.message : "Failed to fetch activity" };
+    }
+};
+
+export const getXpHistory = async (granularity: "day" | "week" | "month" = "day", startDate?: string, endDate?: string) => {
+    try {
+        const params = new URLSearchParams({ granularity });
+        if (startDate) params.set("start_date", startDate);
+        if (endDate) params.set("end_date", endDate);
+        const response = await fetch(`${API_URL}/student/activity/xp-history?${params.toString()}`, {
+            method: "GET",
             headers: getHeaders(),
-            body: JSON.stringify({ package_id: packageId }),
         });
 
+        if (!response.ok) {
+            const error = await response.json();
+            throw new Error(error?.message || error?.detail || "Failed to fetch XP history");
+        }
+
+        const data = await response.json() as GetXpHistoryResponse;
+        if (data.status === "success") {
+            return { success: true, points: data.points, startDate: data.start_date, endDate: data.end_date };
+        }
+        return { success: false, errorMessage: data.message };
+    } catch (e) {
+        return { success: false, errorMessage: e instanceof Error ? e.message : "Failed to fetch XP history" };
+    }
+};
+
+export const initiatePayment = async (packageId: string) => {
+    try {
+        const response = await postIdempotent(`${API_URL}/payment/initiate`, { package_id: packageId });
+
         if (!response.ok) {
             const error = await response.json();
             throw new Error(error?.message || error?.detail || "Failed to initiate payment");
@@ -309,6 +417,36 @@ export const getLeaderboard = async () => {
     }
 };
 
+export const getFriendsLeaderboard = async () => {
+    try {
+        const response = await fetch(`${API_URL}/student/leaderboard/friends`, {
+            method: "GET",
+            headers: getHeaders(),
+        });
+
+        if (!response.ok) {
+            const error = await response.json();
+            throw new Error(error?.message || error?.detail || "Failed to fetch friends leaderboard");
+        }
+
+        const data = await response.json() as GetFriendsLeaderboardResponse;
+        if (data.status === "success") {
+            return {
+                success: true,
+                weekStart: data.week_start,
+                weekEnd: data.week_end,
+                members: data.members,
+                myPosition: data.my_position,
+                myXp: data.my_xp,
+                totalMembers: data.total_members,
+            };
+        }
+        return { success: false, errorMessage: data.message };
+    } catch (e) {
+        return { success: false, errorMessage: e instanceof Error ? e.message : "Failed to fetch friends leaderboard" };
+    }
+};
+
 export const getCoursePublicDetail = async (courseId: string) => {
     try {
         const response = await fetch(`${API_URL}/student/course/${courseId}/public`, {
@@ -25,6 +25,8 @@ const BrowsePage = () => {
     const [courses, setCourses] = useState<BrowseCourseSummary[]>([]);
     const [enrolledIds, setEnrolledIds] = useState<Set<string>>(new Set());
     const [isLoading, setIsLoading] = useState(true);
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
+    const [isLoadingMore, setIsLoadingMore] = useState(false);
 
     // Filter state
     const [searchQuery, setSearchQuery] = useState("");
@@ -47,6 +49,7 @@ const BrowsePage = () => {
         ]);
         if (browseResult.success && browseResult.courses) {
             setCourses(browseResult.courses);
+            setNextCursor(browseResult.nextCursor ?? null);
         } else {
             toast.error(browseResult.errorMessage || "Failed to load courses");
         }
@@ -56,6 +59,19 @@ const BrowsePage = () => {
         setIsLoading(false);
     };
 
+    const loadMore = async () => {
+        if (!nextCursor) return;
+        setIsLoadingMore(true);
+        const result = await getBrowseCourses(nextCursor);
+        if (result.success && result.courses) {
+            setCourses(prev => [...prev, ...result.courses!]);
+            setNextCursor(result.nextCursor ?? null);
+        } else {
+            toast.error(result.errorMessage || "Failed to load more courses");
+        }
+        setIsLoadingMore(false);
+    };
+
     const allTags = useMemo(() => {
         const map = new Map<string, Tag>();
         courses.forEach(c => c.tags.forEach(t => map.set(t.id, t)));
@@ -296,6 +312,14 @@ const BrowsePage = () => {
                         ))}
                     </div>
                 )}
+
+                {!isLoading && nextCursor && (
+                    <div className="flex justify-center mt-8">
+                        <Button variant="secondary" size="md" onClick={loadMore} disabled={isLoadingMore}>
+                            {isLoadingMore ? "Loading..." : "Load more courses"}
+                        </Button>
+                    </div>
+                )}
             </main>
 
             {sortOpen && <div className="fixed inset-0 z-10" onClick={() => setSortOpen(false)} />}
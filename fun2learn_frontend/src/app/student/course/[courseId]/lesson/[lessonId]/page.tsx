@@ -4,7 +4,7 @@ import { useCallback, useEffect, useState } from "react";
 import { useParams, useRouter } from "next/navigation";
 import { toast } from "sonner";
 import type { StudentQuestion, LessonAttachment, NewlyUnlockedAchievement, DailyQuest } from "@/models/types";
-import { getStudentLesson, submitAnswer, completeLesson } from "@/api/studentApi";
+import { getStudentLesson, submitAnswer, completeLesson, waitForRewards } from "@/api/studentApi";
 import QuestionCard from "@/components/student/questionCard";
 import StreakModal from "@/components/student/streakModal";
 import AchievementUnlockToast from "@/components/student/achievementUnlockToast";
@@ -74,21 +74,26 @@ const LessonPage = () => {
             setLessonCompleted(true);
             setNextLessonId(result.nextLessonId || null);
             setCourseCompleted(result.courseCompleted ?? false);
-
-            if (result.newlyUnlockedAchievements && result.newlyUnlockedAchievements.length > 0) {
-                setAchievementQueue(prev => [...prev, ...result.newlyUnlockedAchievements!]);
-            }
-
-            setStreakCount(result.dailyStreak ?? 0);
-            setStreakUpdated(result.streakUpdated ?? false);
-            setQuestProgress(result.dailyQuestProgress ?? []);
-            setGemsEarned(result.gemsEarned ?? 0);
-            setShowStreakModal(true);
         } else {
             toast.error(result.errorMessage || "Failed to complete lesson");
         }
 
         setIsCompleting(false);
+
+        if (result.success && result.rewardEventId) {
+            const rewards = await waitForRewards(result.rewardEventId);
+            if (rewards.success && "eventStatus" in rewards && rewards.eventStatus === "processed") {
+                if (rewards.newlyUnlockedAchievements && rewards.newlyUnlockedAchievements.length > 0) {
+                    setAchievementQueue(prev => [...prev, ...rewards.newlyUnlockedAchievements!]);
+                }
+
+                setStreakCount(rewards.dailyStreak ?? 0);
+                setStreakUpdated(rewards.streakUpdated ?? false);
+                setQuestProgress(rewards.dailyQuestProgress ?? []);
+                setGemsEarned(rewards.gemsEarned ?? 0);
+                setShowStreakModal(true);
+            }
+        }
     };
 
     const handleDismissAchievement = useCallback(() => {
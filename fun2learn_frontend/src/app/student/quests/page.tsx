@@ -2,14 +2,16 @@
 
 import { useEffect, useState } from "react";
 import { toast } from "sonner";
-import type { DailyQuest } from "@/models/types";
+import type { DailyQuest, QuestPeriod } from "@/models/types";
 import { getDailyQuests } from "@/api/studentApi";
-import { BookOpen, Zap, Flame, Gem, CheckCircle2, RefreshCw, Star } from "lucide-react";
+import { BookOpen, Zap, Flame, Gem, CheckCircle2, RefreshCw, Star, Calendar, Trophy } from "lucide-react";
 
 const QUEST_ICONS: Record<string, React.ReactNode> = {
     "book-open": <BookOpen size={22} />,
     "zap": <Zap size={22} />,
     "flame": <Flame size={22} />,
+    "calendar": <Calendar size={22} />,
+    "trophy": <Trophy size={22} />,
 };
 
 const QUEST_COLORS: Record<string, { icon: string; ring: string; bg: string; bar: string; border: string }> = {
@@ -34,8 +36,27 @@ const QUEST_COLORS: Record<string, { icon: string; ring: string; bg: string; bar
         bar: "bg-orange-500",
         border: "border-orange-100 dark:border-orange-900/50",
     },
+    "calendar": {
+        icon: "text-teal-500",
+        ring: "ring-teal-200 dark:ring-teal-800",
+        bg: "bg-teal-50 dark:bg-teal-900/20",
+        bar: "bg-teal-500",
+        border: "border-teal-100 dark:border-teal-900/50",
+    },
+    "trophy": {
+        icon: "text-amber-500",
+        ring: "ring-amber-200 dark:ring-amber-800",
+        bg: "bg-amber-50 dark:bg-amber-900/20",
+        bar: "bg-amber-500",
+        border: "border-amber-100 dark:border-amber-900/50",
+    },
 };
 
+const CHALLENGE_SECTIONS: { period: QuestPeriod; title: string; resets: string }[] = [
+    { period: "weekly", title: "Weekly Challenges", resets: "Resets every Monday" },
+    { period: "monthly", title: "Monthly Challenges", resets: "Resets on the 1st of each month" },
+];
+
 const QuestCard = ({ quest }: { quest: DailyQuest }) => {
     const colors = QUEST_COLORS[quest.icon] ?? QUEST_COLORS["book-open"];
     const clampedProgress = Math.min(quest.progress, quest.goal);
@@ -155,8 +176,9 @@ const QuestsPage = () => {
         setIsLoading(false);
     };
 
-    const completedCount = quests.filter(q => q.completed).length;
-    const gemsEarnedToday = quests.filter(q => q.completed).reduce((sum, q) => sum + q.gems, 0);
+    const dailyQuests = quests.filter(q => (q.period ?? "daily") === "daily");
+    const completedCount = dailyQuests.filter(q => q.completed).length;
+    const gemsEarnedToday = dailyQuests.filter(q => q.completed).reduce((sum, q) => sum + q.gems, 0);
 
     return (
         <div className="min-h-screen bg-gray-50 dark:bg-gray-900">
@@ -181,17 +203,17 @@ const QuestsPage = () => {
                     </div>
 
                     {/* Summary bar */}
-                    {!isLoading && quests.length > 0 && (
+                    {!isLoading && dailyQuests.length > 0 && (
                         <div className="mt-5 flex items-center gap-4">
                             <div className="flex-1">
                                 <div className="flex justify-between text-xs text-gray-500 dark:text-gray-500 mb-1.5">
                                     <span className="font-medium">Today&apos;s progress</span>
-                                    <span className="font-bold">{completedCount}/{quests.length} quests</span>
+                                    <span className="font-bold">{completedCount}/{dailyQuests.length} quests</span>
                                 </div>
                                 <div className="h-3 rounded-full bg-gray-200 dark:bg-gray-700 overflow-hidden">
                                     <div
                                         className="h-full rounded-full bg-linear-to-r from-yellow-400 to-orange-500 transition-all duration-700"
-                                        style={{ width: `${quests.length > 0 ? (completedCount / quests.length) * 100 : 0}%` }}
+                                        style={{ width: `${dailyQuests.length > 0 ? (completedCount / dailyQuests.length) * 100 : 0}%` }}
                                     />
                                 </div>
                             </div>
@@ -221,11 +243,32 @@ const QuestsPage = () => {
                         ))}
                     </div>
                 ) : (
-                    <div className="space-y-4">
-                        {quests.map((quest) => (
-                            <QuestCard key={quest.key} quest={quest} />
-                        ))}
-                    </div>
+                    <>
+                        <div className="space-y-4">
+                            {dailyQuests.map((quest) => (
+                                <QuestCard key={quest.key} quest={quest} />
+                            ))}
+                        </div>
+
+                        {CHALLENGE_SECTIONS.map(({ period, title, resets }) => {
+                            const challenges = quests.filter(q => q.period === period);
+                            if (challenges.length === 0) return null;
+                            return (
+                                <section key={period} className="mt-10">
+                                    <h3 className="font-lilita text-2xl text-gray-800 dark:text-gray-100">{title}</h3>
+                                    <div className="flex items-center gap-2 mt-1 mb-4 text-xs text-gray-400 dark:text-gray-600">
+                                        <RefreshCw size={12} />
+                                        <span>{resets}</span>
+                                    </div>
+                                    <div className="space-y-4">
+                                        {challenges.map((quest) => (
+                                            <QuestCard key={quest.key} quest={quest} />
+                                        ))}
+                                    </div>
+                                </section>
+                            );
+                        })}
+                    </>
                 )}
             </main>
         </div>
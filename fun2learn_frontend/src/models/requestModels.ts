@@ -46,4 +46,14 @@ export interface UpdateRedeemStatusRequest {
 export interface SubmitFeedbackRequest {
     rating: number;
     comment?: string;
-}
\ No newline at end of file
+}
+
+export interface SyncAction {
+    type: "answer" | "complete_lesson";
+    // ISO timestamp of when the learner did it on the device
+    client_timestamp: string;
+    question_id?: string;
+    answer?: string;
+    lesson_id?: string;
+    course_id?: string;
+}
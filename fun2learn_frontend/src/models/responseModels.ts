@@ -162,6 +162,7 @@ export interface GetBrowseCoursesResponse {
     status: string;
     message: string;
     courses: BrowseCourseSummary[];
+    next_cursor?: string | null;
 }
 
 export interface EnrollCourseResponse {
@@ -202,6 +203,31 @@ export interface CompleteLessonResponse {
     message: string;
     next_lesson_id?: string;
     course_completed: boolean;
+    reward_event_id?: string;
+}
+
+export interface SyncActionResult {
+    index: number;
+    type: "answer" | "complete_lesson";
+    result: "ok" | "error";
+    message: string;
+    is_correct?: boolean;
+    correct_answer?: string;
+    next_lesson_id?: string;
+    course_completed: boolean;
+}
+
+export interface SyncResponse {
+    status: string;
+    message: string;
+    results: SyncActionResult[];
+    reward_event_id?: string;
+}
+
+export interface GetRewardsResponse {
+    status: string;
+    message: string;
+    event_status: "pending" | "processed" | "failed";
     streak_updated: boolean;
     daily_streak: number;
     newly_unlocked_achievements: NewlyUnlockedAchievement[];
@@ -230,6 +256,39 @@ export interface GetDailyQuestsResponse {
     total_gems: number;
 }
 
+export interface ActivityDay {
+    date: string;
+    lessons: number;
+    xp: number;
+    gems: number;
+}
+
+export interface GetActivityHeatmapResponse {
+    status: string;
+    message: string;
+    start_date: string;
+    end_date: string;
+    days: ActivityDay[];
+    active_days: number;
+    total_lessons: number;
+    total_xp: number;
+}
+
+export interface XpHistoryPoint {
+    period: string;
+    xp: number;
+    cumulative_xp: number;
+}
+
+export interface GetXpHistoryResponse {
+    status: string;
+    message: string;
+    granularity: "day" | "week" | "month";
+    start_date: string;
+    end_date: string;
+    points: XpHistoryPoint[];
+}
+
 export interface GetAchievementsResponse {
     status: string;
     message: string;
@@ -251,6 +310,17 @@ export interface GetLeaderboardResponse {
     total_members: number;
 }
 
+export interface GetFriendsLeaderboardResponse {
+    status: string;
+    message: string;
+    week_start: string;
+    week_end: string;
+    members: LeaderboardMember[];
+    my_position: number;
+    my_xp: number;
+    total_members: number;
+}
+
 // ─── Tutor Monetization response models ─────────────────
 
 export interface SetCoursePriceResponse {
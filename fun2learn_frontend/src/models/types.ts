@@ -309,7 +309,12 @@ export interface UserAchievementDetail {
 
 // ─── Quest types ─────────────────────────────────────────
 
-export type QuestType = 'lessons_today' | 'streak_today';
+export type QuestType =
+    | 'lessons_today' | 'streak_today'
+    | 'lessons_week' | 'active_days_week'
+    | 'lessons_month' | 'active_days_month';
+
+export type QuestPeriod = 'daily' | 'weekly' | 'monthly';
 
 export interface DailyQuest {
     key: string;
@@ -317,6 +322,7 @@ export interface DailyQuest {
     description: string;
     icon: string;
     quest_type: QuestType;
+    period?: QuestPeriod;
     goal: number;
     gems: number;
     xp?: number;